@@ -4,7 +4,11 @@ import os
 from abc import ABC, abstractmethod
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Callable, Iterable, List, Sequence, Tuple, Dict
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple, Dict
+
+from core.trajectory import TraceRecorder, TrajectoryCache, default_task_text, recording
+from runtime.deadline import deadline_scope, with_deadline
+from runtime.telemetry import get_metrics
 
 
 class _Logger:
@@ -40,6 +44,13 @@ class BaseBenchmark(ABC):
         os.makedirs(self.log_path, exist_ok=True)
         # default pass@k setting used by evaluate_problem if applicable
         self.pass_k: int = 1
+        # optional: record successful action sequences and score replays (core.trajectory)
+        self.trajectory_cache: Optional[TrajectoryCache] = None
+        # ActionSpace the agent acts through; with a trajectory cache, matching tasks replay through it
+        self.action_space: Optional[Any] = None
+        # per-attempt wall-clock and token budgets, inherited by every nested call (runtime.deadline)
+        self.attempt_timeout_s: Optional[float] = None
+        self.attempt_tokens: Optional[int] = None
 
     # ----------------------------
     # Data loading
@@ -156,19 +167,43 @@ class BaseBenchmark(ABC):
         Output: {"tries": [{ok, final, cost, meta}, ...], "context": {...}}
         """
         tries: List[Dict[str, Any]] = []
+        if self.trajectory_cache is not None and self.action_space is not None:
+            agent = self._replaying(agent, problem)
         for _ in range(max(1, int(k))):
-            try:
-                t = await self.single_attempt(problem, agent)
-            except Exception as e:
-                t = {"ok": False, "final": f"error: {e}", "cost": {}, "meta": {"error": str(e)}}
+            with recording(TraceRecorder(env=self.name)) as rec, deadline_scope(self.attempt_timeout_s, self.attempt_tokens):
+                try:
+                    t = await with_deadline(self.single_attempt(problem, agent))
+                except Exception as e:
+                    t = {"ok": False, "final": f"error: {e}", "cost": {}, "meta": {"error": str(e)}}
             # normalize fields
             t.setdefault("ok", False)
             t.setdefault("final", None)
             t.setdefault("cost", {})
             t.setdefault("meta", {})
+            if self.trajectory_cache is not None:
+                self.trajectory_cache.observe(self.name, self.task_text(problem), rec, bool(t["ok"]))
+                t["meta"].setdefault("replayed_steps", rec.replayed)
             tries.append(t)
         return {"tries": tries, "context": {}}
 
+    def task_text(self, problem: dict) -> str:
+        """Text whose signature keys trajectory templates (see core.trajectory)."""
+        return default_task_text(problem)
+
+    def replay_result(self, outputs: List[Any]) -> Any:
+        """Agent-shaped result of a fully replayed template (default: last action output)."""
+        return outputs[-1] if outputs else None
+
+    def _replaying(self, agent: Callable[..., Any], problem: dict) -> Callable[..., Any]:
+        """``agent`` behind the trajectory cache: a matching template runs first and
+        ``agent`` takes over at its first failing step (or when nothing matches)."""
+        cache, space, text = self.trajectory_cache, self.action_space, self.task_text(problem)
+
+        async def run(p: dict, *args: Any, **kwargs: Any) -> Any:
+            return await cache.replay(space, text, fallback=lambda outputs: agent(p, *args, **kwargs), finalize=self.replay_result)
+
+        return run
+
     # ----------------------------
     # Orchestration helpers
     # ----------------------------
@@ -192,6 +227,7 @@ class BaseBenchmark(ABC):
         results = await self.evaluate_all_problems(data, agent, max_concurrent_tasks)
         columns = self.get_result_columns()
         average_score, average_cost, total_cost, out_file = self._save_results_to_csv(results, columns)
+        get_metrics().flush(os.path.join(self.log_path, "metrics.json"))
         logger.info(f"Average score on {self.name} dataset: {average_score:.5f}")
         logger.info(f"Total Cost: {total_cost:.5f}")
         return average_score, average_cost, total_cost, out_file
@@ -202,6 +238,7 @@ class BaseBenchmark(ABC):
         results = await self.evaluate_all_problems(data, agent, max_concurrent_tasks)
         columns = self.get_result_columns()
         average_score, average_cost, total_cost, out_file = self._save_results_to_csv(results, columns)
+        get_metrics().flush(os.path.join(self.log_path, "metrics.json"))
         logger.info(f"Average score on {self.name} dataset: {average_score:.5f}")
         logger.info(f"Total Cost: {total_cost:.5f}")
         return average_score, average_cost, total_cost, out_file
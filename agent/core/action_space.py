@@ -1,32 +1,696 @@
 from __future__ import annotations
 
+import copy
+import glob
+import hashlib
 import json
+import os
+import sys
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
 
 try:
     import yaml  # type: ignore
 except Exception:
     yaml = None  # optional; parsing guarded
 
+from engine.schema import ParamValidationError, ValidatorCache
+from runtime.deadline import current_deadline, deadline_scope, with_deadline
+from runtime.telemetry import log_warn
 from .bases import BaseAction
+from .memo import ResultMemo, is_memoizable
+from .trajectory import action_step
 
+if TYPE_CHECKING:
+    from .dedup import NearDuplicateIndex
 
-@dataclass
+
+# ----------------------------
+# Compact ActionSpec storage
+# ----------------------------
+class _FrozenDict(dict):
+    """Read-only dict for interned schemas (still a dict for json and validators).
+
+    Copies (``copy``/``deepcopy``/pickle) come back as plain mutable containers.
+    """
+
+    __slots__ = ("__weakref__",)
+
+    def _readonly(self, *args: Any, **kwargs: Any) -> Any:
+        raise TypeError("interned schema is read-only; assign a new dict to the spec instead")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = __ior__ = _readonly  # type: ignore[assignment]
+
+    def __copy__(self) -> Dict[str, Any]:
+        return dict(self)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> Dict[str, Any]:
+        return _thaw(self)
+
+    def __reduce__(self) -> Any:
+        return (dict, (_thaw(self),))
+
+
+class _FrozenList(list):
+    __slots__ = ()
+
+    def _readonly(self, *args: Any, **kwargs: Any) -> Any:
+        raise TypeError("interned schema is read-only; assign a new dict to the spec instead")
+
+    __setitem__ = __delitem__ = append = extend = insert = pop = remove = clear = sort = reverse = _readonly  # type: ignore[assignment]
+    __iadd__ = __imul__ = _readonly  # type: ignore[assignment]
+
+    def __copy__(self) -> List[Any]:
+        return list(self)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> List[Any]:
+        return _thaw(self)
+
+    def __reduce__(self) -> Any:
+        return (list, (_thaw(self),))
+
+
+def _freeze(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return _FrozenDict((k, _freeze(v)) for k, v in obj.items())
+    if isinstance(obj, list):
+        return _FrozenList(_freeze(v) for v in obj)
+    return obj
+
+
+def _thaw(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {k: _thaw(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_thaw(v) for v in obj]
+    return obj
+
+
+class _Tags:
+    """Interned, read-only tag sequence (a wrapper so the table can hold it weakly)."""
+
+    __slots__ = ("items", "__weakref__")
+
+    def __init__(self, items: Tuple[str, ...]) -> None:
+        self.items = items
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.items)
+
+    def __contains__(self, tag: object) -> bool:
+        return tag in self.items
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __reduce__(self) -> Any:
+        return (_intern_tags, (self.items,))
+
+
+# canonical JSON -> shared frozen schema, tag tuple -> shared _Tags; an entry
+# goes away with the last spec using it
+_SCHEMA_TABLE: "weakref.WeakValueDictionary[str, _FrozenDict]" = weakref.WeakValueDictionary()
+_TAGS_TABLE: "weakref.WeakValueDictionary[Tuple[str, ...], _Tags]" = weakref.WeakValueDictionary()
+
+
+def intern_schema(schema: Dict[str, Any] | None) -> Dict[str, Any] | None:
+    """Hash-cons a JSON schema: identical schemas share one frozen copy.
+
+    The caller's dict is never shared (later changes to it do not leak into
+    specs). The shared copy stays internal: reading ``spec.inputs_schema``
+    hands out a private mutable copy.
+    """
+    if not schema:
+        return None
+    try:
+        key = json.dumps(schema, sort_keys=True, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return copy.deepcopy(schema)  # not JSON-able; keep a private copy
+    shared = _SCHEMA_TABLE.get(key)
+    if shared is None:
+        shared = _SCHEMA_TABLE[key] = _freeze(schema)  # copies, keeping key order
+    return shared
+
+
+def _intern_tags(tags: Iterable[str] | None) -> _Tags:
+    key = tuple(sys.intern(str(t)) for t in (tags or ()))
+    shared = _TAGS_TABLE.get(key)
+    if shared is None:
+        shared = _TAGS_TABLE[key] = _Tags(key)
+    return shared
+
+
+class _LazyField:
+    """Slot-backed field left as None until first read (then a fresh default)."""
+
+    def __init__(self, factory: Callable[[], Any]) -> None:
+        self.factory = factory
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.slot = f"_{name}"
+
+    def __get__(self, obj: Any, owner: type | None = None) -> Any:
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if value is None:
+            value = self.factory()
+            setattr(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj: Any, value: Any) -> None:
+        setattr(obj, self.slot, value)
+
+
+class _SchemaField(_LazyField):
+    """Stored as a shared interned schema; turned into a private dict on first read.
+
+    Like tags, internal hot paths read the raw slot (see ``ActionSpec._peek``).
+    """
+
+    def __get__(self, obj: Any, owner: type | None = None) -> Any:
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if value is None or isinstance(value, _FrozenDict):
+            value = {} if value is None else _thaw(value)
+            setattr(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj: Any, value: Any) -> None:
+        setattr(obj, self.slot, intern_schema(value))
+
+
+class _TagsField(_LazyField):
+    """Stored as a shared interned _Tags; turned into a private list on first read.
+
+    Internal hot paths read the raw slot (tuple or list) without materializing.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(list)
+
+    def __get__(self, obj: Any, owner: type | None = None) -> Any:
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if not isinstance(value, list):
+            value = list(value)
+            setattr(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj: Any, value: Any) -> None:
+        setattr(obj, self.slot, _intern_tags(value))
+
+
+@dataclass(init=False, repr=False, eq=False)
 class ActionSpec:
+    """Action metadata record.
+
+    Still a dataclass (``fields``/``asdict``/``replace`` work), in a compact
+    layout for very large libraries: ``__slots__`` storage, interned
+    version/tag strings, hash-consed schemas shared across specs (see
+    ``intern_schema``), and rarely used dict/list fields materialized on
+    first access. Public attributes are always private mutable values.
+    """
+
     id: str
     name: str
-    version: str = "0.1.0"
-    description: str = ""
-    inputs_schema: Dict[str, Any] = field(default_factory=dict)
-    outputs_schema: Dict[str, Any] = field(default_factory=dict)
-    requires: List[str] = field(default_factory=list)
-    environment_tags: List[str] = field(default_factory=list)
-    security: Dict[str, Any] = field(default_factory=dict)  # minimal-privilege declaration
-    effects_schema: Dict[str, Any] = field(default_factory=dict)  # structured side-effects
-    provenance: Dict[str, Any] = field(default_factory=dict)  # origin/validation/source info
-    validation: Dict[str, Any] = field(default_factory=dict)  # metrics: per_env_pass, last_verified_at
+    version: str
+    description: str
+    inputs_schema: Dict[str, Any]
+    outputs_schema: Dict[str, Any]
+    requires: List[str]
+    environment_tags: List[str]
+    security: Dict[str, Any]
+    effects_schema: Dict[str, Any]
+    provenance: Dict[str, Any]
+    validation: Dict[str, Any]
+
+    FIELDS = (
+        "id",
+        "name",
+        "version",
+        "description",
+        "inputs_schema",
+        "outputs_schema",
+        "requires",
+        "environment_tags",
+        "security",  # minimal-privilege declaration
+        "effects_schema",  # structured side-effects
+        "provenance",  # origin/validation/source info
+        "validation",  # metrics: per_env_pass, last_verified_at
+    )
+    __slots__ = (
+        "id",
+        "name",
+        "version",
+        "description",
+        "_inputs_schema",
+        "_outputs_schema",
+        "_requires",
+        "_environment_tags",
+        "_security",
+        "_effects_schema",
+        "_provenance",
+        "_validation",
+    )
+    __hash__ = None  # mutable record, like the dataclass (eq=True)
+
+    inputs_schema = _SchemaField(dict)
+    outputs_schema = _SchemaField(dict)
+    requires = _TagsField()
+    environment_tags = _TagsField()
+    security = _LazyField(dict)
+    effects_schema = _LazyField(dict)
+    provenance = _LazyField(dict)
+    validation = _LazyField(dict)
+
+    def __init__(
+        self,
+        id: str,
+        name: str,
+        version: str = "0.1.0",
+        description: str = "",
+        inputs_schema: Dict[str, Any] | None = None,
+        outputs_schema: Dict[str, Any] | None = None,
+        requires: List[str] | None = None,
+        environment_tags: List[str] | None = None,
+        security: Dict[str, Any] | None = None,
+        effects_schema: Dict[str, Any] | None = None,
+        provenance: Dict[str, Any] | None = None,
+        validation: Dict[str, Any] | None = None,
+    ) -> None:
+        self.id = id
+        self.name = name
+        self.version = sys.intern(version)
+        self.description = description
+        self.inputs_schema = inputs_schema
+        self.outputs_schema = outputs_schema
+        self.requires = requires
+        self.environment_tags = environment_tags
+        self._security = security or None
+        self._effects_schema = effects_schema or None
+        self._provenance = provenance or None
+        self._validation = validation or None
+
+    def _peek(self, name: str) -> Any:
+        # Read a field without materializing lazy storage (shared schemas stay
+        # read-only; internal callers must not mutate the result)
+        if name not in _LAZY_FIELDS:
+            return getattr(self, name)
+        raw = getattr(self, f"_{name}")
+        if isinstance(raw, _Tags):
+            return list(raw)
+        return {} if raw is None else raw
+
+    def _row(self) -> Dict[str, Any]:
+        return {f: self._peek(f) for f in self.FIELDS}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict in field order (the ``dump_specs`` row format)."""
+        row = self._row()
+        for f in ("inputs_schema", "outputs_schema"):
+            if isinstance(row[f], _FrozenDict):
+                row[f] = _thaw(row[f])
+        return row
+
+    @property
+    def __dict__(self) -> Dict[str, Any]:  # type: ignore[override]
+        # read-only stand-in for the old dataclass instance dict
+        return self.to_dict()
+
+    @classmethod
+    def from_dict(cls, row: Dict[str, Any]) -> "ActionSpec":
+        return cls(**{f: row[f] for f in cls.FIELDS if f in row})
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._row() == other._row()  # type: ignore[attr-defined]
+
+    def __repr__(self) -> str:
+        body = ", ".join(f"{f}={self._peek(f)!r}" for f in self.FIELDS)
+        return f"ActionSpec({body})"
+
+
+_LAZY_FIELDS = frozenset(f for f in ActionSpec.FIELDS if f"_{f}" in ActionSpec.__slots__)
+
+# search_with_scoring penalty per circuit breaker state (see engine.breaker)
+_BREAKER_PENALTY = {"open": 1.0, "half_open": 0.5}
+
+# ----------------------------
+# Env definition parsing (module-level so it can run in worker processes)
+# ----------------------------
+_ENV_FILE_SUFFIXES = (".yaml", ".yml")
+
+
+def _env_file_kind(path: Path) -> str:
+    return "txt" if path.suffix == ".txt" else "yaml"
+
+
+def _collect_env_files(source: str) -> List[Path]:
+    root = Path(source)
+    if root.is_dir():
+        paths = [p for p in root.rglob("*") if p.suffix in _ENV_FILE_SUFFIXES or p.name == "action_space.txt"]
+    else:
+        paths = [Path(p) for p in glob.glob(source, recursive=True)]
+    if yaml is None:
+        paths = [p for p in paths if _env_file_kind(p) == "txt"]
+    return sorted(p for p in paths if p.is_file())
+
+
+def _parse_action_space_text(text: str) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    for line in text.splitlines():
+        name = line.strip()
+        if not name or name.startswith("#"):
+            continue
+        rows.append({"name": name})
+    return rows
+
+
+def _parse_env_yaml_text(text: str) -> List[Dict[str, Any]]:
+    if yaml is None:
+        return []
+    data = yaml.safe_load(text) or {}
+    actions = (((data or {}).get("transition") or {}).get("actions")) or []
+    rows: List[Dict[str, Any]] = []
+    for a in actions:
+        name = a.get("name")
+        params = a.get("params", [])
+        if not name:
+            continue
+        inputs_schema = {
+            "type": "object",
+            "properties": {p: {"type": "string"} for p in params},
+            "required": list(params),
+        }
+        rows.append({"name": name, "inputs_schema": inputs_schema})
+    return rows
+
+
+def _parse_env_text(kind: str, text: str) -> List[Dict[str, Any]]:
+    return _parse_action_space_text(text) if kind == "txt" else _parse_env_yaml_text(text)
+
+
+def _rows_to_specs(rows: List[Dict[str, Any]], env_tag: str, source: str) -> List[ActionSpec]:
+    description = f"Imported from {source}"  # one string per file, shared by its specs
+    return [
+        ActionSpec(
+            id=f"{env_tag}:{row['name']}",
+            name=sys.intern(row["name"]),
+            environment_tags=[env_tag],
+            description=description,
+            inputs_schema=row.get("inputs_schema"),  # interned as a frozen copy
+        )
+        for row in rows
+    ]
+
+
+def _assign_import_ids(
+    merged: Dict[Tuple[str, str], ActionSpec], covered: Dict[Tuple[str, str], List[str]]
+) -> Tuple[List[ActionSpec], Dict[str, str]]:
+    """Give each merged import spec a distinct id; its other per-env ids become aliases.
+
+    One env can define an action twice (action_space.txt and yaml) with
+    different schemas. Specs with an inputs_schema claim ids first; a spec
+    whose ids are all taken is folded into the owner of its first id.
+    """
+    owner: Dict[str, ActionSpec] = {}
+    kept: Dict[int, None] = {}
+    for key in sorted(merged, key=lambda k: not merged[k]._inputs_schema):
+        spec = merged[key]
+        free = [i for i in covered[key] if i not in owner]
+        if free:
+            spec.id = free[0]
+            kept[id(spec)] = None
+            for i in free:
+                owner[i] = spec
+            continue
+        target = owner[covered[key][0]]
+        target.environment_tags = list(dict.fromkeys([*target._environment_tags, *spec._environment_tags]))
+        target.provenance["sources"].extend(spec.provenance["sources"])
+    specs = [s for s in merged.values() if id(s) in kept]
+    return specs, {i: s.id for i, s in owner.items() if i != s.id}
+
+
+def spec_to_param(spec: ActionSpec) -> Dict[str, Any]:
+    """Tool param for a metadata-only spec, shaped like BaseAction.to_param()."""
+    return {
+        "type": "function",
+        "function": {
+            "name": spec.name,
+            "description": spec.description,
+            "parameters": spec._peek("inputs_schema"),  # shared; read-only
+        },
+    }
+
+
+@dataclass(frozen=True)
+class ViewDef:
+    """Membership rule of a materialized view.
+
+    An action belongs to the view if it is listed in ``ids`` (e.g. an agent's
+    toolset) or if it satisfies every criterion given: ``tags`` subset of
+    its environment_tags, ``query`` substring of name/description, and
+    ``predicate`` (a query profile). A view with no criteria only holds ``ids``.
+    """
+
+    name: str
+    tags: FrozenSet[str] = frozenset()
+    query: Optional[str] = None
+    ids: FrozenSet[str] = frozenset()
+    predicate: Optional[Callable[[ActionSpec], bool]] = None
+
+    @property
+    def has_criteria(self) -> bool:
+        return bool(self.tags or self.query or self.predicate)
+
+    def matches(self, action_id: str, spec: ActionSpec) -> bool:
+        if action_id in self.ids:
+            return True
+        if not self.has_criteria:
+            return False
+        if self.tags and not self.tags.issubset(spec._environment_tags):
+            return False
+        if self.query:
+            q = self.query.lower()
+            if q not in spec.name.lower() and q not in spec.description.lower():
+                return False
+        return self.predicate is None or bool(self.predicate(spec))
+
+
+@dataclass(frozen=True)
+class ActionView:
+    """Immutable materialized subset of one snapshot.
+
+    Holds member ids in registry order plus a small lowercase text index
+    for query filtering; the ``to_param()`` tool list is built once per
+    view version.
+    """
+
+    definition: ViewDef
+    ids: Tuple[str, ...]
+    texts: Mapping[str, str]  # action id -> "name description" (lowercase)
+    _tools: Optional[List[Dict[str, Any]]] = field(default=None, init=False, compare=False, repr=False)
+
+    @classmethod
+    def build(cls, definition: ViewDef, specs: Mapping[str, ActionSpec]) -> "ActionView":
+        members = {aid: _view_text(spec) for aid, spec in specs.items() if definition.matches(aid, spec)}
+        return cls(definition=definition, ids=tuple(members), texts=MappingProxyType(members))
+
+    def updated(self, changed: Iterable[str], specs: Mapping[str, ActionSpec]) -> "ActionView":
+        """Apply changed ids; returns self if no member is affected."""
+        adds: Dict[str, str] = {}
+        drops: List[str] = []
+        for aid in changed:
+            spec = specs.get(aid)
+            if spec is not None and self.definition.matches(aid, spec):
+                adds[aid] = _view_text(spec)
+            elif aid in self.texts:
+                drops.append(aid)
+        if not adds and not drops:
+            return self
+        texts = dict(self.texts)
+        for aid in drops:
+            del texts[aid]
+        texts.update(adds)
+        return ActionView(definition=self.definition, ids=tuple(texts), texts=MappingProxyType(texts))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str | None = None) -> List[str]:
+        if not query:
+            return list(self.ids)
+        q = query.lower()
+        return [aid for aid in self.ids if q in self.texts[aid]]
+
+    def tools(self, snap: "ActionSpaceSnapshot") -> List[Dict[str, Any]]:
+        """``to_param()`` of every member (spec-derived when unbound), cached."""
+        if self._tools is None:
+            tools = []
+            for aid in self.ids:
+                action = snap.registry.get(aid)
+                tools.append(action.to_param() if action is not None else spec_to_param(snap.specs[aid]))
+            object.__setattr__(self, "_tools", tools)
+        return self._tools
+
+
+def _view_text(spec: ActionSpec) -> str:
+    # Kept separate so a name match can't straddle the name/description boundary
+    return f"{spec.name.lower()}\n{spec.description.lower()}"
+
+
+@dataclass(frozen=True)
+class ActionSpaceSnapshot:
+    """Immutable, versioned view of an ActionSpace.
+
+    Readers hold on to a snapshot for as long as they need a consistent view;
+    writers never mutate a published snapshot, they publish a new one.
+    """
+
+    version: int
+    registry: Mapping[str, BaseAction]
+    specs: Mapping[str, ActionSpec]
+    ids: Tuple[str, ...]  # registered action ids, in registration order
+    views: Mapping[str, ActionView] = field(default_factory=lambda: MappingProxyType({}))
+    tag_views: Mapping[FrozenSet[str], str] = field(default_factory=lambda: MappingProxyType({}))  # pure tag filter -> view name
+    aliases: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))  # merged duplicate id -> canonical id
+
+    def resolve(self, action_id: str) -> str:
+        return self.aliases.get(action_id, action_id)
+
+    def get(self, action_id: str) -> Optional[BaseAction]:
+        return self.registry.get(self.aliases.get(action_id, action_id))
+
+    def spec(self, action_id: str) -> Optional[ActionSpec]:
+        return self.specs.get(self.aliases.get(action_id, action_id))
+
+
+class _Batch:
+    """Pending mutations; copies the published dicts on first write."""
+
+    def __init__(self, base: ActionSpaceSnapshot) -> None:
+        self.base = base
+        self.registry: Optional[Dict[str, BaseAction]] = None
+        self.specs: Optional[Dict[str, ActionSpec]] = None
+        self.views: Optional[Dict[str, ActionView]] = None
+        self.aliases: Optional[Dict[str, str]] = None
+        self.changed: Dict[str, None] = {}  # ids touched, in order (drives view upkeep)
+        self.depth = 0
+
+    def _reg(self) -> Dict[str, BaseAction]:
+        if self.registry is None:
+            self.registry = dict(self.base.registry)
+        return self.registry
+
+    def _spc(self) -> Dict[str, ActionSpec]:
+        if self.specs is None:
+            self.specs = dict(self.base.specs)
+        return self.specs
+
+    def _vws(self) -> Dict[str, ActionView]:
+        if self.views is None:
+            self.views = dict(self.base.views)
+        return self.views
+
+    def _als(self) -> Dict[str, str]:
+        if self.aliases is None:
+            self.aliases = dict(self.base.aliases)
+        return self.aliases
+
+    def current_specs(self) -> Mapping[str, ActionSpec]:
+        return self.specs if self.specs is not None else self.base.specs
+
+    def current_registry(self) -> Mapping[str, BaseAction]:
+        return self.registry if self.registry is not None else self.base.registry
+
+    def register(self, action_id: str, action: BaseAction, spec: ActionSpec) -> None:
+        self._reg()[action_id] = action
+        self._spc()[action_id] = spec
+        self.changed[action_id] = None
+
+    def bind(self, action_id: str, action: BaseAction) -> None:
+        self._reg()[action_id] = action
+        self.changed[action_id] = None
+
+    def alias(self, alias_id: str, canonical_id: str, rechain: bool = False) -> None:
+        als = self._als()
+        if rechain:  # alias_id was itself canonical: its aliases follow it
+            for old, target in list(als.items()):
+                if target == alias_id:
+                    als[old] = canonical_id
+        als[alias_id] = canonical_id
+
+    def register_specs(self, specs: Iterable[ActionSpec]) -> None:
+        spc = self._spc()
+        for spec in specs:
+            spc[spec.id] = spec
+            self.changed[spec.id] = None
+
+    def drop(self, action_id: str) -> None:
+        """Remove the action and spec, leaving aliases untouched."""
+        if action_id in self.current_registry():
+            self._reg().pop(action_id, None)
+        if action_id in self.current_specs():
+            self._spc().pop(action_id, None)
+        self.changed[action_id] = None
+
+    def unregister(self, action_id: str) -> None:
+        self.drop(action_id)
+        als = self.aliases if self.aliases is not None else self.base.aliases
+        if action_id in als or action_id in als.values():
+            self.aliases = {a: t for a, t in als.items() if a != action_id and t != action_id}
+
+    def define_view(self, definition: ViewDef) -> ActionView:
+        # Materialize against pending specs; later changes in this batch apply on build
+        specs = self.specs if self.specs is not None else self.base.specs
+        view = ActionView.build(definition, specs)
+        self._vws()[definition.name] = view
+        return view
+
+    def drop_view(self, name: str) -> None:
+        if name in (self.views if self.views is not None else self.base.views):
+            self._vws().pop(name, None)
+
+    @property
+    def dirty(self) -> bool:
+        return any(m is not None for m in (self.registry, self.specs, self.views, self.aliases))
+
+    def build(self) -> ActionSpaceSnapshot:
+        registry = self.base.registry if self.registry is None else MappingProxyType(self.registry)
+        specs = self.base.specs if self.specs is None else MappingProxyType(self.specs)
+        ids = self.base.ids if self.registry is None else tuple(self.registry)
+        views: Mapping[str, ActionView] = self.base.views
+        tag_views = self.base.tag_views
+        if self.changed or self.views is not None:
+            pending = self.views if self.views is not None else dict(self.base.views)
+            views = MappingProxyType({name: v.updated(self.changed, specs) for name, v in pending.items()})
+            tag_views = MappingProxyType(
+                {
+                    v.definition.tags: name
+                    for name, v in views.items()
+                    if v.definition.tags and not (v.definition.query or v.definition.predicate or v.definition.ids)
+                }
+            )
+        return ActionSpaceSnapshot(
+            version=self.base.version + 1,
+            registry=registry,
+            specs=specs,
+            ids=ids,
+            views=views,
+            tag_views=tag_views,
+            aliases=self.base.aliases if self.aliases is None else MappingProxyType(self.aliases),
+        )
 
 
 class ActionSpace:
@@ -34,45 +698,238 @@ class ActionSpace:
 
     This is a metadata registry; execution uses callables that conform
     to BaseAction (or Agent-as-Action) protocol.
+
+    State is published as copy-on-write ActionSpaceSnapshot versions: reads
+    are lock-free (a single attribute load), writers serialize on a lock,
+    batch their mutations (see ``batch()``) and swap in a new version.
     """
 
-    def __init__(self) -> None:
-        self._registry: Dict[str, BaseAction] = {}
-        self._specs: Dict[str, ActionSpec] = {}
+    def __init__(
+        self,
+        memo: Optional[ResultMemo] = None,
+        dedup: Optional["NearDuplicateIndex"] = None,
+        validate_params: bool = True,
+        deadline_share: float = 0.9,
+    ) -> None:
+        # under a deadline, a nested call gets this share of the caller's remaining time
+        self.deadline_share = deadline_share
+        # params are checked against spec.inputs_schema before dispatch (see engine.schema);
+        # specs imported from env definitions (untyped params) only warn
+        self.validators: Optional[ValidatorCache] = ValidatorCache() if validate_params else None
+        self._lenient_warned: set = set()
+        # opt-in result cache for actions declared pure/idempotent (see core.memo)
+        self.memo = memo
+        # opt-in near-duplicate consolidation on registration (see core.dedup)
+        self.dedup = dedup
+        self._snapshot = ActionSpaceSnapshot(version=0, registry=MappingProxyType({}), specs=MappingProxyType({}), ids=())
+        self._write_lock = threading.RLock()
+        self._batch: Optional[_Batch] = None
+        self._pinned: ContextVar[Optional[ActionSpaceSnapshot]] = ContextVar(f"action_space_pin_{id(self)}", default=None)
+        # content-hash -> parsed action rows (see import_from_env_dir)
+        self._import_cache: Dict[str, List[Dict[str, Any]]] = {}
+        # action id -> run outcome counters, outside the snapshot (see record_outcome)
+        self._outcomes: Dict[str, Dict[str, Any]] = {}
+        self._outcomes_dirty: set = set()
+        self._outcome_lock = threading.Lock()
+
+    # ----------------------------
+    # Snapshots
+    # ----------------------------
+    @property
+    def _registry(self) -> Mapping[str, BaseAction]:
+        return self.snapshot().registry
+
+    @property
+    def _specs(self) -> Mapping[str, ActionSpec]:
+        return self.snapshot().specs
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def snapshot(self) -> ActionSpaceSnapshot:
+        """Return the snapshot pinned in this context, else the latest one."""
+        return self._pinned.get() or self._snapshot
+
+    @contextmanager
+    def pin(self) -> Iterator[ActionSpaceSnapshot]:
+        """Pin the current snapshot for reads in this context (e.g. one step).
+
+        Pinning is per asyncio task / thread (contextvars), so concurrent
+        tasks each keep their own consistent view while writers publish.
+        """
+        token = self._pinned.set(self._snapshot)
+        try:
+            yield self._snapshot
+        finally:
+            self._pinned.reset(token)
+
+    @contextmanager
+    def batch(self) -> Iterator[_Batch]:
+        """Group mutations into a single published version.
+
+        Nested batches (and register/unregister calls made inside one on
+        the same thread) join the outermost batch. Mutations are discarded
+        if the block raises.
+        """
+        with self._write_lock:
+            b = self._batch
+            if b is None:
+                b = self._batch = _Batch(self._snapshot)
+            b.depth += 1
+            try:
+                yield b
+            except BaseException:
+                if b.depth == 1:
+                    self._batch = None
+                raise
+            finally:
+                b.depth -= 1
+            if b.depth == 0:
+                self._batch = None
+                if b.dirty:
+                    self._snapshot = b.build()
 
     # ----------------------------
     # Register/Unregister
     # ----------------------------
     def register(self, action_id: str, action: BaseAction, spec: Optional[ActionSpec] = None) -> None:
-        self._registry[action_id] = action
         if spec is None:
             spec = ActionSpec(id=action_id, name=action.name, description=action.description or "")
-        self._specs[action_id] = spec
+        with self.batch() as b:
+            target = self._consolidate(b, spec) if action_id == spec.id else None
+            if target is None:
+                b.register(action_id, action, spec)
+            elif target not in b.current_registry():
+                b.bind(target, action)  # canonical was metadata-only; adopt this implementation
+
+    def register_specs(self, specs: Iterable[ActionSpec]) -> None:
+        """Register metadata-only specs in one batch (no bound implementation)."""
+        with self.batch() as b:
+            if self.dedup is None:
+                b.register_specs(specs)
+                return
+            b.register_specs(spec for spec in specs if self._consolidate(b, spec) is None)
+
+    def _consolidate(self, b: _Batch, spec: ActionSpec) -> Optional[str]:
+        """Merge ``spec`` into a near-duplicate; returns the canonical id if merged."""
+        if self.dedup is None or spec.id in b.current_specs():
+            return None
+        target = self.dedup.find(spec)
+        canonical = b.current_specs().get(target) if target is not None else None
+        if canonical is None:
+            self.dedup.add(spec)
+            return None
+        from .dedup import merge_specs
+
+        b.register_specs([merge_specs(canonical, spec)])
+        b.alias(spec.id, canonical.id)
+        return canonical.id
+
+    def compact_duplicates(self) -> Dict[str, str]:
+        """Batch-consolidate the whole library; returns alias -> canonical id.
+
+        Uses ``self.dedup`` (rebuilt from scratch) or a default index.
+        """
+        from .dedup import NearDuplicateIndex, compact_specs
+
+        index = self.dedup if self.dedup is not None else NearDuplicateIndex()
+        with self.batch() as b:
+            index.clear()
+            kept, aliases = compact_specs(list(b.current_specs().values()), index)
+            registry = b.current_registry()
+            for alias_id, target in aliases.items():
+                action = registry.get(alias_id)
+                b.drop(alias_id)
+                if action is not None and target not in b.current_registry():
+                    b.bind(target, action)
+                b.alias(alias_id, target, rechain=True)
+            b.register_specs(s for s in kept if s.id in aliases.values())
+        return aliases
 
     def unregister(self, action_id: str) -> None:
-        self._registry.pop(action_id, None)
-        self._specs.pop(action_id, None)
+        with self.batch() as b:
+            if self.dedup is not None:
+                self.dedup.remove(action_id)
+            b.unregister(action_id)
+
+    # ----------------------------
+    # Materialized views
+    # ----------------------------
+    def define_view(
+        self,
+        name: str,
+        tags: Sequence[str] = (),
+        query: str | None = None,
+        ids: Sequence[str] = (),
+        predicate: Callable[[ActionSpec], bool] | None = None,
+    ) -> ActionView:
+        """Define (or redefine) a named subset kept up to date on register/unregister.
+
+        Typical views: ``env:gaia`` (tags), an agent's toolset (ids), or a
+        query profile (query/predicate). Pure tag views also serve
+        ``search(tags=...)`` directly.
+        """
+        definition = ViewDef(name=name, tags=frozenset(tags), query=query, ids=frozenset(ids), predicate=predicate)
+        with self.batch() as b:
+            b.define_view(definition)
+        # latest version: a pinned reader still sees its own snapshot
+        return self._snapshot.views[name]
+
+    def ensure_view(self, name: str, tags: Sequence[str] = ()) -> ActionView:
+        """Return the view ``name``, defining it as a tag view on first use."""
+        view = self._snapshot.views.get(name)
+        if view is not None:
+            return view
+        return self.define_view(name, tags=tags)
+
+    def drop_view(self, name: str) -> None:
+        with self.batch() as b:
+            b.drop_view(name)
+
+    def view(self, name: str) -> Optional[ActionView]:
+        return self.snapshot().views.get(name)
+
+    def view_tools(self, name: str) -> List[Dict[str, Any]]:
+        """Cached ``to_param()`` tool list of a view (for prompt building)."""
+        snap = self.snapshot()
+        view = snap.views.get(name)
+        if view is None:
+            raise KeyError(f"View {name!r} not defined")
+        return view.tools(snap)
 
     def get(self, action_id: str) -> Optional[BaseAction]:
-        return self._registry.get(action_id)
+        return self.snapshot().get(action_id)
 
     def spec(self, action_id: str) -> Optional[ActionSpec]:
-        return self._specs.get(action_id)
+        return self.snapshot().spec(action_id)
+
+    def resolve(self, action_id: str) -> str:
+        """Canonical id for an alias of a merged duplicate (else the id itself)."""
+        return self.snapshot().resolve(action_id)
 
     # ----------------------------
     # Retrieval
     # ----------------------------
-    def list_actions(self) -> List[str]:
-        return list(self._registry.keys())
+    def list_actions(self) -> Sequence[str]:
+        # immutable per version; no copy per call
+        return self.snapshot().ids
 
     def search(self, query: str | None = None, tags: Sequence[str] | None = None) -> List[str]:
+        return self._search(self.snapshot(), query, tags)
+
+    @staticmethod
+    def _search(snap: ActionSpaceSnapshot, query: str | None, tags: Sequence[str] | None) -> List[str]:
+        tag_set = frozenset(tags or [])
+        if tag_set and tag_set in snap.tag_views:
+            # O(view size) instead of a full registry scan
+            return snap.views[snap.tag_views[tag_set]].search(query)
         query_l = (query or "").lower()
-        tags = list(tags or [])
         out: List[str] = []
-        for aid, spec in self._specs.items():
+        for aid, spec in snap.specs.items():
             if query and (query_l not in spec.name.lower() and query_l not in spec.description.lower()):
                 continue
-            if tags and not set(tags).issubset(set(spec.environment_tags)):
+            if tag_set and not tag_set.issubset(spec._environment_tags):
                 continue
             out.append(aid)
         return out
@@ -87,16 +944,20 @@ class ActionSpace:
     ) -> List[str]:
         """Search and rank by a simplified scoring formula.
 
-        score = a*semantic + b*per_env_pass + c*(1/avg_cost_norm)
+        score = a*semantic + b*per_env_pass + c*(1/avg_cost_norm) + e*success - d*breaker
         Where semantic is a trivial lexical match proxy here; per_env_pass and
-        avg_cost_norm are taken from spec.validation if present.
+        avg_cost_norm are taken from spec.validation if present; success is
+        the smoothed success rate (successes+1)/(runs+2) from recorded
+        outcomes (see record_outcome); breaker is 1 for an open circuit
+        breaker (0.5 half-open) as written by ToolExecutor.
         """
-        weights = weights or {"semantic": 1.0, "per_env_pass": 1.0, "inv_cost": 0.0}
-        candidates = self.search(query=query, tags=tags)
+        weights = weights or {"semantic": 1.0, "per_env_pass": 1.0, "inv_cost": 0.0, "success": 0.5, "breaker": 2.0}
+        snap = self.snapshot()
+        candidates = self._search(snap, query, tags)
         q = (query or "").lower()
         scored: List[tuple[str, float]] = []
         for aid in candidates:
-            spec = self._specs.get(aid)
+            spec = snap.specs.get(aid)
             if not spec:
                 continue
             # semantic proxy: 1 if any query token in name/desc, else 0
@@ -105,7 +966,7 @@ class ActionSpace:
                 tokens = [t for t in q.split() if t]
                 text = f"{spec.name} {spec.description}".lower()
                 sem = 1.0 if any(t in text for t in tokens) else 0.0
-            val = spec.validation or {}
+            val = spec._peek("validation")
             pep = 0.0
             if env and isinstance(val.get("per_env_pass"), dict):
                 try:
@@ -114,10 +975,16 @@ class ActionSpace:
                     pep = 0.0
             avg_cost_norm = float(val.get("avg_cost_norm", 1.0) or 1.0)
             inv_cost = (1.0 / avg_cost_norm) if avg_cost_norm > 0 else 0.0
+            runs = self._outcomes.get(aid) or val
+            success = (int(runs.get("successes", 0)) + 1) / (int(runs.get("runs", 0)) + 2)
+            breaker = val.get("breaker")
+            broken = _BREAKER_PENALTY.get(breaker.get("state"), 0.0) if isinstance(breaker, dict) else 0.0
             score = (
                 weights.get("semantic", 0.0) * sem
                 + weights.get("per_env_pass", 0.0) * pep
                 + weights.get("inv_cost", 0.0) * inv_cost
+                + weights.get("success", 0.0) * success
+                - weights.get("breaker", 0.0) * broken
             )
             scored.append((aid, score))
         scored.sort(key=lambda x: x[1], reverse=True)
@@ -133,20 +1000,8 @@ class ActionSpace:
         This method creates metadata specs only; concrete implementations
         should be bound by the integrator as BaseAction subclasses.
         """
-        specs: List[ActionSpec] = []
-        for line in Path(file_path).read_text(encoding="utf-8").splitlines():
-            name = line.strip()
-            if not name or name.startswith("#"):
-                continue
-            specs.append(
-                ActionSpec(
-                    id=f"{env_tag}:{name}",
-                    name=name,
-                    environment_tags=[env_tag],
-                    description=f"Imported from {file_path}",
-                )
-            )
-        return specs
+        text = Path(file_path).read_text(encoding="utf-8")
+        return _rows_to_specs(_parse_action_space_text(text), env_tag, file_path)
 
     def import_from_env_yaml(self, yaml_path: str, env_tag: str) -> List[ActionSpec]:
         """Parse AutoEnv-like YAML with transition.actions structure.
@@ -155,42 +1010,203 @@ class ActionSpace:
         """
         if yaml is None:
             return []
-        data = yaml.safe_load(Path(yaml_path).read_text(encoding="utf-8")) or {}
-        actions = (((data or {}).get("transition") or {}).get("actions")) or []
-        specs: List[ActionSpec] = []
-        for a in actions:
-            name = a.get("name")
-            params = a.get("params", [])
-            if not name:
-                continue
-            inputs_schema = {
-                "type": "object",
-                "properties": {p: {"type": "string"} for p in params},
-                "required": list(params),
-            }
-            specs.append(
-                ActionSpec(
-                    id=f"{env_tag}:{name}",
-                    name=name,
-                    environment_tags=[env_tag],
-                    description=f"Imported from {yaml_path}",
-                    inputs_schema=inputs_schema,
-                )
-            )
+        text = Path(yaml_path).read_text(encoding="utf-8")
+        return _rows_to_specs(_parse_env_yaml_text(text), env_tag, yaml_path)
+
+    def import_from_env_dir(
+        self,
+        source: str,
+        env_tag: str | None = None,
+        cache_path: str | None = None,
+        max_workers: int | None = None,
+        register: bool = True,
+    ) -> List[ActionSpec]:
+        """Bulk-import env definitions from a directory or glob pattern.
+
+        Matches ``*.yaml``/``*.yml`` (``transition.actions``) and
+        ``action_space.txt`` files. Each file is tagged with ``env_tag`` or,
+        by default, the name of its parent directory (AutoEnv layout).
+
+        - Files are keyed by a content hash; unchanged files are served from
+          the parse cache (in-memory, plus ``cache_path`` JSON if given).
+        - Uncached files are parsed in a process pool (``max_workers=0``
+          parses in-process).
+        - Identical actions (same name and inputs_schema) across environments
+          collapse into one spec whose ``environment_tags`` are merged; the
+          per-env ids it replaces are registered as aliases of it.
+        - With ``register=True`` all specs are registered in one batch.
+        """
+        files = _collect_env_files(source)
+        cache = self._load_import_cache(cache_path)
+        digests: List[str] = []
+        todo: Dict[str, Tuple[str, str]] = {}
+        for fp in files:
+            raw = fp.read_bytes()
+            digest = f"{_env_file_kind(fp)}:{hashlib.sha256(raw).hexdigest()}"
+            digests.append(digest)
+            if digest not in cache and digest not in todo:
+                todo[digest] = (_env_file_kind(fp), raw.decode("utf-8"))
+
+        if todo:
+            keys = list(todo.keys())
+            kinds = [todo[k][0] for k in keys]
+            texts = [todo[k][1] for k in keys]
+            if max_workers == 0 or len(keys) == 1:
+                parsed = list(map(_parse_env_text, kinds, texts))
+            else:
+                workers = max_workers or os.cpu_count() or 1
+                chunk = max(1, len(keys) // (4 * workers))
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    parsed = list(pool.map(_parse_env_text, kinds, texts, chunksize=chunk))
+            cache.update(zip(keys, parsed))
+            if cache_path:
+                self._save_import_cache(cache_path, cache)
+
+        # Dedupe identical actions across environments by merging tags
+        merged: Dict[Tuple[str, str], ActionSpec] = {}
+        covered: Dict[Tuple[str, str], List[str]] = {}  # per-env ids folded into each merged spec
+        for fp, digest in zip(files, digests):
+            tag = env_tag or fp.parent.name
+            for spec in _rows_to_specs(cache[digest], tag, str(fp)):
+                key = (spec.name, json.dumps(spec._peek("inputs_schema"), sort_keys=True))
+                prev = merged.get(key)
+                if prev is None:
+                    spec.provenance = {"from": "env", "sources": [str(fp)]}
+                    merged[key] = spec
+                    covered[key] = [spec.id]
+                    continue
+                if spec.id not in covered[key]:
+                    covered[key].append(spec.id)
+                if tag not in prev._environment_tags:
+                    prev.environment_tags = [*prev._environment_tags, tag]
+                prev.provenance["sources"].append(str(fp))
+
+        specs, aliases = _assign_import_ids(merged, covered)
+        if register:
+            with self.batch() as b:
+                self.register_specs(specs)
+                for alias_id, target in aliases.items():
+                    if alias_id in b.current_registry():
+                        continue  # bound implementation under that id; leave it alone
+                    if alias_id in b.current_specs():
+                        b.drop(alias_id)  # stale per-env spec from an earlier import
+                    current = b.aliases if b.aliases is not None else b.base.aliases
+                    b.alias(alias_id, current.get(target, target))
         return specs
 
+    def _load_import_cache(self, cache_path: str | None) -> Dict[str, List[Dict[str, Any]]]:
+        if cache_path and not self._import_cache:
+            try:
+                self._import_cache.update(json.loads(Path(cache_path).read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                pass
+        return self._import_cache
+
+    @staticmethod
+    def _save_import_cache(cache_path: str, cache: Dict[str, List[Dict[str, Any]]]) -> None:
+        path = Path(cache_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(json.dumps(cache, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(path)
+
     # ----------------------------
     # Usage
     # ----------------------------
     async def use(self, action_id: str, params: Dict[str, Any]) -> Any:
-        action = self.get(action_id)
+        snap = self.snapshot()
+        action = snap.get(action_id)
         if action is None:
             raise KeyError(f"Action {action_id!r} not found")
+        spec = snap.spec(action_id)
+        if self.validators is not None and spec is not None:
+            # raises ParamValidationError with structured errors for the agent
+            try:
+                self.validators.check(spec.id, spec.version, spec._inputs_schema, params)
+            except ParamValidationError as e:
+                if spec._peek("provenance").get("from") != "env":
+                    raise
+                # env imports only list param names (the importer types them as
+                # required strings), so their schemas are advisory: warn once
+                if spec.id not in self._lenient_warned:
+                    self._lenient_warned.add(spec.id)
+                    log_warn(f"{e.feedback()}\n(imported spec; not enforced)")
+        with action_step() as rec:
+            try:
+                if current_deadline().expires_at is not None:
+                    # nested agents/actions see a shrinking deadline; expiry cancels the subtree
+                    with deadline_scope(share=self.deadline_share):
+                        out = await with_deadline(self._dispatch(action, spec, params))
+                else:
+                    out = await self._dispatch(action, spec, params)
+            except Exception:
+                if rec is not None:
+                    rec.add(action_id, params, False)
+                raise
+            if rec is not None:
+                rec.add(action_id, params, True)
+        return out
+
+    async def _dispatch(self, action: BaseAction, spec: Optional[ActionSpec], params: Dict[str, Any]) -> Any:
+        if self.memo is not None and spec is not None and is_memoizable(spec):
+            return await self.memo.get_or_call(spec, params, lambda: action(**params))
         return await action(**params)
 
+    # ----------------------------
+    # Outcome stats
+    # ----------------------------
+    def record_outcome(self, action_id: str, ok: bool, won: bool = False, latency_p90_s: Optional[float] = None) -> None:
+        """Count one run of ``action_id`` (runs/successes/wins, latency p90).
+
+        Kept in a side table read by search_with_scoring, so recording does
+        not publish a snapshot; ``publish_outcomes()`` folds the counters
+        into ``spec.validation`` in one batch.
+        """
+        aid = self.resolve(action_id)
+        with self._outcome_lock:
+            st = self._outcomes.get(aid)
+            if st is None:
+                spec = self.spec(aid)
+                val = spec._peek("validation") if spec is not None else {}
+                st = self._outcomes[aid] = {k: int(val.get(k, 0)) for k in ("runs", "successes", "wins")}
+            st["runs"] += 1
+            st["successes"] += 1 if ok else 0
+            st["wins"] += 1 if won else 0
+            if latency_p90_s is not None:
+                st["latency_p90_s"] = latency_p90_s
+            self._outcomes_dirty.add(aid)
+
+    def outcome_stats(self, action_id: str) -> Dict[str, Any]:
+        return dict(self._outcomes.get(self.resolve(action_id)) or {})
+
+    def publish_outcomes(self) -> int:
+        """Write recorded outcome counters into ``spec.validation`` (one new version); returns specs updated."""
+        with self._outcome_lock:
+            dirty = {aid: dict(self._outcomes[aid]) for aid in self._outcomes_dirty}
+            self._outcomes_dirty.clear()
+        if not dirty:
+            return 0
+        with self.batch() as b:
+            current = b.current_specs()
+            out = []
+            for aid, st in dirty.items():
+                spec = current.get(aid)
+                if spec is not None:
+                    out.append(ActionSpec.from_dict({**spec.to_dict(), "validation": {**spec._peek("validation"), **st}}))
+            b.register_specs(out)
+        return len(out)
+
     # ----------------------------
     # Persistence (optional)
     # ----------------------------
     def dump_specs(self, out_path: str) -> None:
-        rows = [spec.__dict__ for spec in self._specs.values()]
+        self.publish_outcomes()
+        rows = [spec._row() for spec in self._specs.values()]
         Path(out_path).write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    def load_specs(self, in_path: str) -> List[ActionSpec]:
+        """Register metadata-only specs from a ``dump_specs`` file."""
+        rows = json.loads(Path(in_path).read_text(encoding="utf-8"))
+        specs = [ActionSpec.from_dict(r) for r in rows]
+        self.register_specs(specs)
+        return specs
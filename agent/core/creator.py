@@ -1,13 +1,27 @@
 from __future__ import annotations
 
 import asyncio
+import json
+import time
+from collections import deque
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Sequence
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence
 
 from engine.async_llm import AsyncLLM, create_llm_instance
-from engine.formatter import BaseFormatter, JSONListOfActionSpecsFormatter
+from engine.costs import estimate_tokens, usage_total_tokens
+from engine.formatter import BaseFormatter, FormatError, JSONListOfActionSpecsFormatter
+from engine.router import SITE_SYNTHESIS
+from runtime.deadline import DeadlineExceeded, with_deadline
 from .action_space import ActionSpace, ActionSpec
 from .bases import BaseAction, BaseAgent
+from .synth_batcher import SynthesisBatcher
+from .synth_cache import SynthesisCache, cosine, hashed_embedding
+from .tool_catalog import RenderedCatalog, ToolCatalog
+from .trajectory import TraceRecorder, TrajectoryCache, current_recorder, recording
+
+
+def env_view_name(tags: Sequence[str]) -> str:
+    return "env:" + "+".join(sorted(set(tags)))
 
 
 @dataclass
@@ -18,6 +32,80 @@ class CreatorConfig:
     # synthesis triggers
     synth_min_candidates: int = 1  # trigger if retrieved candidates < M
     synth_min_avg_pass: float = 0.0  # trigger if avg per_env_pass of Top-N < theta
+    # retrieval: materialize one ActionSpace view per tag set (see ActionSpace.define_view)
+    env_views: bool = True
+    # candidate execution policy: "sequential" | "parallel" | "race" | "hedged"
+    exec_mode: str = "sequential"
+    exec_concurrency: int = 4  # max candidates in flight (parallel/race/hedged)
+    action_timeout_s: float | None = None  # default when action.exec_policy has no "timeout"
+    hedge_quantile: float = 0.9  # hedged: start next candidate past this latency quantile
+    hedge_default_delay_s: float = 1.0  # hedged: delay before any latency history exists
+    outcome_publish_every: int = 100  # candidate outcomes between publishes into spec.validation
+    # speculative synthesis: start the LLM call alongside retrieval when the
+    # predicted trigger probability is >= speculate_threshold
+    speculative_synthesis: bool = False
+    speculate_threshold: float = 0.6
+    # stream synthesis responses: specs are parsed (and registered) as each
+    # object closes, and generation stops at the first structural error
+    stream_synthesis: bool = False
+    # engine.router.CascadeRouter; synthesis then runs under its "creator.synthesis" policy
+    router: Any | None = None
+    # goals matching a learned action sequence replay it; planning takes over at the first failing step
+    trajectory_cache: TrajectoryCache | None = None
+
+
+class _LatencyStats:
+    """Recent per-action latencies for hedging decisions."""
+
+    def __init__(self, window: int = 50) -> None:
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, action_id: str, latency_s: float) -> None:
+        self._samples.setdefault(action_id, deque(maxlen=self.window)).append(latency_s)
+
+    def quantile(self, action_id: str, q: float) -> Optional[float]:
+        samples = self._samples.get(action_id)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _TriggerPredictor:
+    """Cheap estimate of P(synthesis triggers) for a goal before retrieval.
+
+    Signals: the env view holding fewer than ``synth_min_candidates`` specs
+    (certain trigger), the env's past trigger rate (Laplace-smoothed) and
+    goal novelty (1 - max similarity to recent goals for the env).
+    """
+
+    def __init__(self, window: int = 200, rate_weight: float = 0.6) -> None:
+        self.rate_weight = rate_weight
+        self._counts: Dict[str, List[int]] = {}  # env -> [triggers, total]
+        self._recent: Dict[str, Deque[Dict[int, float]]] = {}
+        self._window = window
+
+    @staticmethod
+    def _env(tags: Sequence[str] | None) -> str:
+        return ",".join(sorted(set(tags or [])))
+
+    def predict(self, goal: str, tags: Sequence[str] | None, view_size: Optional[int], min_candidates: int) -> float:
+        if view_size is not None and view_size < min_candidates:
+            return 1.0
+        env = self._env(tags)
+        triggers, total = self._counts.get(env, [0, 0])
+        rate = (triggers + 1) / (total + 2)
+        vec = hashed_embedding(goal)
+        novelty = 1.0 - max((cosine(vec, v) for v in self._recent.get(env, ())), default=0.0)
+        return self.rate_weight * rate + (1.0 - self.rate_weight) * novelty
+
+    def record(self, goal: str, tags: Sequence[str] | None, triggered: bool) -> None:
+        env = self._env(tags)
+        counts = self._counts.setdefault(env, [0, 0])
+        counts[0] += int(triggered)
+        counts[1] += 1
+        self._recent.setdefault(env, deque(maxlen=self._window)).append(hashed_embedding(goal))
 
 
 class AgentCreator:
@@ -29,94 +117,447 @@ class AgentCreator:
     registers the successful ones.
     """
 
-    def __init__(self, action_space: ActionSpace, config: CreatorConfig):
+    def __init__(
+        self,
+        action_space: ActionSpace,
+        config: CreatorConfig,
+        synth_cache: Optional[SynthesisCache] = None,
+        synth_batcher: Optional[SynthesisBatcher] = None,
+    ):
         self.action_space = action_space
         self.config = config
+        # paraphrased goals reuse earlier synthesis results (see core.synth_cache)
+        self.synth_cache = synth_cache
+        # shared between concurrent creators to batch their synthesis calls
+        self.synth_batcher = synth_batcher
         self.llm: Optional[AsyncLLM] = None
-        if config.llm_config is not None:
+        if config.router is not None:
+            self.llm = config.router.client(SITE_SYNTHESIS)
+        elif config.llm_config is not None:
             self.llm = create_llm_instance(config.llm_config)
+        self._latency = _LatencyStats()
+        self._outcomes_recorded = 0
+        # cached, token-budgeted tool lists for step prompts
+        self.tool_catalog = ToolCatalog(action_space)
+        self._predictor = _TriggerPredictor()
+        self._spec_stats = {"speculated": 0, "used": 0, "cancelled": 0, "missed": 0, "latency_saved_s": 0.0, "tokens_wasted": 0}
+        self._stream_stats = {"streams": 0, "aborted": 0, "fallbacks": 0, "first_spec_s": 0.0, "total_s": 0.0}
 
-    async def retrieve_candidates(self, query: str, tags: Sequence[str] | None = None, limit: int = 5) -> List[str]:
+    async def retrieve_candidates(
+        self, query: str, tags: Sequence[str] | None = None, limit: int = 5, offload: bool = False
+    ) -> List[str]:
+        """Top ``limit`` action ids for ``query``.
+
+        With ``offload`` the search runs in a worker thread (the pinned
+        ActionSpace version carries over), so tasks such as a speculative
+        synthesis make progress on the loop meanwhile.
+        """
+        if offload:
+            return await asyncio.to_thread(self._retrieve, query, tags, limit)
+        return self._retrieve(query, tags, limit)
+
+    def _retrieve(self, query: str, tags: Sequence[str] | None, limit: int) -> List[str]:
         # Basic retrieval; could be swapped to search_with_scoring for env-specific weighting
+        if tags and self.config.env_views:
+            # search(tags=...) is then served from the view in O(view size)
+            self.action_space.ensure_view(env_view_name(tags), tags)
         ids = self.action_space.search(query=query, tags=tags)
         return ids[:limit]
 
-    async def synthesize_action_specs(self, goal: str, formatter: Optional[BaseFormatter] = None, k: int = 1) -> List[ActionSpec]:
-        if self.llm is None:
-            return []
-        prompt = (
-            f"Create {k} actions for the goal: {goal}. "
-            f"Each action must specify: name, description, parameters."
-        )
-        fmt = formatter or JSONListOfActionSpecsFormatter()
-        try:
-            data = await self.llm.call_with_format(prompt, fmt)  # returns list[dict]
-        except Exception:
+    def render_tools(self, query: str, tags: Sequence[str] | None = None, token_budget: Optional[int] = None) -> RenderedCatalog:
+        """Prompt tool list for a step: candidates ranked by search_with_scoring, under a token budget."""
+        env = tags[0] if tags else None
+        ranked = self.action_space.search_with_scoring(query=query, tags=tags, env=env)
+        return self.tool_catalog.render(ranked, token_budget)
+
+    async def synthesize_action_specs(
+        self,
+        goal: str,
+        formatter: Optional[BaseFormatter] = None,
+        k: int = 1,
+        tags: Sequence[str] | None = None,
+        on_spec: Optional[Callable[[ActionSpec], None]] = None,
+        on_request: Optional[Callable[[], None]] = None,
+    ) -> List[ActionSpec]:
+        """Propose action specs for ``goal``.
+
+        With ``config.stream_synthesis``, ``on_spec`` is called with each spec
+        as soon as it is parsed from the streamed response. ``on_request`` is
+        called when an LLM request is actually issued (not on a cache hit).
+        """
+        if self.synth_cache is not None:
+            cached = self.synth_cache.lookup(goal, tags)
+            if cached is not None:
+                return cached
+        if self.synth_batcher is not None and formatter is None:
+            if on_request is not None:
+                on_request()  # queued goals go out with the next batch even if cancelled
+            try:
+                data, spent = await self.synth_batcher.submit(goal, k)
+            except Exception:
+                return []
+        elif self.llm is None:
             return []
-        out: List[ActionSpec] = []
-        for i, spec in enumerate(data or []):
+        else:
+            prompt = self._synth_prompt(goal, k)
+            fmt = formatter or JSONListOfActionSpecsFormatter()
+            tokens_before = usage_total_tokens(self.llm.get_usage_summary())
+            if on_request is not None:
+                on_request()
             try:
-                name = str(spec.get("name"))
-                desc = str(spec.get("description", ""))
-                params = spec.get("parameters", {})
-                aid = f"synth:{name}"
-                out.append(
-                    ActionSpec(
-                        id=aid,
-                        name=name,
-                        description=desc,
-                        inputs_schema=params if isinstance(params, dict) else {"type": "array"},
-                        provenance={"from": "llm", "idx": i, "goal": goal},
-                    )
-                )
+                if self.config.stream_synthesis and hasattr(self.llm, "stream_with_format"):
+                    data = await self._stream_specs(prompt, fmt, goal, tags, on_spec)
+                else:
+                    data = await self.llm.call_with_format(prompt, fmt)  # returns list[dict]
             except Exception:
-                continue
+                return []
+            spent = usage_total_tokens(self.llm.get_usage_summary()) - tokens_before
+            if spent <= 0:  # provider usage unavailable; estimate
+                spent = estimate_tokens(fmt.prepare_prompt(prompt)) + estimate_tokens(json.dumps(data, ensure_ascii=False))
+        out: List[ActionSpec] = []
+        for i, item in enumerate(data or []):
+            spec = self._to_spec(item, i, goal, tags)
+            if spec is not None:
+                out.append(spec)
+        if self.synth_cache is not None and out:
+            self.synth_cache.store(goal, tags, out, tokens=spent)
         return out
 
+    async def _stream_specs(
+        self,
+        prompt: str,
+        fmt: BaseFormatter,
+        goal: str,
+        tags: Sequence[str] | None,
+        on_spec: Optional[Callable[[ActionSpec], None]],
+    ) -> List[Dict[str, Any]]:
+        """Collect streamed spec items; a structural error keeps the items already parsed.
+
+        With nothing parsed before the error, falls back to ``call_with_format``
+        (which re-asks with the error message).
+        """
+        st = self._stream_stats
+        st["streams"] += 1
+        items: List[Dict[str, Any]] = []
+        t0 = time.perf_counter()
+        try:
+            async for item in self.llm.stream_with_format(prompt, fmt):
+                if not items:
+                    st["first_spec_s"] += time.perf_counter() - t0
+                items.append(item)
+                spec = self._to_spec(item, len(items) - 1, goal, tags) if on_spec is not None else None
+                if spec is not None:
+                    on_spec(spec)
+        except FormatError:
+            st["aborted"] += 1
+            if not items:
+                st["fallbacks"] += 1
+                return await self.llm.call_with_format(prompt, fmt)
+        finally:
+            st["total_s"] += time.perf_counter() - t0
+        return items
+
+    @staticmethod
+    def _to_spec(item: Any, i: int, goal: str, tags: Sequence[str] | None) -> Optional[ActionSpec]:
+        try:
+            name = str(item.get("name"))
+            desc = str(item.get("description", ""))
+            params = item.get("parameters", {})
+            return ActionSpec(
+                id=f"synth:{name}",
+                name=name,
+                description=desc,
+                inputs_schema=params if isinstance(params, dict) else {"type": "array"},
+                environment_tags=list(tags or []),
+                provenance={"from": "llm", "idx": i, "goal": goal},
+            )
+        except Exception:
+            return None
+
+    def stream_stats(self) -> Dict[str, Any]:
+        """Streamed synthesis: aborted streams, fallbacks, avg time to first spec vs. full response."""
+        st = dict(self._stream_stats)
+        n = st["streams"]
+        st["avg_first_spec_s"] = (st["first_spec_s"] / n) if n else 0.0
+        st["avg_total_s"] = (st["total_s"] / n) if n else 0.0
+        return st
+
+    @staticmethod
+    def _synth_prompt(goal: str, k: int) -> str:
+        return (
+            f"Create {k} actions for the goal: {goal}. "
+            f"Each action must specify: name, description, parameters."
+        )
+
     async def choose_and_run(self, action_ids: Sequence[str], params: Dict[str, Any]) -> Dict[str, Any]:
+        """Run candidates under ``config.exec_mode``.
+
+        - sequential: one after another (all candidates run)
+        - parallel: all concurrently, at most ``exec_concurrency`` at a time
+        - race: concurrently; the first success wins, the rest are cancelled
+        - hedged: one at a time, starting the next when the current one fails
+          or runs past its ``hedge_quantile`` latency; first success wins
+
+        Each result carries ``latency_s``; the winning one has ``won=True``.
+        Candidates cancelled or never started in race/hedged modes are
+        reported with ``error="cancelled"``/``"not started"``.
+        """
+        mode = self.config.exec_mode
         results: Dict[str, Any] = {}
-        for aid in action_ids:
-            try:
-                out = await self.action_space.use(aid, params)
-                results[aid] = {"ok": True, "output": out}
-            except Exception as e:
-                results[aid] = {"ok": False, "error": str(e)}
+        if mode == "sequential":
+            for aid in action_ids:
+                results[aid] = await self._run_candidate(aid, params)
+        elif mode == "parallel":
+            sem = asyncio.Semaphore(max(1, self.config.exec_concurrency))
+
+            async def run(aid: str) -> Dict[str, Any]:
+                async with sem:
+                    return await self._run_candidate(aid, params)
+
+            outs = await asyncio.gather(*(run(aid) for aid in action_ids))
+            results = dict(zip(action_ids, outs))
+        elif mode in ("race", "hedged"):
+            results = await self._run_first_success(action_ids, params, hedged=(mode == "hedged"))
+        else:
+            raise ValueError(f"Unknown exec_mode: {mode!r}")
+
+        winner = next((aid for aid, r in results.items() if r.get("won")), None)
+        if winner is None:
+            winner = next((aid for aid in action_ids if (results.get(aid) or {}).get("ok")), None)
+            if winner is not None:
+                results[winner]["won"] = True
+        for aid, r in results.items():
+            self._record_outcome(aid, r)
+        return results
+
+    def _timeout_for(self, action_id: str) -> Optional[float]:
+        action = self.action_space.get(action_id)
+        policy = getattr(action, "exec_policy", None) or {}
+        timeout = policy.get("timeout", policy.get("timeout_s"))
+        return float(timeout) if timeout is not None else self.config.action_timeout_s
+
+    async def _run_candidate(self, action_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        timeout = self._timeout_for(action_id)
+        t0 = time.perf_counter()
+        try:
+            # bounded by the action timeout and the caller's deadline, whichever is sooner
+            out = await with_deadline(self.action_space.use(action_id, params), timeout)
+            res: Dict[str, Any] = {"ok": True, "output": out}
+        except DeadlineExceeded:
+            res = {"ok": False, "error": "deadline exceeded"}
+        except asyncio.TimeoutError:
+            res = {"ok": False, "error": "timeout"}
+        except Exception as e:
+            res = {"ok": False, "error": str(e)}
+        res["latency_s"] = time.perf_counter() - t0
+        self._latency.record(action_id, res["latency_s"])
+        return res
+
+    async def _run_first_success(self, action_ids: Sequence[str], params: Dict[str, Any], hedged: bool) -> Dict[str, Any]:
+        if not action_ids:
+            return {}
+        cap = max(1, self.config.exec_concurrency)
+        queue = list(action_ids)
+        pending: Dict[asyncio.Task, str] = {}
+        results: Dict[str, Any] = {}
+        last_launch = (0.0, "")
+
+        def launch() -> None:
+            nonlocal last_launch
+            aid = queue.pop(0)
+            pending[asyncio.ensure_future(self._run_candidate(aid, params))] = aid
+            last_launch = (time.perf_counter(), aid)
+
+        launch()
+        while not hedged and queue and len(pending) < cap:
+            launch()
+        winner: Optional[str] = None
+        try:
+            while pending and winner is None:
+                wait_s = None
+                if hedged and queue and len(pending) < cap:
+                    started, aid = last_launch
+                    delay = self._latency.quantile(aid, self.config.hedge_quantile)
+                    delay = self.config.hedge_default_delay_s if delay is None else delay
+                    wait_s = max(0.0, started + delay - time.perf_counter())
+                done, _ = await asyncio.wait(pending, timeout=wait_s, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch()  # hedge: current candidate is slower than its p90
+                    continue
+                for task in done:
+                    aid = pending.pop(task)
+                    results[aid] = task.result()
+                    if results[aid]["ok"] and winner is None:
+                        winner = aid
+                        results[aid]["won"] = True
+                while winner is None and queue and (len(pending) < cap if not hedged else not pending):
+                    launch()
+        finally:
+            for task, aid in pending.items():
+                task.cancel()
+                results[aid] = {"ok": False, "error": "cancelled"}
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        for aid in queue:
+            results[aid] = {"ok": False, "error": "not started"}
         return results
 
+    def _record_outcome(self, action_id: str, result: Dict[str, Any]) -> None:
+        """Count one candidate outcome in the action space's outcome stats."""
+        if "latency_s" not in result:
+            return  # cancelled / not started: no signal about the action
+        self.action_space.record_outcome(
+            action_id, bool(result["ok"]), bool(result.get("won")), self._latency.quantile(action_id, 0.9)
+        )
+        self._outcomes_recorded += 1
+        if self._outcomes_recorded % max(1, self.config.outcome_publish_every) == 0:
+            self.action_space.publish_outcomes()  # into spec.validation, batched
+
+    def _register_specs(self, specs: Sequence[ActionSpec]) -> None:
+        """Publish synthesized specs, keeping validation stats already gathered under the same id."""
+        with self.action_space.batch() as b:
+            current = b.current_specs()
+            out = []
+            for spec in specs:
+                prev = current.get(spec.id)
+                val = {**spec._peek("validation"), **(prev._peek("validation") if prev is not None else {})}
+                out.append(ActionSpec.from_dict({**spec.to_dict(), "validation": val}))
+            self.action_space.register_specs(out)
+
     async def main(self, goal: str, context: Optional[Dict[str, Any]] = None, query_tags: Sequence[str] | None = None) -> Dict[str, Any]:
+        cache = self.config.trajectory_cache
+        if cache is None:
+            return await self._plan_and_run(goal, context, query_tags)
+        # inside an episode (e.g. a benchmark attempt) its recorder and judge are used;
+        # otherwise the creator records and scores its own runs
+        outer = current_recorder()
+        with recording(outer or TraceRecorder(env=env_view_name(query_tags or ()))) as rec:
+
+            def replayed(outputs: List[Any]) -> Dict[str, Any]:
+                last = rec.template["steps"][-1]["action_id"] if rec.template and rec.template["steps"] else None
+                results = {last: {"ok": True, "output": outputs[-1], "won": True}} if last is not None and outputs else {}
+                return {"candidates": list(results), "results": results, "winner": last if results else None, "replayed": len(outputs)}
+
+            out = await cache.replay(
+                self.action_space,
+                goal,
+                fallback=lambda outputs: self._plan_and_run(goal, context, query_tags),
+                finalize=replayed,
+            )
+        if outer is None:
+            cache.observe("creator", goal, rec, out["winner"] is not None)
+        return out
+
+    async def _plan_and_run(
+        self, goal: str, context: Optional[Dict[str, Any]] = None, query_tags: Sequence[str] | None = None
+    ) -> Dict[str, Any]:
         context = context or {}
-        # 1) retrieve candidates
-        candidates = await self.retrieve_candidates(goal, query_tags, limit=self.config.max_candidates)
+        k = self.config.max_candidates
+        can_synthesize = self.llm is not None or self.synth_cache is not None or self.synth_batcher is not None
+        speculative: Optional[asyncio.Task] = None
+        t_spec = 0.0
+        requested: List[bool] = []  # set once the speculative LLM request is issued
+        if can_synthesize and self.config.speculative_synthesis and self._predict_trigger(goal, query_tags) >= self.config.speculate_threshold:
+            # overlap the LLM call with retrieval; cancelled below if not needed
+            speculative = asyncio.ensure_future(
+                self.synthesize_action_specs(goal, formatter=None, k=k, tags=query_tags, on_request=lambda: requested.append(True))
+            )
+            t_spec = time.perf_counter()
+            self._spec_stats["speculated"] += 1
+        # Each phase reads one pinned ActionSpace version, so concurrent
+        # registrations by other tasks never show up half-applied.
+        try:
+            with self.action_space.pin():
+                # 1) retrieve candidates (off the loop while a speculation is in flight)
+                candidates = await self.retrieve_candidates(goal, query_tags, limit=k, offload=speculative is not None)
+                # 2) decide whether to trigger synthesis
+                trigger = self._should_synthesize(candidates, query_tags)
+        except BaseException:
+            if speculative is not None:
+                speculative.cancel()
+            raise
+        if self.config.speculative_synthesis:
+            self._predictor.record(goal, query_tags, trigger)
+
+        synthesized = trigger and can_synthesize
+        if speculative is not None and not synthesized:
+            await self._discard_speculation(speculative, goal, k, bool(requested))
+        elif synthesized:
+            # Synthesize new specs and register them as metadata; binding concrete
+            # implementations is still up to the integrator
+            if speculative is not None:
+                head_start = time.perf_counter() - t_spec
+                specs = await speculative
+                # the call overlapped retrieval for head_start seconds (at most its own duration)
+                self._spec_stats["used"] += 1
+                self._spec_stats["latency_saved_s"] += min(head_start, time.perf_counter() - t_spec)
+            else:
+                if self.config.speculative_synthesis:
+                    self._spec_stats["missed"] += 1
+                # streamed specs become visible to other tasks as they arrive
+                streamed: set = set()
+
+                def on_spec(spec: ActionSpec) -> None:
+                    self._register_specs([spec])
+                    streamed.add(spec.id)
 
-        # 2) decide whether to trigger synthesis
-        trigger = False
+                specs = await self.synthesize_action_specs(goal, formatter=None, k=k, tags=query_tags, on_spec=on_spec)
+                specs = [s for s in specs if s.id not in streamed]
+            self._register_specs(specs)
+        with self.action_space.pin():
+            if synthesized:
+                candidates = await self.retrieve_candidates(goal, query_tags, limit=k)
+            # 3) run top candidates with given params from context
+            params = context.get("params", {})
+            results = await self.choose_and_run(candidates, params)
+        winner = next((aid for aid, r in results.items() if r.get("won")), None)
+        if self.synth_cache is not None and winner is not None:
+            self.synth_cache.credit([winner])
+        return {"candidates": candidates, "results": results, "winner": winner}
+
+    def _predict_trigger(self, goal: str, tags: Sequence[str] | None) -> float:
+        view_size = None
+        if tags and self.config.env_views:
+            view_size = len(self.action_space.ensure_view(env_view_name(tags), tags))
+        return self._predictor.predict(goal, tags, view_size, self.config.synth_min_candidates)
+
+    async def _discard_speculation(self, task: asyncio.Task, goal: str, k: int, requested: bool) -> None:
+        """Cancel an unneeded speculative synthesis and account for its tokens."""
+        self._spec_stats["cancelled"] += 1
+        completed = task.done()
+        task.cancel()
+        specs = await asyncio.gather(task, return_exceptions=True)
+        if not requested:
+            return  # served from the synth cache or cancelled before the request went out
+        # the prompt was sent either way; a finished call also paid for its output
+        wasted = estimate_tokens(JSONListOfActionSpecsFormatter().prepare_prompt(self._synth_prompt(goal, k)))
+        if completed and isinstance(specs[0], list):
+            wasted += estimate_tokens(json.dumps([s.to_dict() for s in specs[0]], ensure_ascii=False))
+        self._spec_stats["tokens_wasted"] += wasted
+
+    def speculation_stats(self) -> Dict[str, Any]:
+        """Speculative synthesis counters: used/cancelled/missed, latency saved, tokens wasted."""
+        st = dict(self._spec_stats)
+        st["precision"] = (st["used"] / st["speculated"]) if st["speculated"] else 0.0
+        return st
+
+    def _should_synthesize(self, candidates: Sequence[str], query_tags: Sequence[str] | None) -> bool:
         if len(candidates) < self.config.synth_min_candidates:
-            trigger = True
-        else:
-            # compute avg per_env_pass over current Top-N
-            env = None
-            if isinstance(query_tags, (list, tuple)) and query_tags:
-                env = query_tags[0]
-            vals: List[float] = []
-            for aid in candidates:
-                spec = self.action_space.spec(aid)
-                if not spec:
-                    continue
+            return True
+        # compute avg per_env_pass over current Top-N
+        env = None
+        if isinstance(query_tags, (list, tuple)) and query_tags:
+            env = query_tags[0]
+        vals: List[float] = []
+        for aid in candidates:
+            spec = self.action_space.spec(aid)
+            if not spec:
+                continue
+            pep = 0.0
+            try:
+                pep = float((spec.validation or {}).get("per_env_pass", {}).get(env, 0.0)) if env else 0.0
+            except Exception:
                 pep = 0.0
-                try:
-                    pep = float((spec.validation or {}).get("per_env_pass", {}).get(env, 0.0)) if env else 0.0
-                except Exception:
-                    pep = 0.0
-                vals.append(pep)
-            avg_pass = (sum(vals) / len(vals)) if vals else 0.0
-            if avg_pass < self.config.synth_min_avg_pass:
-                trigger = True
-
-        if trigger and self.llm is not None:
-            # Synthesize new specs (registration of concrete actions is up to integrator)
-            await self.synthesize_action_specs(goal, formatter=None, k=self.config.max_candidates)
-            candidates = await self.retrieve_candidates(goal, query_tags, limit=self.config.max_candidates)
-        # 3) run top candidates with given params from context
-        params = context.get("params", {})
-        results = await self.choose_and_run(candidates, params)
-        return {"candidates": candidates, "results": results}
+            vals.append(pep)
+        avg_pass = (sum(vals) / len(vals)) if vals else 0.0
+        return avg_pass < self.config.synth_min_avg_pass
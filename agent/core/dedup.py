@@ -0,0 +1,236 @@
+"""Near-duplicate detection and consolidation of action specs.
+
+MinHash signatures over name / description / schema tokens, bucketed with
+LSH banding so a lookup only compares against specs sharing a band
+(sublinear in library size). Duplicates are merged into one canonical spec
+that keeps the other ids as aliases.
+
+Batch compaction of a ``dump_specs`` file:
+
+    python -m core.dedup specs.json -o specs.compact.json --threshold 0.8
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import operator
+import re
+import struct
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .action_space import ActionSpec
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _is_synthesized(spec: ActionSpec) -> bool:
+    return spec._peek("provenance").get("from") == "llm" or spec.id.startswith("synth:")
+
+
+def spec_tokens(spec: ActionSpec) -> Set[str]:
+    """Shingle set: name/description words and bigrams, plus schema field names."""
+    name = re.sub(r"([a-z])([A-Z])", r"\1 \2", spec.name).lower()
+    words = _TOKEN_RE.findall(name) + _TOKEN_RE.findall(spec.description.lower())
+    shingles = set(words)
+    shingles.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    props = spec._peek("inputs_schema").get("properties") or {}
+    shingles.update(f"param:{p.lower()}" for p in props)
+    return shingles
+
+
+class MinHasher:
+    """MinHash with ``num_perm`` independent 32-bit hash functions.
+
+    Each token is hashed once per 16 functions (one salted 64-byte blake2b
+    digest), and the per-function minimum is taken column-wise.
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 1) -> None:
+        if num_perm % 16:
+            raise ValueError("num_perm must be a multiple of 16")
+        self.num_perm = num_perm
+        self._salts = [hashlib.blake2b(f"{seed}:{i}".encode(), digest_size=16).digest() for i in range(num_perm // 16)]
+        self._row = struct.Struct("<16I")
+
+    def _token_hashes(self, token: str) -> Tuple[int, ...]:
+        data = token.encode("utf-8")
+        out: Tuple[int, ...] = ()
+        for salt in self._salts:
+            out += self._row.unpack(hashlib.blake2b(data, digest_size=64, salt=salt).digest())
+        return out
+
+    def signature(self, tokens: Iterable[str]) -> Tuple[int, ...]:
+        rows = [self._token_hashes(t) for t in tokens]
+        if not rows:
+            return (0xFFFFFFFF,) * self.num_perm
+        return tuple(map(min, zip(*rows)))
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH index used by ActionSpace to consolidate near-duplicates.
+
+    Only specs accepted by ``scope`` take part (default: synthesized specs,
+    i.e. ``provenance.from == "llm"`` or ``synth:`` ids). Two specs are
+    duplicates when their estimated Jaccard similarity >= ``threshold``.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        bands: int = 16,
+        scope: Callable[[ActionSpec], bool] | None = None,
+    ) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.scope = scope or _is_synthesized
+        self._hasher = MinHasher(num_perm)
+        self._sigs: Dict[str, Tuple[int, ...]] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = {}
+        self._last: Optional[Tuple[ActionSpec, Tuple[int, ...]]] = None
+
+    def __len__(self) -> int:
+        return len(self._sigs)
+
+    def _bands(self, sig: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+        return [(i, sig[i * self.rows:(i + 1) * self.rows]) for i in range(self.bands)]
+
+    @staticmethod
+    def similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+        return sum(map(operator.eq, a, b)) / len(a)
+
+    def _signature(self, spec: ActionSpec) -> Tuple[int, ...]:
+        # find() followed by add() for the same spec hashes it once
+        cached = self._last
+        if cached is not None and cached[0] is spec:
+            return cached[1]
+        sig = self._hasher.signature(spec_tokens(spec))
+        self._last = (spec, sig)
+        return sig
+
+    def find(self, spec: ActionSpec) -> Optional[str]:
+        """Best-matching indexed id at or above threshold (excluding spec.id)."""
+        if not self.scope(spec):
+            return None
+        sig = self._signature(spec)
+        candidates: Set[str] = set()
+        for band in self._bands(sig):
+            candidates.update(self._buckets.get(band, ()))
+        candidates.discard(spec.id)
+        best, best_sim = None, self.threshold
+        for cid in candidates:
+            sim = self.similarity(sig, self._sigs[cid])
+            if sim >= best_sim:
+                best, best_sim = cid, sim
+        return best
+
+    def add(self, spec: ActionSpec) -> None:
+        if not self.scope(spec):
+            return
+        self.remove(spec.id)
+        sig = self._signature(spec)
+        self._sigs[spec.id] = sig
+        for band in self._bands(sig):
+            self._buckets.setdefault(band, set()).add(spec.id)
+
+    def clear(self) -> None:
+        self._sigs.clear()
+        self._buckets.clear()
+        self._last = None
+
+    def remove(self, action_id: str) -> None:
+        sig = self._sigs.pop(action_id, None)
+        if sig is None:
+            return
+        for band in self._bands(sig):
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(action_id)
+                if not bucket:
+                    del self._buckets[band]
+
+
+def _pool_validation(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """Run-weighted merge of validation metrics (``runs`` defaults to 1)."""
+    wa, wb = float(a.get("runs", 1) or 1), float(b.get("runs", 1) or 1)
+    out: Dict[str, Any] = {**b, **a}
+    out["runs"] = wa + wb
+    pa, pb = a.get("per_env_pass") or {}, b.get("per_env_pass") or {}
+    if pa or pb:
+        pooled: Dict[str, float] = {}
+        for env in set(pa) | set(pb):
+            if env in pa and env in pb:
+                pooled[env] = (float(pa[env]) * wa + float(pb[env]) * wb) / (wa + wb)
+            else:
+                pooled[env] = float(pa.get(env, pb.get(env, 0.0)))
+        out["per_env_pass"] = pooled
+    if "avg_cost_norm" in a and "avg_cost_norm" in b:
+        out["avg_cost_norm"] = (float(a["avg_cost_norm"]) * wa + float(b["avg_cost_norm"]) * wb) / (wa + wb)
+    stamps = [v for v in (a.get("last_verified_at"), b.get("last_verified_at")) if v]
+    if stamps:
+        out["last_verified_at"] = max(stamps)
+    return out
+
+
+def merge_specs(canonical: ActionSpec, dup: ActionSpec) -> ActionSpec:
+    """New canonical spec absorbing ``dup``: aliases, provenance, tags, stats."""
+    prov = dict(canonical._peek("provenance"))
+    aliases = list(prov.get("aliases", []))
+    for alias in [dup.id, *dup._peek("provenance").get("aliases", [])]:
+        if alias not in aliases and alias != canonical.id:
+            aliases.append(alias)
+    merged_from = list(prov.get("merged", []))
+    dup_prov = {k: v for k, v in dup._peek("provenance").items() if k not in ("aliases", "merged")}
+    merged_from.append({"id": dup.id, **dup_prov})
+    merged_from.extend(dup._peek("provenance").get("merged", []))
+    prov.update(aliases=aliases, merged=merged_from)
+
+    row = canonical.to_dict()
+    row["environment_tags"] = list(dict.fromkeys([*canonical._peek("environment_tags"), *dup._peek("environment_tags")]))
+    row["provenance"] = prov
+    row["validation"] = _pool_validation(canonical._peek("validation"), dup._peek("validation"))
+    return ActionSpec.from_dict(row)
+
+
+def compact_specs(specs: Sequence[ActionSpec], index: NearDuplicateIndex | None = None) -> Tuple[List[ActionSpec], Dict[str, str]]:
+    """Consolidate a spec list; returns (kept specs, alias -> canonical id)."""
+    if index is None:
+        index = NearDuplicateIndex()
+    kept: Dict[str, ActionSpec] = {}
+    aliases: Dict[str, str] = {}
+    for spec in specs:
+        target = index.find(spec)
+        if target is None:
+            kept[spec.id] = spec
+            index.add(spec)
+            continue
+        kept[target] = merge_specs(kept[target], spec)
+        aliases[spec.id] = target
+    return list(kept.values()), aliases
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Consolidate near-duplicate action specs in a dump_specs file.")
+    ap.add_argument("specs", help="JSON file written by ActionSpace.dump_specs")
+    ap.add_argument("-o", "--out", help="output path (default: overwrite input)")
+    ap.add_argument("--threshold", type=float, default=0.8)
+    ap.add_argument("--all", action="store_true", help="consider every spec, not only synthesized ones")
+    args = ap.parse_args(argv)
+
+    rows = json.loads(Path(args.specs).read_text(encoding="utf-8"))
+    specs = [ActionSpec.from_dict(r) for r in rows]
+    index = NearDuplicateIndex(threshold=args.threshold, scope=(lambda s: True) if args.all else None)
+    kept, aliases = compact_specs(specs, index)
+    out = Path(args.out or args.specs)
+    out.write_text(json.dumps([s.to_dict() for s in kept], ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[INFO] {len(specs)} specs -> {len(kept)} ({len(aliases)} merged) written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Result memoization for deterministic actions.
+
+Opt-in layer used by ActionSpace.use: an action whose spec declares
+``effects_schema.pure`` / ``effects_schema.idempotent`` (or
+``security.memoize``) has its results cached under
+``(action id, version, canonical params)``.
+
+Results are stored pickled in a runtime.cache.TieredCache namespace
+(LRU by default, bounded by bytes, with TTL): every caller gets its own
+copy (mutating a returned dict cannot corrupt later hits). Results that
+cannot be pickled, or are larger than ``max_entry_bytes``, are returned
+but not cached.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import pickle
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from runtime.cache import TieredCache
+
+if TYPE_CHECKING:
+    from .action_space import ActionSpec
+
+
+MemoKey = Tuple[str, str, str]
+
+
+class _LeaderCancelled(Exception):
+    """The executing call was cancelled; coalesced waiters retry."""
+
+
+def is_memoizable(spec: ActionSpec) -> bool:
+    """True if the spec declares the action pure or idempotent.
+
+    ``security.memoize: false`` always opts out (e.g. results carry secrets).
+    """
+    eff = spec.effects_schema or {}
+    sec = spec.security or {}
+    if sec.get("memoize") is False:
+        return False
+    return bool(eff.get("pure") or eff.get("idempotent") or sec.get("memoize"))
+
+
+def canonical_params(params: Dict[str, Any]) -> str:
+    # Key order and whitespace independent; non-JSON values fall back to repr
+    return json.dumps(params, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=repr)
+
+
+class ResultMemo:
+    """Bounded LRU + TTL cache of action results with single-flight calls.
+
+    Entries live in ``cache`` under ``namespace`` (a private LRU
+    TieredCache of ``max_bytes`` unless one is passed in; its stats then
+    report evictions and bytes). Concurrent identical calls share one
+    execution; exceptions are propagated to every waiter and never cached.
+    """
+
+    def __init__(
+        self,
+        ttl_s: Optional[float] = None,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_entry_bytes: Optional[int] = None,
+        cache: Optional[TieredCache] = None,
+        namespace: str = "memo",
+    ) -> None:
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 16 if max_entry_bytes is None else max_entry_bytes
+        self.cache = cache if cache is not None else TieredCache(max_bytes=max_bytes, policy="lru", name="memo")
+        self.namespace = namespace
+        self._generation: Dict[str, int] = {}  # bumped by invalidate(action_id)
+        self._inflight: Dict[MemoKey, asyncio.Future] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def key(spec: ActionSpec, params: Dict[str, Any]) -> MemoKey:
+        return (spec.id, spec.version, canonical_params(params))
+
+    def _count(self, action_id: str, field: str) -> None:
+        st = self._stats.setdefault(action_id, {"hits": 0, "misses": 0, "coalesced": 0, "uncached": 0})
+        st[field] += 1
+
+    def _cache_key(self, key: MemoKey) -> str:
+        return f"{key[0]}\x1f{key[1]}\x1f{self._generation.get(key[0], 0)}\x1f{key[2]}"
+
+    async def _lookup(self, key: MemoKey) -> Tuple[bool, Any]:
+        blob = await self.cache.aget(self.namespace, self._cache_key(key))
+        if blob is None:
+            return False, None
+        return True, pickle.loads(blob)
+
+    def _store(self, key: MemoKey, value: Any) -> Optional[bytes]:
+        """Cache a pickled copy; returns it, or None if the value is not cached."""
+        try:
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            blob = None
+        if blob is None or len(blob) > self.max_entry_bytes:
+            self._count(key[0], "uncached")
+            return None
+        self.cache.put(self.namespace, self._cache_key(key), blob, ttl_s=self.ttl_s)
+        return blob
+
+    async def get_or_call(self, spec: ActionSpec, params: Dict[str, Any], call: Callable[[], Awaitable[Any]]) -> Any:
+        key = self.key(spec, params)
+        found, value = await self._lookup(key)
+        if found:
+            self._count(spec.id, "hits")
+            return value
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self._count(spec.id, "coalesced")
+            try:
+                blob = await asyncio.shield(pending)
+            except _LeaderCancelled:
+                return await self.get_or_call(spec, params, call)
+            if blob is None:  # not cacheable: share nothing, run it ourselves
+                return await call()
+            return pickle.loads(blob)
+
+        self._count(spec.id, "misses")
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await call()
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # retrieved here; waiters still re-raise it
+            raise
+        except BaseException:
+            fut.set_exception(_LeaderCancelled())
+            fut.exception()
+            raise
+        else:
+            fut.set_result(self._store(key, value))
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self, action_id: Optional[str] = None) -> None:
+        if action_id is None:
+            self.cache.clear(self.namespace)
+            return
+        # older entries become unreachable and age out of the LRU
+        self._generation[action_id] = self._generation.get(action_id, 0) + 1
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-action counters plus hit_rate = (hits + coalesced) / calls.
+
+        Evictions and bytes are per namespace: ``cache.stats()[namespace]``.
+        """
+        out: Dict[str, Dict[str, float]] = {}
+        for aid, st in self._stats.items():
+            calls = st["hits"] + st["misses"] + st["coalesced"]
+            out[aid] = {**st, "hit_rate": ((st["hits"] + st["coalesced"]) / calls) if calls else 0.0}
+        return out
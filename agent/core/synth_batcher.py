@@ -0,0 +1,98 @@
+"""Micro-batching of AgentCreator synthesis calls.
+
+Goals submitted within ``max_wait_s`` of each other (up to ``max_batch``)
+are sent as one multi-goal ``call_with_format`` request whose output is
+keyed per goal, so concurrent creators share one LLM round trip and one
+copy of the format guide. Results are split back to each waiting caller.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from engine.costs import estimate_tokens
+from engine.formatter import FormatError, JSONActionSpecsByGoalFormatter
+
+_Pending = Tuple[str, int, asyncio.Future]
+
+
+class SynthesisBatcher:
+    """Share one instance between creators: ``await submit(goal, k)``.
+
+    A goal whose entry is missing or malformed fails alone with FormatError;
+    only an error of the whole call (transport, unparseable top level) is
+    propagated to every goal in the batch.
+    """
+
+    def __init__(self, llm: Any, max_batch: int = 8, max_wait_s: float = 0.05) -> None:
+        self.llm = llm
+        self.max_batch = max(1, max_batch)
+        self.max_wait_s = max_wait_s
+        self._pending: List[_Pending] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task] = set()
+        self._stats = {"goals": 0, "batches": 0, "failed_goals": 0, "prompt_tokens_saved": 0}
+
+    async def submit(self, goal: str, k: int = 1) -> Tuple[List[Dict[str, Any]], int]:
+        """Spec dicts for ``goal`` plus this goal's share of the tokens spent."""
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future = loop.create_future()
+        self._pending.append((goal, k, fut))
+        self._stats["goals"] += 1
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_s, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending[: self.max_batch], self._pending[self.max_batch:]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait_s, self._flush)
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    def build_prompt(batch: List[_Pending]) -> str:
+        lines = ["Create actions for each of the following goals."]
+        lines.extend(f"g{i}: create {k} actions for the goal: {goal}" for i, (goal, k, _) in enumerate(batch))
+        lines.append("Each action must specify: name, description, parameters.")
+        return "\n".join(lines)
+
+    async def _run(self, batch: List[_Pending]) -> None:
+        self._stats["batches"] += 1
+        keys = tuple(f"g{i}" for i in range(len(batch)))
+        fmt = JSONActionSpecsByGoalFormatter(keys)
+        prompt = self.build_prompt(batch)
+        try:
+            data = await self.llm.call_with_format(prompt, fmt)
+        except Exception as e:
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            self._stats["failed_goals"] += len(batch)
+            return
+        data = data if isinstance(data, dict) else {}
+        guide_tokens = estimate_tokens(fmt.prepare_prompt(""))
+        self._stats["prompt_tokens_saved"] += guide_tokens * (len(batch) - 1)
+        share = (guide_tokens + estimate_tokens(prompt)) // len(batch)
+        for key, (goal, _, fut) in zip(keys, batch):
+            if fut.done():  # caller was cancelled
+                continue
+            items = data.get(key)
+            if items is None:
+                self._stats["failed_goals"] += 1
+                fut.set_exception(FormatError(fmt.errors.get(key, "missing goal id")))
+            else:
+                fut.set_result((items, share + estimate_tokens(json.dumps(items, ensure_ascii=False))))
+
+    def stats(self) -> Dict[str, Any]:
+        batches = self._stats["batches"]
+        return {**self._stats, "avg_batch_size": (self._stats["goals"] / batches) if batches else 0.0}
@@ -0,0 +1,175 @@
+"""Semantic cache of AgentCreator synthesis results.
+
+Entries are keyed by an embedding of the normalized goal plus the exact
+query tags; a lookup whose cosine similarity clears ``threshold`` returns
+the previously synthesized specs without an LLM call.
+
+The default embedding is a hashed bag of words + character trigrams (no
+model dependency); pass ``embed_fn`` to use a real embedding model.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import re
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .action_space import ActionSpec
+
+SparseVec = Dict[int, float]
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_goal(goal: str) -> str:
+    return " ".join(_WORD_RE.findall(goal.lower()))
+
+
+def hashed_embedding(text: str, dim: int = 1024) -> SparseVec:
+    """L2-normalized sparse feature-hashing embedding of words and char trigrams."""
+    norm = normalize_goal(text)
+    feats = norm.split()
+    padded = f" {norm} "
+    feats += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    vec: SparseVec = {}
+    for f in feats:
+        h = int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "little")
+        idx = h % dim
+        vec[idx] = vec.get(idx, 0.0) + (1.0 if (h >> 63) else -1.0)
+    length = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+    return {i: v / length for i, v in vec.items() if v}
+
+
+def cosine(a: SparseVec, b: SparseVec) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(i, 0.0) for i, v in a.items())
+
+
+class SynthesisCache:
+    """Persistent goal-similarity cache of synthesized spec lists.
+
+    Eviction drops expired entries (``max_age_s``) and, over ``max_entries``,
+    the lowest-value ones: usefulness (specs that later won a run) and hits,
+    discounted by age. ``stats()`` reports hit rate and tokens saved.
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        threshold: float = 0.85,
+        max_entries: int = 2000,
+        max_age_s: float | None = 14 * 24 * 3600,
+        embed_fn: Callable[[str], SparseVec] | None = None,
+    ) -> None:
+        self.path = Path(path) if path else None
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_age_s = max_age_s
+        self.embed_fn = embed_fn or hashed_embedding
+        self._entries: List[Dict[str, Any]] = []
+        self._stats = {"lookups": 0, "hits": 0, "tokens_saved": 0}
+        if self.path and self.path.exists():
+            self.load()
+
+    @staticmethod
+    def _tags_key(tags: Sequence[str] | None) -> str:
+        return ",".join(sorted(set(tags or [])))
+
+    def lookup(self, goal: str, tags: Sequence[str] | None = None) -> Optional[List[ActionSpec]]:
+        self._stats["lookups"] += 1
+        now = time.time()
+        tkey = self._tags_key(tags)
+        vec = self.embed_fn(goal)
+        best, best_sim = None, self.threshold
+        for entry in self._entries:
+            if entry["tags"] != tkey or self._expired(entry, now):
+                continue
+            sim = cosine(vec, entry["vec"])
+            if sim >= best_sim:
+                best, best_sim = entry, sim
+        if best is None:
+            return None
+        best["hits"] += 1
+        best["last_hit_at"] = now
+        self._stats["hits"] += 1
+        self._stats["tokens_saved"] += int(best.get("tokens", 0))
+        return [ActionSpec.from_dict(row) for row in best["specs"]]
+
+    def store(self, goal: str, tags: Sequence[str] | None, specs: Sequence[ActionSpec], tokens: int = 0) -> None:
+        if not specs:
+            return
+        now = time.time()
+        self._entries.append(
+            {
+                "goal": goal,
+                "tags": self._tags_key(tags),
+                "vec": self.embed_fn(goal),
+                "specs": [s.to_dict() for s in specs],
+                "spec_ids": [s.id for s in specs],
+                "tokens": int(tokens),
+                "created_at": now,
+                "last_hit_at": now,
+                "hits": 0,
+                "useful": 0,
+            }
+        )
+        self.evict()
+
+    def credit(self, action_ids: Sequence[str]) -> None:
+        """Mark entries whose specs produced a successful run as useful."""
+        ids = set(action_ids)
+        for entry in self._entries:
+            if ids.intersection(entry["spec_ids"]):
+                entry["useful"] += 1
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return self.max_age_s is not None and now - entry["created_at"] > self.max_age_s
+
+    def evict(self) -> None:
+        now = time.time()
+        self._entries = [e for e in self._entries if not self._expired(e, now)]
+        if len(self._entries) <= self.max_entries:
+            return
+
+        def value(e: Dict[str, Any]) -> float:
+            age_days = (now - e["last_hit_at"]) / 86400.0
+            return (2.0 * e["useful"] + e["hits"] + 1.0) / (1.0 + age_days)
+
+        self._entries.sort(key=value, reverse=True)
+        del self._entries[self.max_entries:]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["lookups"]
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "hit_rate": (self._stats["hits"] / lookups) if lookups else 0.0,
+        }
+
+    # ----------------------------
+    # Persistence
+    # ----------------------------
+    def load(self) -> None:
+        if self.path is None:
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        entries = data.get("entries", [])
+        for e in entries:
+            e["vec"] = {int(i): v for i, v in e["vec"]}
+        self._entries = entries
+        self.evict()
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        rows = [{**e, "vec": list(e["vec"].items())} for e in self._entries]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps({"entries": rows}, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.path)
@@ -0,0 +1,154 @@
+"""Budgeted rendering of tool schemas for LLM prompts.
+
+Serialized ``to_param()`` blobs are cached per action id and reused while
+the snapshot still holds the same spec and action objects (specs are
+published as new copies, never edited in place), so a step only pays for
+JSON encoding the first time a tool is shown. A render
+takes candidates in retrieval-rank order, keeps the top ``full_detail``
+with full schemas, compresses the rest (parameter descriptions dropped,
+tool description cut to its first sentence) and stops at the token
+budget. The selected tools are emitted sorted by name, so the same
+selection always produces the same bytes and provider prefix caches hit.
+"""
+from __future__ import annotations
+
+import copy
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from engine.costs import estimate_tokens
+from .action_space import ActionSpace, ActionSpaceSnapshot, spec_to_param
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s")
+_MAX_SHORT_DESC = 120
+
+
+def compress_param(param: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a tool param without parameter descriptions and with a one-sentence description."""
+    out = copy.deepcopy(param)
+    fn = out.get("function") or {}
+    desc = fn.get("description") or ""
+    if desc:
+        short = _SENTENCE_RE.split(desc.strip(), 1)[0]
+        fn["description"] = short if len(short) <= _MAX_SHORT_DESC else short[: _MAX_SHORT_DESC - 3] + "..."
+
+    def strip(node: Any) -> None:
+        if isinstance(node, dict):
+            node.pop("description", None)
+            node.pop("examples", None)
+            for v in node.values():
+                strip(v)
+        elif isinstance(node, list):
+            for v in node:
+                strip(v)
+
+    strip(fn.get("parameters"))
+    return out
+
+
+@dataclass
+class RenderedCatalog:
+    ids: List[str]  # selected action ids, in emitted order
+    text: str  # JSON array of tool params, ready for the prompt
+    tokens: int
+    tokens_unbudgeted: int  # all candidates rendered in full
+    compressed: List[str]
+    dropped: List[str]  # candidates left out by the budget / max_tools
+
+    @property
+    def tools(self) -> List[Dict[str, Any]]:
+        return json.loads(self.text)
+
+
+class ToolCatalog:
+    """Renders ranked ActionSpace candidates into a prompt tool list."""
+
+    def __init__(
+        self,
+        action_space: ActionSpace,
+        token_budget: int = 4000,
+        full_detail: int = 8,
+        max_tools: Optional[int] = None,
+    ) -> None:
+        self.action_space = action_space
+        self.token_budget = token_budget
+        self.full_detail = full_detail
+        self.max_tools = max_tools
+        # (action id, compact) -> (spec object, action object, tool name, blob, tokens)
+        self._blobs: Dict[Tuple[str, bool], Tuple[Any, Any, str, str, int]] = {}
+        self._stats = {"renders": 0, "tokens_before": 0, "tokens_after": 0, "blob_hits": 0, "blob_misses": 0}
+
+    def _blob(self, snap: ActionSpaceSnapshot, aid: str, compact: bool) -> Tuple[str, str, int]:
+        action = snap.registry.get(aid)
+        spec = snap.specs.get(aid)
+        hit = self._blobs.get((aid, compact))
+        # identity, not version: re-synthesized/merged metadata specs keep "0.1.0"
+        if hit is not None and hit[0] is spec and hit[1] is action:
+            self._stats["blob_hits"] += 1
+            return hit[2:]
+        self._stats["blob_misses"] += 1
+        param = action.to_param() if action is not None else spec_to_param(spec)
+        if compact:
+            param = compress_param(param)
+        blob = json.dumps(param, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        tokens = estimate_tokens(blob)
+        name = str((param.get("function") or {}).get("name") or aid)
+        self._blobs[(aid, compact)] = (spec, action, name, blob, tokens)
+        return name, blob, tokens
+
+    def render(
+        self,
+        ranked: Sequence[Union[str, Tuple[str, float]]],
+        token_budget: Optional[int] = None,
+    ) -> RenderedCatalog:
+        """Select and serialize tools from ``ranked`` (best first; ids or (id, score))."""
+        budget = self.token_budget if token_budget is None else token_budget
+        snap = self.action_space.snapshot()
+        ids = [r if isinstance(r, str) else r[0] for r in ranked]
+        ids = [aid for aid in ids if aid in snap.registry or aid in snap.specs]
+        chosen: List[Tuple[str, str, str]] = []  # (name, id, blob)
+        selected: List[str] = []
+        compressed: List[str] = []
+        dropped: List[str] = []
+        used = 2  # brackets
+        full_total = 2
+        for rank, aid in enumerate(ids):
+            name, full_blob, full_tokens = self._blob(snap, aid, compact=False)
+            full_total += full_tokens + 1
+            if self.max_tools is not None and len(selected) >= self.max_tools:
+                dropped.append(aid)
+                continue
+            compact = rank >= self.full_detail
+            _, blob, tokens = self._blob(snap, aid, compact=True) if compact else (name, full_blob, full_tokens)
+            if used + tokens + 1 > budget:
+                dropped.append(aid)
+                continue
+            used += tokens + 1
+            selected.append(aid)
+            if compact:
+                compressed.append(aid)
+            chosen.append((name, aid, blob))
+        chosen.sort()
+        text = "[" + ",\n".join(blob for _, _, blob in chosen) + "]"
+        self._stats["renders"] += 1
+        self._stats["tokens_before"] += full_total
+        self._stats["tokens_after"] += used
+        return RenderedCatalog(
+            ids=[aid for _, aid, _ in chosen],
+            text=text,
+            tokens=used,
+            tokens_unbudgeted=full_total,
+            compressed=compressed,
+            dropped=dropped,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-step prompt tokens before (all candidates, full) and after budgeting."""
+        n = self._stats["renders"]
+        return {
+            **self._stats,
+            "avg_tokens_before": (self._stats["tokens_before"] / n) if n else 0.0,
+            "avg_tokens_after": (self._stats["tokens_after"] / n) if n else 0.0,
+        }
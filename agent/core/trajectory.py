@@ -0,0 +1,283 @@
+"""Trajectory cache: record successful action sequences and replay them.
+
+While an episode runs under ``recording()``, every top-level
+``ActionSpace.use`` call is appended to the current TraceRecorder (calls
+made from inside an action, e.g. an agent-as-action or a DAG step, are
+part of their caller's step and are not recorded). A successful trace is stored as
+a parameterized template keyed by the task signature, i.e. the task text
+with its literal arguments (quoted strings, numbers, paths, identifiers)
+replaced by slots. A later task with the same signature replays the
+template with its own arguments substituted, handing over to the normal
+(LLM) agent only at the first failing step.
+"""
+from __future__ import annotations
+
+import json
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .action_space import ActionSpace
+
+
+_SLOT_RE = re.compile(
+    r"""(?P<q>"[^"]+"|'[^']+')"""  # quoted literal
+    r"|(?P<path>[\w.-]*/[\w./-]+|\b\w+\.(?:py|json|ya?ml|txt|md|cfg|toml)\b)"  # file paths
+    r"|(?P<num>\b\d+(?:\.\d+)?\b)"
+    r"|(?P<ident>\b[a-z]+(?:_\w+|\d\w*)\b)",  # snake_case / name-with-digits identifiers
+    re.IGNORECASE,
+)
+
+
+def default_task_text(problem: Any) -> str:
+    if not isinstance(problem, dict):
+        return str(problem)
+    for key in ("task", "goal", "question", "problem_statement", "instruction"):
+        if isinstance(problem.get(key), str):
+            return problem[key]
+    rest = {k: v for k, v in problem.items() if k != "id"}
+    return json.dumps(rest, sort_keys=True, ensure_ascii=False)
+
+
+def task_signature(text: str) -> Tuple[str, List[str]]:
+    """(signature, slot values): literals become ``<s0>``, ``<s1>``, ...
+
+    Repeated literals share one slot, so the signature also captures which
+    arguments are the same. Only the signature is case-folded; slot values
+    keep their original case so they match (and substitute into) params.
+    """
+    slots: List[str] = []
+
+    def repl(m: re.Match) -> str:
+        val = m.group(0)
+        if m.group("q"):
+            val = val[1:-1]
+        if val not in slots:
+            slots.append(val)
+        return f"<s{slots.index(val)}>"
+
+    sig = _SLOT_RE.sub(repl, text.strip())
+    return " ".join(sig.lower().split()), slots
+
+
+def _parameterize(value: Any, slots: List[str]) -> Any:
+    if isinstance(value, str):
+        for i in sorted(range(len(slots)), key=lambda j: -len(slots[j])):  # longest first
+            if slots[i] and slots[i] in value:
+                if value == slots[i]:
+                    return {"$slot": i}
+                value = value.replace(slots[i], f"{{s{i}}}")
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        text = str(value)
+        return {"$slot": slots.index(text), "$type": type(value).__name__} if text in slots else value
+    if isinstance(value, dict):
+        return {k: _parameterize(v, slots) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_parameterize(v, slots) for v in value]
+    return value
+
+
+def _substitute(value: Any, slots: List[str]) -> Any:
+    if isinstance(value, dict):
+        if "$slot" in value:
+            raw = slots[value["$slot"]]
+            kind = value.get("$type")
+            return int(raw) if kind == "int" else float(raw) if kind == "float" else raw
+        return {k: _substitute(v, slots) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_substitute(v, slots) for v in value]
+    if isinstance(value, str) and "{s" in value:
+        for i, s in enumerate(slots):
+            value = value.replace(f"{{s{i}}}", s)
+    return value
+
+
+class TraceRecorder:
+    """Actions used during one episode (filled by ActionSpace.use)."""
+
+    def __init__(self, env: str = "") -> None:
+        self.env = env  # template namespace (benchmark / environment name)
+        self.steps: List[Dict[str, Any]] = []
+        self.replayed = 0  # steps executed from a cached template
+        self.fallback_at: Optional[int] = None  # step index handed to the agent
+        self.template: Optional[Dict[str, Any]] = None  # replayed template, if any
+
+    def add(self, action_id: str, params: Dict[str, Any], ok: bool) -> None:
+        self.steps.append({"action_id": action_id, "params": params, "ok": ok})
+
+
+_recorder: ContextVar[Optional[TraceRecorder]] = ContextVar("trajectory_recorder", default=None)
+_in_action: ContextVar[bool] = ContextVar("trajectory_in_action", default=False)
+
+
+def current_recorder() -> Optional[TraceRecorder]:
+    return _recorder.get()
+
+
+@contextmanager
+def action_step() -> Iterator[Optional[TraceRecorder]]:
+    """Scope of one ``ActionSpace.use`` call; yields the recorder for outermost calls only."""
+    if _in_action.get():
+        yield None
+        return
+    token = _in_action.set(True)
+    try:
+        yield _recorder.get()
+    finally:
+        _in_action.reset(token)
+
+
+@contextmanager
+def recording(rec: Optional[TraceRecorder] = None) -> Iterator[TraceRecorder]:
+    rec = rec or TraceRecorder()
+    token = _recorder.set(rec)
+    try:
+        yield rec
+    finally:
+        _recorder.reset(token)
+
+
+class TrajectoryCache:
+    """Parameterized action-sequence templates keyed by (env, task signature).
+
+    Up to ``max_per_signature`` templates are kept per signature, best
+    success rate first. ``stats(benchmark)`` reports hit rate, steps saved
+    and the success-rate delta of replayed vs. planned episodes.
+    """
+
+    def __init__(self, path: str | None = None, max_per_signature: int = 3, min_success_rate: float = 0.5) -> None:
+        self.path = Path(path) if path else None
+        self.max_per_signature = max_per_signature
+        self.min_success_rate = min_success_rate
+        self._templates: Dict[str, List[Dict[str, Any]]] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        if self.path and self.path.exists():
+            self.load()
+
+    @staticmethod
+    def _key(env: str, signature: str) -> str:
+        return f"{env}\x1f{signature}"
+
+    @staticmethod
+    def _rate(t: Dict[str, Any]) -> float:
+        return (t["successes"] + 1) / (t["successes"] + t["failures"] + 2)
+
+    def match(self, task_text: str, env: str = "") -> Optional[Tuple[Dict[str, Any], List[str]]]:
+        sig, slots = task_signature(task_text)
+        for t in self._templates.get(self._key(env, sig), ()):
+            if t["n_slots"] == len(slots) and self._rate(t) >= self.min_success_rate:
+                return t, slots
+        return None
+
+    def observe(self, benchmark: str, task_text: str, rec: TraceRecorder, ok: bool) -> None:
+        """Fold a finished episode in: update stats, learn or score its template."""
+        st = self._stats.setdefault(
+            benchmark,
+            {"episodes": 0, "hits": 0, "steps_saved": 0, "fallbacks": 0,
+             "replay_runs": 0, "replay_ok": 0, "planned_runs": 0, "planned_ok": 0},
+        )
+        st["episodes"] += 1
+        if rec.template is not None:
+            st["hits"] += 1
+            st["steps_saved"] += rec.replayed
+            st["replay_runs"] += 1
+            st["replay_ok"] += int(ok)
+            st["fallbacks"] += int(rec.fallback_at is not None)
+        else:
+            st["planned_runs"] += 1
+            st["planned_ok"] += int(ok)
+
+        sig, slots = task_signature(task_text)
+        key = self._key(rec.env, sig)
+        templates = self._templates.setdefault(key, [])
+        steps = [
+            {"action_id": s["action_id"], "params": _parameterize(s["params"], slots)}
+            for s in rec.steps
+            if s["ok"]
+        ]
+        replayed = rec.template
+        if replayed is not None and any(t is replayed for t in templates):
+            replayed["successes" if ok else "failures"] += 1
+        existing = next((t for t in templates if t["steps"] == steps), None)
+        if existing is not None:
+            if existing is not replayed:
+                existing["successes" if ok else "failures"] += 1
+        elif ok and steps:
+            templates.append({"steps": steps, "n_slots": len(slots), "successes": 1, "failures": 0})
+        templates.sort(key=self._rate, reverse=True)
+        del templates[self.max_per_signature:]
+        if not templates:
+            del self._templates[key]
+
+    async def replay(
+        self,
+        action_space: ActionSpace,
+        task_text: str,
+        fallback: Callable[[List[Any]], Awaitable[Any]],
+        env: Optional[str] = None,
+        finalize: Callable[[List[Any]], Any] | None = None,
+    ) -> Any:
+        """Run the matching template, or ``fallback`` if none / at the first failing step.
+
+        ``fallback(outputs)`` receives the outputs of the replayed prefix.
+        Without a failure the result is ``finalize(outputs)`` (default: last output).
+        ``env`` defaults to the active recorder's.
+        """
+        rec = current_recorder()
+        if env is None:
+            env = rec.env if rec is not None else ""
+        hit = self.match(task_text, env)
+        if hit is None:
+            return await fallback([])
+        template, slots = hit
+        if rec is not None:
+            rec.template = template
+        outputs: List[Any] = []
+        for i, step in enumerate(template["steps"]):
+            try:
+                outputs.append(await action_space.use(step["action_id"], _substitute(step["params"], slots)))
+            except Exception:
+                if rec is not None:
+                    rec.fallback_at = i
+                return await fallback(outputs)
+            if rec is not None:
+                rec.replayed += 1
+        return finalize(outputs) if finalize is not None else (outputs[-1] if outputs else None)
+
+    def stats(self, benchmark: Optional[str] = None) -> Dict[str, Any]:
+        """Per-benchmark hit rate, steps saved and success-rate delta (replayed - planned)."""
+        out: Dict[str, Any] = {}
+        for name, st in self._stats.items():
+            if benchmark is not None and name != benchmark:
+                continue
+            replay_sr = st["replay_ok"] / st["replay_runs"] if st["replay_runs"] else None
+            planned_sr = st["planned_ok"] / st["planned_runs"] if st["planned_runs"] else None
+            out[name] = {
+                **st,
+                "hit_rate": st["hits"] / st["episodes"] if st["episodes"] else 0.0,
+                "success_delta": (replay_sr - planned_sr) if replay_sr is not None and planned_sr is not None else None,
+            }
+        return out.get(benchmark, {}) if benchmark is not None else out
+
+    # ----------------------------
+    # Persistence
+    # ----------------------------
+    def load(self) -> None:
+        if self.path is None:
+            return
+        try:
+            self._templates = json.loads(self.path.read_text(encoding="utf-8")).get("templates", {})
+        except (OSError, ValueError):
+            self._templates = {}
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps({"templates": self._templates}, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.path)
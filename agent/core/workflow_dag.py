@@ -0,0 +1,310 @@
+"""Declarative DAG workflows over ActionSpace actions.
+
+A WorkflowGraph is a set of nodes, each calling one ActionSpace action id.
+A node's params are static values plus ``inputs`` wired from other nodes:
+
+    g = WorkflowGraph(output="answer")
+    g.add("search", "web:search", inputs={"query": "$input.question"})
+    g.add("wiki", "wiki:lookup", inputs={"title": "$input.question"})
+    g.add("answer", "llm:summarize", inputs={"a": "search", "b": "wiki.text"})
+
+References are ``"<node>"`` (whole output), ``"<node>.<key>"`` (a key of a
+dict output) or ``"$input.<key>"`` (workflow argument). ``after`` adds
+ordering-only edges. Independent nodes run concurrently under the
+executor's budget; a failed run can be resumed from its RunState.
+"""
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from .action_space import ActionSpace, ActionSpec
+from .bases import BaseWorkflow
+from .memo import canonical_params
+
+INPUT_PREFIX = "$input."
+
+
+@dataclass
+class DAGNode:
+    id: str
+    action_id: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    inputs: Dict[str, str] = field(default_factory=dict)  # param -> reference
+    after: List[str] = field(default_factory=list)
+
+    def deps(self) -> Set[str]:
+        out = set(self.after)
+        for ref in self.inputs.values():
+            if not ref.startswith(INPUT_PREFIX):
+                out.add(ref.split(".", 1)[0])
+        return out
+
+
+class WorkflowGraph:
+    """Nodes plus the node whose output is the workflow result (default: last added)."""
+
+    def __init__(self, output: Optional[str] = None) -> None:
+        self.nodes: Dict[str, DAGNode] = {}
+        self.output = output
+
+    def add(
+        self,
+        node_id: str,
+        action_id: str,
+        params: Optional[Dict[str, Any]] = None,
+        inputs: Optional[Dict[str, str]] = None,
+        after: Sequence[str] = (),
+    ) -> "WorkflowGraph":
+        if "." in node_id or node_id.startswith("$"):
+            raise ValueError(f"Invalid node id {node_id!r}")
+        if node_id in self.nodes:
+            raise ValueError(f"Duplicate node id {node_id!r}")
+        self.nodes[node_id] = DAGNode(node_id, action_id, dict(params or {}), dict(inputs or {}), list(after))
+        return self
+
+    @property
+    def output_node(self) -> str:
+        if self.output is not None:
+            return self.output
+        if not self.nodes:
+            raise ValueError("Empty workflow graph")
+        return next(reversed(self.nodes))
+
+    def topo_order(self) -> List[str]:
+        """Node ids in dependency order; raises ValueError on unknown refs or cycles."""
+        indeg: Dict[str, int] = {}
+        for nid, node in self.nodes.items():
+            deps = node.deps()
+            missing = deps - self.nodes.keys()
+            if missing:
+                raise ValueError(f"Node {nid!r} depends on unknown node(s): {sorted(missing)}")
+            indeg[nid] = len(deps)
+        children = self.dependents()
+        ready = [nid for nid, d in indeg.items() if d == 0]
+        order: List[str] = []
+        while ready:
+            nid = ready.pop()
+            order.append(nid)
+            for child in children[nid]:
+                indeg[child] -= 1
+                if indeg[child] == 0:
+                    ready.append(child)
+        if len(order) != len(self.nodes):
+            raise ValueError(f"Cycle among nodes: {sorted(set(self.nodes) - set(order))}")
+        if self.output is not None and self.output not in self.nodes:
+            raise ValueError(f"Unknown output node {self.output!r}")
+        return order
+
+    def dependents(self) -> Dict[str, List[str]]:
+        out: Dict[str, List[str]] = {nid: [] for nid in self.nodes}
+        for nid, node in self.nodes.items():
+            for dep in node.deps():
+                if dep in out:
+                    out[dep].append(nid)
+        return out
+
+    def input_keys(self) -> List[str]:
+        keys = {
+            ref[len(INPUT_PREFIX):].split(".", 1)[0]
+            for node in self.nodes.values()
+            for ref in node.inputs.values()
+            if ref.startswith(INPUT_PREFIX)
+        }
+        return sorted(keys)
+
+    def inputs_schema(self) -> Dict[str, Any]:
+        keys = self.input_keys()
+        return {"type": "object", "properties": {k: {} for k in keys}, "required": keys}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "output": self.output,
+            "nodes": [
+                {"id": n.id, "action_id": n.action_id, "params": n.params, "inputs": n.inputs, "after": n.after}
+                for n in self.nodes.values()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "WorkflowGraph":
+        g = cls(output=data.get("output"))
+        for n in data.get("nodes", []):
+            g.add(n["id"], n["action_id"], n.get("params"), n.get("inputs"), n.get("after", ()))
+        return g
+
+
+@dataclass
+class RunState:
+    """Per-run node outputs/errors; pass back to ``DAGExecutor.run`` to resume."""
+
+    outputs: Dict[str, Any] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    skipped: List[str] = field(default_factory=list)  # blocked by a failed dependency
+    executed: List[str] = field(default_factory=list)  # nodes actually run in the last pass
+    cache_hits: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors and not self.skipped
+
+
+class WorkflowError(RuntimeError):
+    """A workflow run failed; ``state`` holds completed outputs for resuming."""
+
+    def __init__(self, state: RunState) -> None:
+        self.state = state
+        failed = ", ".join(f"{nid}: {err}" for nid, err in state.errors.items())
+        super().__init__(f"Workflow failed ({failed})")
+
+
+def _resolve(ref: str, inputs: Dict[str, Any], outputs: Dict[str, Any]) -> Any:
+    if ref.startswith(INPUT_PREFIX):
+        head, _, key = ref[len(INPUT_PREFIX):].partition(".")
+        value = inputs[head]
+    else:
+        head, _, key = ref.partition(".")
+        value = outputs[head]
+    for part in key.split(".") if key else ():
+        value = value[part] if isinstance(value, dict) else getattr(value, part)
+    return value
+
+
+class DAGExecutor:
+    """Runs a WorkflowGraph with at most ``max_concurrency`` nodes in flight.
+
+    Within a run, nodes calling the same action with the same params share
+    one execution. When a node fails, its dependents are skipped while
+    independent branches still complete, so a resumed run only re-executes
+    the failed node and what lies downstream of it.
+    """
+
+    def __init__(self, action_space: ActionSpace, max_concurrency: int = 4) -> None:
+        self.action_space = action_space
+        self.max_concurrency = max(1, max_concurrency)
+
+    async def run(self, graph: WorkflowGraph, inputs: Optional[Dict[str, Any]] = None, state: Optional[RunState] = None) -> RunState:
+        inputs = inputs or {}
+        graph.topo_order()  # validate before starting anything
+        # resuming: keep successful outputs, retry failed/skipped nodes
+        state = RunState(outputs=dict(state.outputs) if state is not None else {})
+        children = graph.dependents()
+        pending = {nid: len(n.deps() - state.outputs.keys()) for nid, n in graph.nodes.items() if nid not in state.outputs}
+        ready = [nid for nid, d in pending.items() if d == 0]
+        running: Dict[asyncio.Task, str] = {}
+        shared: Dict[Tuple[str, str], asyncio.Task] = {}
+
+        def launch(nid: str) -> None:
+            node = graph.nodes[nid]
+            try:
+                params = {**node.params, **{p: _resolve(ref, inputs, state.outputs) for p, ref in node.inputs.items()}}
+            except (KeyError, AttributeError, TypeError) as e:
+                state.errors[nid] = f"unresolved input: {e!r}"
+                block(nid)
+                return
+            key = (node.action_id, canonical_params(params))
+            task = shared.get(key)
+            if task is None:
+                task = shared[key] = asyncio.ensure_future(self.action_space.use(node.action_id, params))
+                state.executed.append(nid)
+            else:
+                state.cache_hits += 1
+            running[asyncio.ensure_future(asyncio.shield(task))] = nid
+
+        def block(nid: str) -> None:
+            for child in children[nid]:
+                if child in pending and child not in state.skipped:
+                    state.skipped.append(child)
+                    block(child)
+
+        try:
+            while ready or running:
+                while ready and len(running) < self.max_concurrency:
+                    launch(ready.pop(0))
+                if not running:
+                    continue
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    nid = running.pop(task)
+                    exc = task.exception()
+                    if exc is not None:
+                        state.errors[nid] = f"{type(exc).__name__}: {exc}"
+                        block(nid)
+                        continue
+                    state.outputs[nid] = task.result()
+                    for child in children[nid]:
+                        if child in pending and child not in state.skipped:
+                            pending[child] -= 1
+                            if pending[child] == 0:
+                                ready.append(child)
+        finally:
+            for task in running:
+                task.cancel()
+            for task in shared.values():
+                task.cancel()
+        return state
+
+
+class DAGWorkflow(BaseWorkflow):
+    """BaseWorkflow backed by a WorkflowGraph; registrable as an agent-as-action.
+
+    ``__call__(**inputs)`` returns the output node's value or raises
+    WorkflowError; ``run(inputs, state)`` returns the RunState for resuming.
+    """
+
+    graph: WorkflowGraph
+    action_space: ActionSpace
+    max_concurrency: int = 4
+
+    async def run(self, inputs: Optional[Dict[str, Any]] = None, state: Optional[RunState] = None) -> RunState:
+        return await DAGExecutor(self.action_space, self.max_concurrency).run(self.graph, inputs, state)
+
+    async def __call__(self, **kwargs) -> Any:
+        state = await self.run(kwargs)
+        if not state.ok:
+            raise WorkflowError(state)
+        return state.outputs[self.graph.output_node]
+
+    def to_param(self) -> Dict[str, Any]:
+        return {
+            "type": "agent-as-function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters,
+            },
+        }
+
+
+def register_workflow(
+    action_space: ActionSpace,
+    workflow_id: str,
+    graph: WorkflowGraph,
+    description: str = "",
+    max_concurrency: int = 4,
+    environment_tags: Sequence[str] = (),
+) -> DAGWorkflow:
+    """Build a DAGWorkflow and register it (with a spec) under ``workflow_id``."""
+    graph.topo_order()
+    schema = graph.inputs_schema()
+    name = workflow_id.split(":")[-1]
+    wf = DAGWorkflow(
+        name=name,
+        description=description,
+        parameters=schema,
+        graph=graph,
+        action_space=action_space,
+        max_concurrency=max_concurrency,
+    )
+    spec = ActionSpec(
+        id=workflow_id,
+        name=name,
+        description=description,
+        inputs_schema=schema,
+        requires=sorted({n.action_id for n in graph.nodes.values()}),
+        environment_tags=list(environment_tags),
+        provenance={"from": "workflow", "graph": graph.to_dict()},
+    )
+    action_space.register(workflow_id, wf, spec)
+    return wf
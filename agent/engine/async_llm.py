@@ -7,7 +7,16 @@ the rest of this repository.
 """
 from __future__ import annotations
 
-from typing import Any, Optional
+import json
+from typing import Any, AsyncIterator, Optional
+
+from runtime.deadline import charge_tokens, check_deadline, remaining_tokens, with_deadline
+from .costs import estimate_tokens
+from .dispatcher import LLMDispatcher, get_dispatcher
+from .formatter import parse_stream
+from .llm_cache import CachedLLM, LLMResponseCache, config_fields
+from .mock_llm import create_mock_llm, is_mock_config
+from .single_flight import SingleFlightLLM
 
 
 def _try_import() -> tuple[Any, ...] | None:
@@ -40,7 +49,7 @@ _imported = _try_import()
 
 
 if _imported is not None:
-    AsyncLLM, LLMConfig, LLMsConfig, create_llm_instance = _imported  # type: ignore
+    AsyncLLM, LLMConfig, LLMsConfig, _create_raw_llm = _imported  # type: ignore
 else:
     class LLMConfig:  # minimal stub
         def __init__(self, config: dict):
@@ -70,6 +79,174 @@ else:
         def get_usage_summary(self) -> dict:
             return {}
 
-    def create_llm_instance(llm_config) -> AsyncLLM:  # type: ignore
+    def _create_raw_llm(llm_config) -> AsyncLLM:  # type: ignore
+        base_url = llm_config.get("base_url") if isinstance(llm_config, dict) else getattr(llm_config, "base_url", None)
+        if base_url:
+            from .http_llm import HTTPChatLLM
+
+            return HTTPChatLLM(llm_config)
         return AsyncLLM(llm_config)
 
+
+class DispatchedLLM:
+    """Routes an AsyncLLM's calls through the shared LLMDispatcher.
+
+    Admission is charged with an estimate (prompt + ``max_tokens``, or
+    ``completion_estimate`` when unset) and reconciled with the estimated
+    size of the actual response. Other attributes pass through.
+    """
+
+    def __init__(
+        self,
+        llm: Any,
+        dispatcher: Optional[LLMDispatcher] = None,
+        priority: Optional[int] = None,
+        completion_estimate: int = 256,
+    ) -> None:
+        self._llm = llm
+        self.dispatcher = dispatcher or get_dispatcher()
+        self.priority = priority
+        self.completion_estimate = completion_estimate
+        self.model = str(config_fields(llm).get("model") or "default")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._llm, name)
+
+    async def __call__(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        prompt_tokens = estimate_tokens(prompt)
+        return await self.dispatcher.run(
+            self.model,
+            lambda: self._llm(prompt, max_tokens=max_tokens),
+            est_tokens=prompt_tokens + (max_tokens or self.completion_estimate),
+            priority=self.priority,
+            count_tokens=lambda out: prompt_tokens + estimate_tokens(str(out)),
+        )
+
+    async def call_with_format(self, prompt: str, formatter: Any):
+        full_prompt = formatter.prepare_prompt(prompt) if hasattr(formatter, "prepare_prompt") else prompt
+        prompt_tokens = estimate_tokens(full_prompt)
+        return await self.dispatcher.run(
+            self.model,
+            lambda: self._llm.call_with_format(prompt, formatter),
+            est_tokens=prompt_tokens + self.completion_estimate,
+            priority=self.priority,
+            count_tokens=lambda out: prompt_tokens + estimate_tokens(json.dumps(out, ensure_ascii=False, default=str)),
+        )
+
+    async def stream(self, prompt: str, max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        """Stream while holding one dispatcher slot; clients without ``stream`` yield one chunk."""
+        prompt_tokens = estimate_tokens(prompt)
+        est = prompt_tokens + (max_tokens or self.completion_estimate)
+        async with self.dispatcher.admit(self.model, est, self.priority) as slot:
+            raw_stream = getattr(self._llm, "stream", None)
+            if raw_stream is None:
+                text = await self._llm(prompt, max_tokens=max_tokens)
+                slot["tokens"] = prompt_tokens + estimate_tokens(text)
+                yield text
+                return
+            seen = 0
+            async for piece in raw_stream(prompt, max_tokens=max_tokens):
+                seen += len(piece)
+                slot["tokens"] = prompt_tokens + (seen + 3) // 4
+                yield piece
+
+
+class LLMProxy:
+    """AsyncLLM wrapper honouring the caller's deadline and token budget.
+
+    Calls are refused once the deadline (see runtime.deadline) has passed or
+    the token budget is spent, are cancelled when the deadline expires, and
+    are charged to the budget (estimated from prompt and response size, since
+    usage summaries are shared across concurrent callers). ``max_tokens`` is
+    capped by what is left of the budget. Other attributes pass through.
+    """
+
+    def __init__(self, llm: Any) -> None:
+        self._llm = llm
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._llm, name)
+
+    async def __call__(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        check_deadline()
+        left = remaining_tokens()
+        if left is not None:
+            cap = max(1, left - estimate_tokens(prompt))
+            max_tokens = cap if max_tokens is None else min(max_tokens, cap)
+        out = await with_deadline(self._llm(prompt, max_tokens=max_tokens))
+        charge_tokens(estimate_tokens(prompt) + estimate_tokens(str(out)))
+        return out
+
+    async def call_with_format(self, prompt: str, formatter: Any):
+        check_deadline()
+        out = await with_deadline(self._llm.call_with_format(prompt, formatter))
+        full_prompt = formatter.prepare_prompt(prompt) if hasattr(formatter, "prepare_prompt") else prompt
+        charge_tokens(estimate_tokens(full_prompt) + estimate_tokens(json.dumps(out, ensure_ascii=False, default=str)))
+        return out
+
+    async def stream(self, prompt: str, max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        """Yield response chunks; each chunk wait is bounded by the deadline, tokens charged as received."""
+        check_deadline()
+        left = remaining_tokens()
+        if left is not None:
+            cap = max(1, left - estimate_tokens(prompt))
+            max_tokens = cap if max_tokens is None else min(max_tokens, cap)
+        chunks = self._llm.stream(prompt, max_tokens=max_tokens)
+        received = 0
+        try:
+            while True:
+                try:
+                    piece = await with_deadline(chunks.__anext__())
+                except StopAsyncIteration:
+                    break
+                received += len(piece)
+                yield piece
+        finally:
+            await chunks.aclose()
+            charge_tokens(estimate_tokens(prompt) + (received + 3) // 4)
+
+    async def stream_with_format(self, prompt: str, formatter: Any) -> AsyncIterator[Any]:
+        """Yield parsed items as soon as each one is complete.
+
+        Uses the formatter's incremental parser and stops generation at the
+        first structural error (FormatError). Formatters without a stream
+        parser fall back to ``call_with_format`` and yield its items at the end.
+        """
+        parser = formatter.stream_parser() if hasattr(formatter, "stream_parser") else None
+        if parser is None:
+            data = await self.call_with_format(prompt, formatter)
+            for item in data if isinstance(data, list) else [data]:
+                yield item
+            return
+        async for item in parse_stream(self.stream(formatter.prepare_prompt(prompt)), parser):
+            yield item
+
+
+def create_llm_instance(
+    llm_config,
+    cache: Optional[LLMResponseCache] = None,
+    priority: Optional[int] = None,
+    single_flight: bool = True,
+    coalesce_sampling: bool = False,
+) -> LLMProxy:
+    """Create an AsyncLLM wrapped in an LLMProxy (deadline/budget aware).
+
+    Configs whose model starts with ``mock`` (or that carry a ``mock`` dict)
+    get the offline MockLLM backend (see engine.mock_llm). Calls are
+    admitted by the process-wide LLMDispatcher (rate limits,
+    priorities, retries); ``priority`` pins this client's priority instead
+    of taking it from ``llm_priority`` at call time. With ``cache``,
+    responses are served from / stored in an LLMResponseCache, so hits
+    skip the dispatcher entirely. With ``single_flight``, identical
+    concurrent deterministic requests share one upstream call (see
+    engine.single_flight; ``coalesce_sampling`` extends this to sampled
+    requests).
+    """
+    raw = create_mock_llm(llm_config) if is_mock_config(llm_config) else _create_raw_llm(llm_config)
+    llm = DispatchedLLM(raw, priority=priority)
+    if cache is not None:
+        llm = CachedLLM(llm, cache)
+    if single_flight:
+        llm = SingleFlightLLM(llm, coalesce_sampling=coalesce_sampling)
+    return LLMProxy(llm)
+
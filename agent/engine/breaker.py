@@ -0,0 +1,105 @@
+"""Per-action circuit breakers shared across tasks.
+
+A breaker opens after ``failure_threshold`` consecutive failures and then
+fails fast; after ``reset_after_s`` it lets ``half_open_probes`` calls
+through (half-open), closing again on a probe success and re-opening on a
+probe failure. ``get_breakers()`` is the process-wide registry, so every
+ToolExecutor (and every concurrent task) sees the same state per action.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+@dataclass
+class BreakerPolicy:
+    failure_threshold: int = 5
+    reset_after_s: float = 30.0
+    half_open_probes: int = 1
+
+    @classmethod
+    def from_dict(cls, d: Optional[Dict[str, Any]]) -> "BreakerPolicy":
+        d = d or {}
+        return cls(**{k: d[k] for k in ("failure_threshold", "reset_after_s", "half_open_probes") if k in d})
+
+
+class CircuitBreaker:
+    def __init__(self, policy: Optional[BreakerPolicy] = None) -> None:
+        self.policy = policy or BreakerPolicy()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+        self.rejected = 0
+        self._probes = 0
+
+    def allow(self) -> bool:
+        """Whether a call may proceed now (claims a probe slot when half-open)."""
+        if self.state == OPEN:
+            if time.monotonic() - (self.opened_at or 0.0) < self.policy.reset_after_s:
+                self.rejected += 1
+                return False
+            self.state, self._probes = HALF_OPEN, 0
+        if self.state == HALF_OPEN:
+            if self._probes >= self.policy.half_open_probes:
+                self.rejected += 1
+                return False
+            self._probes += 1
+        return True
+
+    def record(self, ok: Optional[bool]) -> None:
+        """Outcome of an allowed call; ``None`` for outcomes that say nothing about the action."""
+        if self.state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+        if ok is None:
+            return
+        if ok:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            return
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.policy.failure_threshold:
+            if self.state != OPEN:
+                self.trips += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "opened_at": time.time() - (time.monotonic() - self.opened_at) if self.opened_at is not None else None,
+        }
+
+
+class BreakerRegistry:
+    def __init__(self) -> None:
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, key: str, policy: Optional[BreakerPolicy] = None) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker(policy)
+        return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {k: b.to_dict() for k, b in self._breakers.items()}
+
+
+_registry: Optional[BreakerRegistry] = None
+
+
+def get_breakers() -> BreakerRegistry:
+    global _registry
+    if _registry is None:
+        _registry = BreakerRegistry()
+    return _registry
@@ -49,3 +49,24 @@ def merge_usage_into_cost(
         "usd": float(usd),
     }
 
+
+def estimate_tokens(text: str | None) -> int:
+    """Cheap pre-call token estimate (~4 characters per token)."""
+    if not text:
+        return 0
+    return max(1, (len(text) + 3) // 4)
+
+
+def usage_total_tokens(usage: Dict[str, Any] | None) -> int:
+    """Total tokens from a usage summary (AsyncLLM.get_usage_summary and variants)."""
+    usage = usage or {}
+    for key in ("total_tokens", "total"):
+        if key in usage:
+            return int(usage.get(key) or 0)
+    toks = usage.get("tokens")
+    if isinstance(toks, dict):
+        return usage_total_tokens(toks)
+    return sum(
+        int(usage.get(k, 0) or 0)
+        for k in ("prompt", "completion", "prompt_tokens", "completion_tokens", "total_input_tokens", "total_output_tokens")
+    )
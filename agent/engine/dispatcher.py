@@ -0,0 +1,471 @@
+"""Process-wide LLM dispatcher: rate limits, priorities, retries, pooled HTTP.
+
+Every LLM call made through ``create_llm_instance`` is admitted by the
+shared LLMDispatcher (``get_dispatcher()``):
+
+- per-model token buckets for requests/min and tokens/min, charged with a
+  pre-call estimate and reconciled with the actual count afterwards
+- a priority queue per model (lower value first; see ``llm_priority``),
+  so e.g. judge calls overtake exploration calls under contention
+- retries with full-jitter exponential backoff on 429/5xx (Retry-After
+  is honoured when the error carries it)
+- ``metrics()``: queue depth per model/priority, in-flight, retries, waits
+
+``HTTPPool`` keeps one keep-alive connection pool per endpoint (stdlib
+asyncio streams; HTTP/1.1 JSON requests) for HTTP-backed clients.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import json
+import random
+import ssl
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+from urllib.parse import urlsplit
+
+T = TypeVar("T")
+
+PRIORITY_JUDGE = 0
+PRIORITY_DEFAULT = 5
+PRIORITY_EXPLORATION = 10
+
+_priority: ContextVar[int] = ContextVar("llm_priority", default=PRIORITY_DEFAULT)
+
+
+@contextmanager
+def llm_priority(priority: int) -> Iterator[None]:
+    """LLM calls made inside this block are scheduled with ``priority``."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+# ----------------------------
+# HTTP
+# ----------------------------
+class HTTPStatusError(RuntimeError):
+    def __init__(self, status: int, body: bytes = b"", retry_after: Optional[float] = None) -> None:
+        self.status_code = status
+        self.body = body
+        self.retry_after = retry_after
+        super().__init__(f"HTTP {status}: {body[:200].decode('utf-8', 'replace')}")
+
+
+def _status_error(status: int, headers: Dict[str, str], body: bytes) -> HTTPStatusError:
+    retry_after = headers.get("retry-after")
+    return HTTPStatusError(status, body, float(retry_after) if retry_after else None)
+
+
+class HTTPPool:
+    """Keep-alive connection pool for one endpoint (``scheme://host:port``)."""
+
+    def __init__(self, endpoint: str, max_connections: int = 32) -> None:
+        parts = urlsplit(endpoint)
+        self.host = parts.hostname or "localhost"
+        self.tls = parts.scheme == "https"
+        self.port = parts.port or (443 if self.tls else 80)
+        self.base_path = parts.path.rstrip("/")
+        self.max_connections = max_connections
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._sem = asyncio.Semaphore(max_connections)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.opened = 0  # connections created (for pool-efficiency checks)
+
+    def _bind_loop(self) -> None:
+        # streams belong to one event loop; start over when used from a new one
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._idle = []
+            self._sem = asyncio.Semaphore(self.max_connections)
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+        self.opened += 1
+        ctx = ssl.create_default_context() if self.tls else None
+        return await asyncio.open_connection(self.host, self.port, ssl=ctx)
+
+    def _encode(self, method: str, path: str, payload: Any, headers: Optional[Dict[str, str]]) -> bytes:
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        head = {
+            "Host": self.host,
+            "Content-Type": "application/json",
+            "Content-Length": str(len(body)),
+            "Connection": "keep-alive",
+            **(headers or {}),
+        }
+        raw = f"{method} {self.base_path}{path} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in head.items()) + "\r\n"
+        return raw.encode("latin-1") + body
+
+    def _reuse(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, headers: Dict[str, str]) -> None:
+        if headers.get("connection", "").lower() == "close":
+            writer.close()
+        else:
+            self._idle.append((reader, writer))
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        payload: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        raw = self._encode(method, path, payload, headers)
+        self._bind_loop()
+        async with self._sem:
+            reader, writer = await self._connect()
+            try:
+                writer.write(raw)
+                await writer.drain()
+                status, resp_headers = await self._read_head(reader)
+                data = b"".join([c async for c in self._read_body(reader, resp_headers)])
+            except BaseException:
+                writer.close()
+                raise
+            self._reuse(reader, writer, resp_headers)
+        return status, resp_headers, data
+
+    async def stream(
+        self,
+        method: str,
+        path: str,
+        payload: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> AsyncIterator[bytes]:
+        """Like request() but yields body chunks as they arrive; non-2xx raises HTTPStatusError.
+
+        A stream closed early drops its connection instead of returning it to the pool.
+        """
+        raw = self._encode(method, path, payload, headers)
+        self._bind_loop()
+        async with self._sem:
+            reader, writer = await self._connect()
+            complete = False
+            try:
+                writer.write(raw)
+                await writer.drain()
+                status, resp_headers = await self._read_head(reader)
+                if not 200 <= status < 300:
+                    data = b"".join([c async for c in self._read_body(reader, resp_headers)])
+                    complete = True
+                    raise _status_error(status, resp_headers, data)
+                async for chunk in self._read_body(reader, resp_headers):
+                    yield chunk
+                complete = True
+            finally:
+                if complete:
+                    self._reuse(reader, writer, resp_headers)
+                else:
+                    writer.close()
+
+    @staticmethod
+    async def _read_head(reader: asyncio.StreamReader) -> Tuple[int, Dict[str, str]]:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by server")
+        status = int(status_line.split()[1])
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = line.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+        return status, headers
+
+    @staticmethod
+    async def _read_body(reader: asyncio.StreamReader, headers: Dict[str, str]) -> AsyncIterator[bytes]:
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    return
+                yield await reader.readexactly(size)
+                await reader.readline()
+        elif "content-length" in headers:
+            length = int(headers["content-length"])
+            if length:
+                yield await reader.readexactly(length)
+        else:  # body delimited by connection close
+            headers["connection"] = "close"
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    return
+                yield chunk
+
+    async def post_json(self, path: str, payload: Any, headers: Optional[Dict[str, str]] = None) -> Any:
+        """POST JSON and decode the JSON reply; non-2xx raises HTTPStatusError."""
+        status, resp_headers, data = await self.request("POST", path, payload, headers)
+        if not 200 <= status < 300:
+            raise _status_error(status, resp_headers, data)
+        return json.loads(data) if data else None
+
+    async def close(self) -> None:
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+# ----------------------------
+# Rate limiting
+# ----------------------------
+class _TokenBucket:
+    """Continuous-refill bucket; ``level`` may go negative after reconciliation."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= amount
+
+    def give(self, amount: float) -> None:
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+@dataclass
+class ModelLimits:
+    rpm: Optional[float] = None
+    tpm: Optional[float] = None
+    max_concurrency: Optional[int] = None
+
+
+class _ModelQueue:
+    def __init__(self, limits: ModelLimits) -> None:
+        self.limits = limits
+        self.requests = _TokenBucket(limits.rpm) if limits.rpm else None
+        self.tokens = _TokenBucket(limits.tpm) if limits.tpm else None
+        self.heap: List[Tuple[int, int, int, asyncio.Future]] = []
+        self.in_flight = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def pump(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        while self.heap:
+            _, _, est, fut = self.heap[0]
+            if fut.done():  # waiter cancelled
+                heapq.heappop(self.heap)
+                continue
+            cap = self.limits.max_concurrency
+            if cap is not None and self.in_flight >= cap:
+                return  # release() pumps again
+            wait = max(
+                self.requests.wait_time(1) if self.requests else 0.0,
+                self.tokens.wait_time(est) if self.tokens else 0.0,
+            )
+            if wait > 0:
+                self.timer = asyncio.get_running_loop().call_later(wait, self.pump)
+                return
+            heapq.heappop(self.heap)
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(min(est, self.tokens.capacity))
+            self.in_flight += 1
+            fut.set_result(None)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self.pump()
+
+
+def _status_of(exc: BaseException) -> Optional[int]:
+    for obj in (exc, getattr(exc, "response", None)):
+        for attr in ("status_code", "status", "http_status"):
+            val = getattr(obj, attr, None)
+            if isinstance(val, int):
+                return val
+    return None
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    val = getattr(exc, "retry_after", None)
+    if val is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+        val = headers.get("retry-after") if hasattr(headers, "get") else None
+    try:
+        return float(val) if val is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMDispatcher:
+    """Admission control for LLM calls, shared by every client in the process."""
+
+    def __init__(self, max_retries: int = 4, backoff_base_s: float = 0.5, backoff_max_s: float = 30.0) -> None:
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self._limits: Dict[str, ModelLimits] = {}
+        self._queues: Dict[str, _ModelQueue] = {}
+        self._pools: Dict[str, HTTPPool] = {}
+        self._seq = itertools.count()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def configure(self, model: str, rpm: Optional[float] = None, tpm: Optional[float] = None, max_concurrency: Optional[int] = None) -> None:
+        self._limits[model] = ModelLimits(rpm, tpm, max_concurrency)
+        self._queues.pop(model, None)  # rebuilt with the new limits on next use
+
+    def http_client(self, endpoint: str, max_connections: int = 32) -> HTTPPool:
+        """Shared connection pool for ``endpoint`` (created on first use)."""
+        key = endpoint.rstrip("/")
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = HTTPPool(key, max_connections)
+        return pool
+
+    def _queue(self, model: str) -> _ModelQueue:
+        q = self._queues.get(model)
+        if q is None:
+            q = self._queues[model] = _ModelQueue(self._limits.get(model, ModelLimits()))
+        return q
+
+    def _stat(self, model: str) -> Dict[str, float]:
+        return self._stats.setdefault(model, {"calls": 0, "retries": 0, "failures": 0, "wait_s": 0.0, "token_error": 0})
+
+    async def _acquire(self, q: _ModelQueue, est: int, priority: int) -> None:
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        heapq.heappush(q.heap, (priority, next(self._seq), est, fut))
+        q.pump()
+        try:
+            await fut
+        except BaseException:
+            if fut.done() and not fut.cancelled():
+                q.release()  # admitted just before cancellation
+            raise
+
+    async def run(
+        self,
+        model: str,
+        call: Callable[[], Awaitable[T]],
+        est_tokens: int = 0,
+        priority: Optional[int] = None,
+        count_tokens: Optional[Callable[[T], int]] = None,
+    ) -> T:
+        """Run ``call()`` once admitted for ``model``; retries 429/5xx failures."""
+        priority = current_priority() if priority is None else priority
+        q = self._queue(model)
+        st = self._stat(model)
+        attempt = 0
+        while True:
+            t0 = time.monotonic()
+            await self._acquire(q, est_tokens, priority)
+            st["wait_s"] += time.monotonic() - t0
+            try:
+                result = await call()
+            except Exception as e:
+                q.release()
+                status = _status_of(e)
+                retryable = status is not None and (status == 429 or 500 <= status < 600)
+                if q.tokens is not None and retryable:
+                    q.tokens.give(est_tokens)  # rejected requests are not billed
+                if not retryable or attempt >= self.max_retries:
+                    st["failures"] += 1
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * 2 ** attempt))
+                st["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                q.release()
+                raise
+            q.release()
+            st["calls"] += 1
+            if count_tokens is not None:
+                actual = count_tokens(result)
+                st["token_error"] += actual - est_tokens
+                if q.tokens is not None:
+                    q.tokens.take(actual - est_tokens)  # reconcile the estimate
+            return result
+
+    @asynccontextmanager
+    async def admit(self, model: str, est_tokens: int = 0, priority: Optional[int] = None) -> AsyncIterator[Dict[str, int]]:
+        """Hold one admission slot for ``model`` while the block runs (streams; no retries).
+
+        Set ``slot["tokens"]`` to the actual token count to reconcile the estimate.
+        """
+        priority = current_priority() if priority is None else priority
+        q = self._queue(model)
+        st = self._stat(model)
+        t0 = time.monotonic()
+        await self._acquire(q, est_tokens, priority)
+        st["wait_s"] += time.monotonic() - t0
+        slot = {"tokens": est_tokens}
+        try:
+            yield slot
+        except BaseException:
+            st["failures"] += 1
+            raise
+        finally:
+            q.release()
+            actual = slot["tokens"]
+            if actual != est_tokens:
+                st["token_error"] += actual - est_tokens
+                if q.tokens is not None:
+                    q.tokens.take(actual - est_tokens)
+        st["calls"] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for model, q in self._queues.items():
+            depth: Dict[int, int] = {}
+            for prio, _, _, fut in q.heap:
+                if not fut.done():
+                    depth[prio] = depth.get(prio, 0) + 1
+            out[model] = {
+                "queue_depth": sum(depth.values()),
+                "queue_by_priority": dict(sorted(depth.items())),
+                "in_flight": q.in_flight,
+                **self._stat(model),
+            }
+        return out
+
+    async def aclose(self) -> None:
+        for pool in self._pools.values():
+            await pool.close()
+        self._pools.clear()
+
+
+_dispatcher: Optional[LLMDispatcher] = None
+
+
+def get_dispatcher() -> LLMDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = LLMDispatcher()
+    return _dispatcher
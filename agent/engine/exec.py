@@ -1,10 +1,20 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from dataclasses import dataclass
-from typing import Any, Dict, Protocol, Optional
+from typing import Any, Dict, Protocol, Optional, Tuple
 import asyncio
+import random
 
-from runtime.sandbox import sandbox
+from runtime.deadline import DeadlineExceeded, deadline_scope, remaining_time, with_deadline
+from runtime.sandbox import SandboxLimits, SandboxPool, sandbox as sandbox_scope
+from runtime.telemetry import log_warn
+from runtime.workers import ProcessWorkerPool, WorkerCrashed, WorkerError, call_sync
+from .breaker import BreakerPolicy, BreakerRegistry, get_breakers
+from .schema import ParamValidationError, ValidatorCache
+
+EXEC_MODES = ("inline", "thread", "process")
 
 
 @dataclass
@@ -23,24 +33,207 @@ class ToolExecutor:
     """Minimal tool executor with optional sandbox flag.
 
     This is a placeholder to unify execution semantics and accounting.
+
+    ``action.exec_policy["mode"]`` picks where the call runs:
+
+    - ``inline`` (default): awaited on the event loop; for well-behaved async code
+    - ``thread``: on a private event loop in a worker thread, so blocking I/O
+      does not stall the loop; a timeout returns to the caller but cannot
+      stop the thread
+    - ``process``: in a warm worker process (runtime.workers) for CPU-bound or
+      untrusted code; on timeout the worker is killed. The action and its
+      params/result must be picklable. With ``sandbox=True`` (the default)
+      the worker comes from a SandboxPool under ``sandbox_limits``
+      (rlimits, scratch dir, no network; see runtime.sandbox)
+
+    Only ``process`` mode isolates anything: in ``inline``/``thread`` mode
+    ``sandbox=True`` gives no rlimits or network denial, and the executor
+    warns once per mode. With ``force_sandbox=True`` such calls run in a
+    SandboxPool worker instead, whatever their mode.
+
+    Other ``exec_policy`` keys:
+
+    - ``timeout`` / ``timeout_s``: per-attempt timeout (default ``timeout_s``)
+    - ``retries``: extra attempts after a failure, with full-jitter
+      exponential backoff from ``backoff_s`` (default 0.2s, capped at 5s)
+    - ``budget`` / ``budget_s``: wall-clock seconds for all attempts together
+    - ``breaker``: BreakerPolicy fields for this action's circuit breaker
+
+    Breakers (engine.breaker; shared process-wide by default) are keyed by
+    ``action_id`` (resolved through ``action_space`` aliases when set);
+    calls without an id run without one. An open breaker fails the call
+    fast with ``"circuit open"``. With ``action_space`` set, breaker state
+    changes are published as a new spec with ``validation["breaker"]`` so
+    retrieval can down-rank broken actions.
     """
 
-    def __init__(self, timeout_s: Optional[float] = 30.0) -> None:
+    def __init__(
+        self,
+        timeout_s: Optional[float] = 30.0,
+        validate_params: bool = True,
+        default_mode: str = "inline",
+        max_threads: int = 16,
+        max_processes: Optional[int] = None,
+        sandbox_limits: Optional[SandboxLimits] = None,
+        breakers: Optional[BreakerRegistry] = None,
+        action_space: Any = None,
+        force_sandbox: bool = False,
+    ) -> None:
+        if default_mode not in EXEC_MODES:
+            raise ValueError(f"Unknown exec mode: {default_mode!r}")
         self.timeout_s = timeout_s
+        self.validators: Optional[ValidatorCache] = ValidatorCache() if validate_params else None
+        self.default_mode = default_mode
+        self.max_threads = max_threads
+        self.max_processes = max_processes
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self.sandbox_limits = sandbox_limits
+        self._processes: Dict[bool, ProcessWorkerPool] = {}  # sandboxed? -> pool
+        self.mode_counts: Dict[str, int] = {m: 0 for m in EXEC_MODES}
+        self.breakers = breakers or get_breakers()
+        self.action_space = action_space
+        self.force_sandbox = force_sandbox
+        self._unsandboxed_warned: set = set()
+
+    def _mode(self, action: Any) -> str:
+        policy = getattr(action, "exec_policy", None) or {}
+        mode = policy.get("mode", self.default_mode)
+        if mode not in EXEC_MODES:
+            raise ValueError(f"Unknown exec mode: {mode!r}")
+        return mode
 
-    async def run(self, action: CallableAction, params: Dict[str, Any] | None = None, sandbox: bool = True) -> ExecResult:
+    def _process_pool(self, sandboxed: bool) -> ProcessWorkerPool:
+        pool = self._processes.get(sandboxed)
+        if pool is None:
+            kwargs = {"max_workers": self.max_processes} if self.max_processes else {}
+            pool = SandboxPool(self.sandbox_limits, **kwargs) if sandboxed else ProcessWorkerPool(**kwargs)
+            self._processes[sandboxed] = pool
+        return pool
+
+    def _execute(self, action: CallableAction, params: Dict[str, Any], mode: str, sandboxed: bool = True):
+        """Awaitable running the call in ``mode``."""
+        self.mode_counts[mode] += 1
+        if mode == "thread":
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(self.max_threads, thread_name_prefix="tool")
+            return asyncio.get_running_loop().run_in_executor(self._threads, call_sync, action, params)
+        if mode == "process":
+            return self._process_pool(sandboxed).run(action, params)
+        return action(**params)
+
+    def close(self) -> None:
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
+        for pool in self._processes.values():
+            pool.close()
+        self._processes.clear()
+
+    async def run(
+        self,
+        action: CallableAction,
+        params: Dict[str, Any] | None = None,
+        sandbox: bool = True,
+        action_id: Optional[str] = None,
+    ) -> ExecResult:
         params = params or {}
+        key = action_id
+        if key is not None and self.action_space is not None:
+            key = self.action_space.resolve(key)
+        schema = getattr(action, "parameters", None)
+        if self.validators is not None and schema:
+            # keyed per action (same-named actions in different namespaces differ)
+            vkey = key or f"{getattr(action, 'name', type(action).__name__)}@{id(action):x}"
+            try:
+                self.validators.check(vkey, getattr(action, "version", None), schema, params)
+            except ParamValidationError as e:
+                # rejected before sandbox setup; errors are structured for the agent
+                return ExecResult(ok=False, output=e.to_dict(), cost=0.0, logs=[e.feedback()])
+        policy = getattr(action, "exec_policy", None) or {}
+        try:
+            mode = self._mode(action)
+        except ValueError as e:
+            return ExecResult(ok=False, output=str(e), cost=0.0, logs=[f"error: {e}"])
+        if sandbox and mode != "process":
+            if self.force_sandbox:
+                mode = "process"
+            elif mode not in self._unsandboxed_warned:
+                self._unsandboxed_warned.add(mode)
+                log_warn(
+                    f"ToolExecutor: sandbox=True does not isolate {mode!r} calls; "
+                    "use exec_policy mode 'process' or force_sandbox=True"
+                )
+        breaker = self.breakers.get(key, BreakerPolicy.from_dict(policy.get("breaker"))) if key is not None else None
+        timeout = policy.get("timeout", policy.get("timeout_s", self.timeout_s))
+        retries = max(0, int(policy.get("retries", 0) or 0))
+        backoff = float(policy.get("backoff_s", 0.2))
+        budget = policy.get("budget", policy.get("budget_s"))
+        logs: list[str] = []
+        result = ExecResult(ok=False, output="circuit open", cost=0.0, logs=logs)
+        with deadline_scope(timeout_s=float(budget)) if budget else nullcontext():
+            for attempt in range(retries + 1):
+                if breaker is not None and not breaker.allow():
+                    logs.append("circuit open")
+                    result = ExecResult(ok=False, output="circuit open", cost=0.0, logs=logs)
+                    break
+                verdict: Optional[bool] = None
+                try:
+                    result, verdict = await self._attempt(action, params, mode, sandbox, timeout)
+                finally:
+                    if breaker is not None:
+                        breaker.record(verdict)  # also on cancellation: frees a half-open probe slot
+                logs.extend(result.logs or [])
+                result.logs = logs
+                if breaker is not None:
+                    self._publish(key, breaker)
+                if result.ok or verdict is None or attempt == retries:
+                    break
+                delay = random.uniform(0, min(5.0, backoff * 2 ** attempt))
+                left = remaining_time()
+                if left is not None and left <= delay:
+                    break
+                logs.append(f"retry {attempt + 1}/{retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+        return result
+
+    async def _attempt(
+        self,
+        action: CallableAction,
+        params: Dict[str, Any],
+        mode: str,
+        sandbox: bool,
+        timeout: Optional[float],
+    ) -> Tuple[ExecResult, Optional[bool]]:
+        """One call; the verdict is what the breaker learns (None: not the action's fault)."""
         try:
-            async def _invoke():
-                return await action(**params)
-
-            with sandbox(enabled=sandbox):
-                if self.timeout_s is not None:
-                    out = await asyncio.wait_for(_invoke(), timeout=self.timeout_s)
-                else:
-                    out = await _invoke()
-            return ExecResult(ok=True, output=out, cost=0.0, logs=[])
+            with sandbox_scope(enabled=sandbox):
+                # timeout is capped by the remaining time of the caller's deadline
+                out = await with_deadline(self._execute(action, params, mode, sandbox), timeout)
+            return ExecResult(ok=True, output=out, cost=0.0, logs=[]), True
+        except DeadlineExceeded:
+            return ExecResult(ok=False, output="deadline exceeded", cost=0.0, logs=["deadline exceeded"]), None
         except asyncio.TimeoutError:
-            return ExecResult(ok=False, output="timeout", cost=0.0, logs=["timeout"])
+            return ExecResult(ok=False, output="timeout", cost=0.0, logs=["timeout"]), False
+        except WorkerError as e:
+            return ExecResult(ok=False, output=str(e), cost=0.0, logs=[f"error: {e}", e.tb]), False
+        except WorkerCrashed as e:  # e.g. SIGXCPU from the sandbox CPU limit
+            return ExecResult(ok=False, output=str(e), cost=0.0, logs=[f"crashed: {e}"]), False
+        except ParamValidationError as e:  # raised by nested ActionSpace.use calls
+            return ExecResult(ok=False, output=e.to_dict(), cost=0.0, logs=[e.feedback()]), None
         except Exception as e:
-            return ExecResult(ok=False, output=str(e), cost=0.0, logs=[f"error: {e}"])
+            return ExecResult(ok=False, output=str(e), cost=0.0, logs=[f"error: {e}"]), False
+
+    def _publish(self, key: str, breaker: Any) -> None:
+        """Publish a spec copy carrying the breaker state when its state or trip count changed."""
+        if self.action_space is None:
+            return
+        state = breaker.to_dict()
+        with self.action_space.batch() as b:
+            spec = b.current_specs().get(key)
+            if spec is None:
+                return
+            prev = spec._peek("validation").get("breaker") or {}
+            if (prev.get("state"), prev.get("trips")) == (state["state"], state["trips"]):
+                return
+            val = {**spec._peek("validation"), "breaker": state}
+            b.register_specs([type(spec).from_dict({**spec.to_dict(), "validation": val})])
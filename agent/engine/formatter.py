@@ -1,12 +1,127 @@
 from __future__ import annotations
 
-from typing import Any, Tuple
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
 
 
 class FormatError(Exception):
     pass
 
 
+async def call_with_format_retries(
+    call: Callable[[str], Awaitable[str]],
+    prompt: str,
+    formatter: "BaseFormatter",
+    retries: int = 2,
+) -> Any:
+    """``call_with_format`` for plain text clients: re-ask with the error on invalid output."""
+    text_prompt = formatter.prepare_prompt(prompt)
+    for _ in range(retries + 1):
+        ok, data = formatter.validate_response(await call(text_prompt))
+        if ok:
+            return data
+        text_prompt = (
+            f"{formatter.prepare_prompt(prompt)}\n\n"
+            f"Your previous answer was invalid: {formatter.format_error_message()}. Try again."
+        )
+    raise FormatError(formatter.format_error_message())
+
+
+class IncrementalJSONArrayParser:
+    """Incremental parser for a top-level JSON array of objects.
+
+    ``feed(chunk)`` returns the items whose object closed within the chunk
+    (after ``item_check``, which returns an error message or None) and
+    raises FormatError on the first structural error, so a caller can stop
+    generation there. ``close()`` checks the array was terminated and
+    returns all items.
+    """
+
+    _WS = " \t\r\n"
+
+    def __init__(self, item_check: Optional[Callable[[int, Any], Optional[str]]] = None) -> None:
+        self.item_check = item_check
+        self.items: List[Any] = []
+        self._state = "start"  # start | first | item | sep | object | done
+        self._buf: List[str] = []
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+
+    def feed(self, chunk: str) -> List[Any]:
+        out: List[Any] = []
+        for ch in chunk:
+            state = self._state
+            if state == "object":
+                self._buf.append(ch)
+                if self._in_str:
+                    if self._esc:
+                        self._esc = False
+                    elif ch == "\\":
+                        self._esc = True
+                    elif ch == '"':
+                        self._in_str = False
+                elif ch == '"':
+                    self._in_str = True
+                elif ch in "{[":
+                    self._depth += 1
+                elif ch in "}]":
+                    self._depth -= 1
+                    if self._depth == 0:
+                        out.append(self._finish_item())
+                continue
+            if ch in self._WS:
+                continue
+            if state == "start":
+                if ch != "[":
+                    raise FormatError("Top-level JSON is not a list")
+                self._state = "first"
+            elif state in ("first", "item") and ch == "{":
+                self._state, self._depth, self._buf = "object", 1, [ch]
+            elif state == "first" and ch == "]":
+                self._state = "done"
+            elif state == "sep" and ch in ",]":
+                self._state = "item" if ch == "," else "done"
+            elif state == "done":
+                raise FormatError("Unexpected data after the JSON list")
+            elif state == "sep":
+                raise FormatError(f"Expected ',' or ']' after item {len(self.items) - 1}")
+            else:
+                raise FormatError(f"Item {len(self.items)} is not an object")
+        return out
+
+    def _finish_item(self) -> Any:
+        import json
+        i = len(self.items)
+        try:
+            item = json.loads("".join(self._buf))
+        except ValueError as e:
+            raise FormatError(f"Invalid JSON in item {i}: {e}") from None
+        err = self.item_check(i, item) if self.item_check is not None else None
+        if err:
+            raise FormatError(err)
+        self.items.append(item)
+        self._state, self._buf = "sep", []
+        return item
+
+    def close(self) -> List[Any]:
+        if self._state != "done":
+            raise FormatError("Unterminated JSON list")
+        return self.items
+
+
+async def parse_stream(chunks: AsyncIterator[str], parser: IncrementalJSONArrayParser) -> AsyncIterator[Any]:
+    """Yield parsed items from a text stream; a structural error closes the stream (stops generation)."""
+    try:
+        async for chunk in chunks:
+            for item in parser.feed(chunk):
+                yield item
+        parser.close()
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
 class BaseFormatter:
     """Minimal formatter base compatible with AsyncLLM.call_with_format.
 
@@ -23,6 +138,10 @@ class BaseFormatter:
     def format_error_message(self) -> str:
         return "Response does not match expected format"
 
+    def stream_parser(self) -> Optional[IncrementalJSONArrayParser]:
+        """Incremental parser for streamed responses, or None if unsupported."""
+        return None
+
 
 class JSONListOfActionSpecsFormatter(BaseFormatter):
     """Validate that response is a JSON list of action specs.
@@ -50,18 +169,80 @@ class JSONListOfActionSpecsFormatter(BaseFormatter):
         except Exception as e:
             self._last_error = f"Invalid JSON: {e}"
             return False, None
+        return self._check_items(data)
+
+    def _check_items(self, data: Any):
         if not isinstance(data, list):
             self._last_error = "Top-level JSON is not a list"
             return False, None
         for i, item in enumerate(data):
-            if not isinstance(item, dict):
-                self._last_error = f"Item {i} is not an object"
+            err = self._item_error(i, item)
+            if err:
+                self._last_error = err
                 return False, None
-            for f in self.required_fields:
-                if f not in item:
-                    self._last_error = f"Item {i} missing field: {f}"
-                    return False, None
         return True, data
 
+    def _item_error(self, i: int, item: Any) -> Optional[str]:
+        if not isinstance(item, dict):
+            return f"Item {i} is not an object"
+        for f in self.required_fields:
+            if f not in item:
+                return f"Item {i} missing field: {f}"
+        return None
+
+    def stream_parser(self) -> IncrementalJSONArrayParser:
+        """Yields each action spec as soon as its object closes."""
+        return IncrementalJSONArrayParser(self._item_error)
+
     def format_error_message(self) -> str:
         return self._last_error or super().format_error_message()
+
+
+class JSONActionSpecsByGoalFormatter(JSONListOfActionSpecsFormatter):
+    """Validate a multi-goal response: a JSON object mapping goal key -> spec list.
+
+    Only the top level must parse. Each goal's list is checked on its own;
+    invalid or missing ones become ``None`` in the parsed result and their
+    reason is kept in ``errors[key]``, so one bad goal does not fail the batch.
+    """
+
+    def __init__(self, keys: tuple[str, ...], required_fields: tuple[str, ...] = ("name", "description", "parameters")):
+        super().__init__(required_fields)
+        self.keys = keys
+        self.errors: dict[str, str] = {}
+
+    def prepare_prompt(self, prompt: str) -> str:
+        guide = (
+            "You must output ONLY a valid JSON object with one key per goal id "
+            f"({', '.join(self.keys)}). Each value must be a JSON array of action specs; "
+            "each item must contain keys: name, description, parameters. "
+            "Do not include any extra commentary.\n"
+        )
+        return guide + prompt
+
+    def stream_parser(self) -> None:
+        return None  # top level is an object; parsed whole
+
+    def validate_response(self, response_text: str):
+        import json
+        try:
+            data = json.loads(response_text)
+        except Exception as e:
+            self._last_error = f"Invalid JSON: {e}"
+            return False, None
+        if not isinstance(data, dict):
+            self._last_error = "Top-level JSON is not an object"
+            return False, None
+        self.errors = {}
+        out: dict[str, Any] = {}
+        for key in self.keys:
+            if key not in data:
+                self.errors[key] = "missing goal id"
+                out[key] = None
+                continue
+            ok, items = self._check_items(data[key])
+            if not ok:
+                self.errors[key] = self._last_error
+            out[key] = items if ok else None
+        self._last_error = ""
+        return True, out
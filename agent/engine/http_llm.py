@@ -0,0 +1,97 @@
+"""AsyncLLM-compatible client for OpenAI-compatible chat endpoints.
+
+Used when the AutoEnv AsyncLLM is unavailable and the config names a
+``base_url``. Requests go over the dispatcher's shared per-endpoint
+connection pool; HTTP errors surface as HTTPStatusError so the
+dispatcher can retry 429/5xx.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .dispatcher import LLMDispatcher, get_dispatcher
+from .formatter import call_with_format_retries
+
+
+def _cfg(config: Any, key: str, default: Any = None) -> Any:
+    if isinstance(config, dict):
+        return config.get(key, default)
+    return getattr(config, key, default)
+
+
+class HTTPChatLLM:
+    def __init__(
+        self,
+        config: Any,
+        system_msg: Optional[str] = None,
+        max_completion_tokens: Optional[int] = None,
+        format_retries: int = 2,
+        dispatcher: Optional[LLMDispatcher] = None,
+    ) -> None:
+        self.config = config
+        self.system_msg = system_msg
+        self.max_completion_tokens = max_completion_tokens
+        self.format_retries = format_retries
+        self.model = _cfg(config, "model", "gpt-4o-mini")
+        base_url = str(_cfg(config, "base_url") or "https://api.openai.com/v1")
+        self._pool = (dispatcher or get_dispatcher()).http_client(base_url)
+        key = _cfg(config, "key")
+        self._headers = {"Authorization": f"Bearer {key}"} if key else {}
+        self._usage = {"prompt": 0, "completion": 0, "total": 0, "calls": 0}
+
+    def _payload(self, prompt: str, max_tokens: Optional[int]) -> Dict[str, Any]:
+        messages: List[Dict[str, str]] = []
+        if self.system_msg:
+            messages.append({"role": "system", "content": self.system_msg})
+        messages.append({"role": "user", "content": prompt})
+        payload: Dict[str, Any] = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": _cfg(self.config, "temperature", 1),
+            "top_p": _cfg(self.config, "top_p", 1),
+        }
+        limit = max_tokens or self.max_completion_tokens
+        if limit:
+            payload["max_tokens"] = limit
+        return payload
+
+    def _record_usage(self, usage: Dict[str, Any]) -> None:
+        self._usage["prompt"] += int(usage.get("prompt_tokens", 0) or 0)
+        self._usage["completion"] += int(usage.get("completion_tokens", 0) or 0)
+        self._usage["total"] = self._usage["prompt"] + self._usage["completion"]
+        self._usage["calls"] += 1
+
+    async def __call__(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        data = await self._pool.post_json("/chat/completions", self._payload(prompt, max_tokens), self._headers)
+        self._record_usage(data.get("usage") or {})
+        return data["choices"][0]["message"]["content"] or ""
+
+    async def stream(self, prompt: str, max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        """Yield content deltas from a server-sent-events completion."""
+        payload = {**self._payload(prompt, max_tokens), "stream": True, "stream_options": {"include_usage": True}}
+        usage: Dict[str, Any] = {}
+        buf = b""
+        async for chunk in self._pool.stream("POST", "/chat/completions", payload, self._headers):
+            buf += chunk
+            *lines, buf = buf.split(b"\n")
+            for line in lines:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    continue
+                event = json.loads(data)
+                usage = event.get("usage") or usage
+                for choice in event.get("choices") or []:
+                    piece = (choice.get("delta") or {}).get("content")
+                    if piece:
+                        yield piece
+        self._record_usage(usage)
+
+    async def call_with_format(self, prompt: str, formatter: Any):
+        return await call_with_format_retries(self, prompt, formatter, self.format_retries)
+
+    def get_usage_summary(self) -> dict:
+        return dict(self._usage)
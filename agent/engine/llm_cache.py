@@ -0,0 +1,351 @@
+"""Content-addressed, persistent cache of LLM responses.
+
+Entries are keyed by a sha256 over model, sampling params, system message,
+prompt and formatter, and appended as JSON lines to one of ``shards``
+files (``shard-XX.jsonl``) under ``root``. ``index.json`` maps each key to
+its (shard, offset, length) plus last access time; lines appended after
+the index was last saved are picked up by scanning shard tails on open.
+
+Sampled requests (temperature > 0, or unset) also carry a sample index:
+the n-th identical sampled request in a run maps to its own entry, so
+pass@k / self-consistency still get k answers, and a rerun in replay mode
+sees the same k answers in the same order.
+
+Modes:
+- ``read_through``: serve hits, call the LLM on a miss and store the result
+- ``write_only``: always call the LLM and (re)store the result
+- ``replay``: serve hits only; a miss raises CacheMiss (reproducible reruns)
+
+    llm = create_llm_instance(cfg, cache=LLMResponseCache("cache/llm"))
+
+Compaction (LRU rewrite down to 80% of ``max_bytes``) runs in a worker
+thread started after the write that crossed the limit (inline when no
+event loop is running); ``close()`` finishes a pending one.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .costs import estimate_tokens, merge_usage_into_cost
+
+MODES = ("read_through", "write_only", "replay")
+
+
+class CacheMiss(KeyError):
+    """Replay mode and no cached response for the request."""
+
+
+def config_fields(llm: Any) -> Dict[str, Any]:
+    """model / temperature / top_p of an AsyncLLM-like client, whatever its config type."""
+    cfg = getattr(llm, "config", None)
+    if isinstance(cfg, str):
+        return {"model": cfg}
+    get = cfg.get if isinstance(cfg, dict) else (lambda k, d=None: getattr(cfg, k, d))
+    return {k: get(k) for k in ("model", "temperature", "top_p")}
+
+
+def is_deterministic(llm: Any) -> bool:
+    """Whether the client samples greedily (temperature 0); unset means the provider default (sampling)."""
+    temperature = config_fields(llm).get("temperature")
+    try:
+        return temperature is not None and float(temperature) == 0.0
+    except (TypeError, ValueError):
+        return False
+
+
+def formatter_fingerprint(formatter: Any) -> Optional[str]:
+    """Formatter class plus its prompt guide (captures what the output must look like)."""
+    if formatter is None:
+        return None
+    guide = formatter.prepare_prompt("") if hasattr(formatter, "prepare_prompt") else ""
+    cls = formatter.__class__  # not type(): per-call wrappers report the wrapped class
+    return f"{cls.__module__}.{cls.__qualname__}:{guide}"
+
+
+def request_key(llm: Any, prompt: str, formatter: Any = None, max_tokens: Optional[int] = None) -> str:
+    payload = {
+        **config_fields(llm),
+        "max_tokens": max_tokens if max_tokens is not None else getattr(llm, "max_completion_tokens", None),
+        "system": getattr(llm, "system_msg", None),
+        "prompt": prompt,
+        "formatter": formatter_fingerprint(formatter),
+    }
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Sharded append-only store with an index and size-bounded LRU compaction."""
+
+    def __init__(
+        self,
+        root: str,
+        mode: str = "read_through",
+        shards: int = 16,
+        max_bytes: int = 512 * 1024 * 1024,
+        usd_rate: Dict[str, float] | None = None,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown cache mode: {mode!r}")
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.mode = mode
+        self.shards = shards
+        self.max_bytes = max_bytes
+        self.usd_rate = usd_rate
+        self._lock = threading.Lock()
+        # key -> [shard, offset, length, last_access]
+        self._index: Dict[str, List[Any]] = {}
+        self._scanned: Dict[str, int] = {}  # shard file -> bytes covered by the index
+        self._samples: Dict[str, int] = {}  # request key -> sampled requests seen this run
+        self._compaction: Optional[asyncio.Future] = None
+        self._compacting = False
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evicted": 0, "usd_saved": 0.0, "tokens_saved": 0}
+        self._load_index()
+        self._bytes = sum(self._scanned.values())
+
+    # ----------------------------
+    # Storage
+    # ----------------------------
+    def _shard_path(self, shard: int) -> Path:
+        return self.root / f"shard-{shard:02d}.jsonl"
+
+    def _load_index(self) -> None:
+        idx_path = self.root / "index.json"
+        try:
+            data = json.loads(idx_path.read_text(encoding="utf-8"))
+            self._index = data.get("entries", {})
+            self._scanned = data.get("scanned", {})
+        except (OSError, ValueError):
+            self._index, self._scanned = {}, {}
+        for shard in range(self.shards):
+            path = self._shard_path(shard)
+            if not path.exists():
+                continue
+            start = self._scanned.get(path.name, 0)
+            if start > path.stat().st_size:  # shard rewritten behind the index
+                start = 0
+                self._index = {k: v for k, v in self._index.items() if v[0] != shard}
+            with path.open("rb") as f:
+                f.seek(start)
+                offset = start
+                for line in f:
+                    if line.endswith(b"\n"):
+                        try:
+                            key = json.loads(line)["k"]
+                            self._index[key] = [shard, offset, len(line), time.time()]
+                        except (ValueError, KeyError):
+                            pass
+                    offset += len(line)
+            self._scanned[path.name] = offset
+
+    def save_index(self) -> None:
+        with self._lock:
+            self._write_index()
+
+    def _write_index(self) -> None:
+        tmp = self.root / "index.json.tmp"
+        tmp.write_text(json.dumps({"entries": self._index, "scanned": self._scanned}), encoding="utf-8")
+        os.replace(tmp, self.root / "index.json")
+
+    def sample_key(self, key: str) -> str:
+        """Key of the next sample of a sampled request (the first sample keeps ``key``)."""
+        with self._lock:
+            n = self._samples.get(key, 0)
+            self._samples[key] = n + 1
+        return key if n == 0 else hashlib.sha256(f"{key}#{n}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            loc = self._index.get(key)
+            if loc is None:
+                return None
+            shard, offset, length, _ = loc
+            try:
+                with self._shard_path(shard).open("rb") as f:
+                    f.seek(offset)
+                    entry = json.loads(f.read(length))
+            except (OSError, ValueError):
+                entry = None
+            if not isinstance(entry, dict) or entry.get("k") != key:  # stale index entry
+                del self._index[key]
+                return None
+            loc[3] = time.time()
+            return entry
+
+    def put(self, key: str, value: Any, prompt_tokens: int, completion_tokens: int) -> None:
+        entry = {"k": key, "v": value, "t": time.time(), "prompt": prompt_tokens, "completion": completion_tokens}
+        line = (json.dumps(entry, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        shard = int(key[:8], 16) % self.shards
+        with self._lock:
+            path = self._shard_path(shard)
+            with path.open("ab") as f:
+                offset = f.tell()
+                f.write(line)
+            self._index[key] = [shard, offset, len(line), time.time()]
+            self._scanned[path.name] = offset + len(line)
+            self._bytes += len(line)
+            self._stats["writes"] += 1
+            due = self._bytes > self.max_bytes and not self._compacting
+            if due:
+                self._compacting = True  # claimed here so later writes don't start another
+        if due:
+            self._schedule_compaction()
+
+    def _schedule_compaction(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._run_compaction()
+            return
+        self._compaction = fut = loop.run_in_executor(None, self._run_compaction)
+        fut.add_done_callback(self._compaction_done)
+
+    def _compaction_done(self, fut: asyncio.Future) -> None:
+        if self._compaction is fut:
+            self._compaction = None
+        if not fut.cancelled():
+            fut.exception()  # nobody awaits it; a failed compaction is retried on a later write
+
+    async def close(self) -> None:
+        """Wait for a running compaction and persist the index."""
+        if self._compaction is not None:
+            await asyncio.gather(self._compaction, return_exceptions=True)
+        await asyncio.get_running_loop().run_in_executor(None, self.save_index)
+
+    def compact(self) -> None:
+        """Rewrite shards keeping the most recently used entries (down to 80% of max_bytes).
+
+        The copy runs without the lock against a snapshot of the index, so
+        gets and puts continue meanwhile; only appending the lines written
+        since the snapshot and swapping the files happen under the lock.
+        """
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        self._run_compaction()
+
+    def _run_compaction(self) -> None:
+        try:
+            with self._lock:
+                snapshot = dict(self._index)
+                scanned = dict(self._scanned)
+            self._compact(snapshot, scanned)
+        finally:
+            self._compacting = False
+
+    def _compact(self, snapshot: Dict[str, List[Any]], scanned: Dict[str, int]) -> None:
+        live = sorted(snapshot.items(), key=lambda kv: kv[1][3], reverse=True)
+        keep: Dict[str, List[Any]] = {}
+        total = 0
+        evicted = 0
+        for key, loc in live:
+            if total + loc[2] > self.max_bytes * 0.8:
+                evicted += 1
+                continue
+            keep[key] = loc
+            total += loc[2]
+        by_shard: Dict[int, List[Tuple[str, List[Any]]]] = {}
+        for key, loc in keep.items():
+            by_shard.setdefault(loc[0], []).append((key, loc))
+        new_index: Dict[str, List[Any]] = {}
+        written: Dict[int, Tuple[Path, int]] = {}  # shard -> (tmp file, bytes)
+        for shard in range(self.shards):
+            path = self._shard_path(shard)
+            if not path.exists():
+                continue
+            tmp = path.with_suffix(".jsonl.tmp")
+            with path.open("rb") as src, tmp.open("wb") as dst:
+                for key, (_, offset, length, _atime) in sorted(by_shard.get(shard, []), key=lambda kv: kv[1][1]):
+                    src.seek(offset)
+                    new_index[key] = [shard, dst.tell(), length, 0.0]
+                    dst.write(src.read(length))
+                written[shard] = (tmp, dst.tell())
+        with self._lock:
+            for shard, (tmp, size) in written.items():
+                path = self._shard_path(shard)
+                start = scanned.get(path.name, 0)
+                with path.open("rb") as src, tmp.open("ab") as dst:
+                    src.seek(start)
+                    tail = src.read()  # lines appended while copying
+                    dst.write(tail)
+                for key, loc in self._index.items():
+                    if loc[0] == shard and loc[1] >= start:
+                        new_index[key] = [shard, size + loc[1] - start, loc[2], 0.0]
+                os.replace(tmp, path)
+                self._scanned[path.name] = size + len(tail)
+            for key, loc in self._index.items():
+                if loc[0] not in written:  # shard first created while copying
+                    new_index[key] = list(loc)
+            for key, loc in new_index.items():
+                current = self._index.get(key)
+                loc[3] = current[3] if current is not None else time.time()  # keep access times
+            self._index = new_index
+            self._bytes = sum(self._scanned.values())
+            self._stats["evicted"] += evicted
+            self._write_index()  # old offsets are invalid now
+
+    # ----------------------------
+    # Accounting
+    # ----------------------------
+    def record_hit(self, entry: Dict[str, Any]) -> None:
+        usage = {"prompt": entry.get("prompt", 0), "completion": entry.get("completion", 0)}
+        self._stats["hits"] += 1
+        self._stats["tokens_saved"] += usage["prompt"] + usage["completion"]
+        self._stats["usd_saved"] += merge_usage_into_cost(usage, usd_rate=self.usd_rate)["usd"]
+
+    def record_miss(self) -> None:
+        self._stats["misses"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "entries": len(self._index),
+            "hit_rate": (self._stats["hits"] / lookups) if lookups else 0.0,
+        }
+
+
+class CachedLLM:
+    """Wraps an AsyncLLM instance with an LLMResponseCache; other attributes pass through."""
+
+    def __init__(self, llm: Any, cache: LLMResponseCache) -> None:
+        self._llm = llm
+        self.cache = cache
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._llm, name)
+
+    async def _cached(self, key: str, prompt_text: str, call) -> Any:
+        cache = self.cache
+        if not is_deterministic(self._llm):
+            key = cache.sample_key(key)  # k identical sampled requests -> k entries
+        if cache.mode != "write_only":
+            entry = cache.get(key)
+            if entry is not None:
+                cache.record_hit(entry)
+                return entry["v"]
+            cache.record_miss()
+            if cache.mode == "replay":
+                raise CacheMiss(key)
+        out = await call()
+        completion = json.dumps(out, ensure_ascii=False, default=str) if not isinstance(out, str) else out
+        cache.put(key, out, estimate_tokens(prompt_text), estimate_tokens(completion))
+        return out
+
+    async def __call__(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        key = request_key(self._llm, prompt, None, max_tokens)
+        return await self._cached(key, prompt, lambda: self._llm(prompt, max_tokens=max_tokens))
+
+    async def call_with_format(self, prompt: str, formatter: Any):
+        key = request_key(self._llm, prompt, formatter)
+        full_prompt = formatter.prepare_prompt(prompt) if hasattr(formatter, "prepare_prompt") else prompt
+        return await self._cached(key, full_prompt, lambda: self._llm.call_with_format(prompt, formatter))
@@ -0,0 +1,433 @@
+"""Offline, deterministic mock LLM backend.
+
+MockLLM implements the AsyncLLM interface (``__call__``, ``call_with_format``,
+``get_usage_summary``) plus ``stream``, without any provider:
+
+- responses come from a script (consumed in order), then regex/callable
+  rules, then built-in responders that recognise the action-spec formatter
+  guides (JSONListOfActionSpecsFormatter / JSONActionSpecsByGoalFormatter)
+  and emit spec lists, a share of them invalid (``invalid_rate``)
+- latency follows a LatencyModel (fixed / uniform / lognormal, plus a
+  per-token cost that also paces streaming)
+- injected failures: 429 with Retry-After (``rate_limit_rate``) and 500s
+  (``error_rate``), raised as dispatcher.HTTPStatusError so the shared
+  dispatcher retries them like real provider errors
+
+Randomness is seeded per (seed, prompt, occurrence), so a run is
+reproducible regardless of how calls interleave.
+
+Select it with ``create_llm_instance({"model": "mock", "mock": {...}})``,
+where the ``mock`` dict holds MockLLM keyword arguments (``latency`` may be
+a dict of LatencyModel fields). MockLLMServer serves a MockLLM over an
+OpenAI-compatible HTTP API for offline end-to-end throughput tests:
+
+    python -m engine.mock_llm --port 8765 --latency 0.2 --rate-limit-rate 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+
+from .costs import estimate_tokens
+from .dispatcher import HTTPStatusError
+from .formatter import call_with_format_retries
+
+Responder = Callable[[str, random.Random], str]
+
+_SPEC_GUIDE = "JSON array of action specs"
+_BY_GOAL_RE = re.compile(r"one key per goal id \(([^)]*)\)")
+_WORD_RE = re.compile(r"[a-zA-Z]{3,}")
+
+
+@dataclass
+class LatencyModel:
+    kind: str = "fixed"  # fixed | uniform | lognormal
+    mean_s: float = 0.0
+    spread: float = 0.0  # uniform: half-width in seconds; lognormal: sigma
+    per_token_s: float = 0.0  # per completion token (paces streaming)
+
+    def sample(self, rng: random.Random, completion_tokens: int) -> float:
+        if self.kind == "uniform":
+            base = rng.uniform(self.mean_s - self.spread, self.mean_s + self.spread)
+        elif self.kind == "lognormal" and self.mean_s > 0:
+            # parameterised so the distribution's mean is mean_s
+            base = rng.lognormvariate(math.log(self.mean_s) - self.spread ** 2 / 2, self.spread)
+        else:
+            base = self.mean_s
+        return max(0.0, base) + self.per_token_s * completion_tokens
+
+
+@dataclass
+class MockRule:
+    match: Union[str, Callable[[str], bool]]  # regex searched in the prompt, or predicate
+    respond: Union[str, Responder]
+
+    def matches(self, prompt: str) -> bool:
+        return bool(re.search(self.match, prompt)) if isinstance(self.match, str) else bool(self.match(prompt))
+
+
+# ----------------------------
+# Built-in responders
+# ----------------------------
+def _spec_list(prompt: str, rng: random.Random, k: int) -> List[Dict[str, Any]]:
+    words = [w.lower() for w in _WORD_RE.findall(prompt.rsplit("\n", 1)[-1])] or ["task"]
+    specs = []
+    for i in range(k):
+        name = "_".join(rng.sample(words, min(2, len(words)))) + f"_{i}"
+        specs.append({
+            "name": name,
+            "description": f"Mock action {name}.",
+            "parameters": {"type": "object", "properties": {"query": {"type": "string"}}, "required": ["query"]},
+        })
+    return specs
+
+
+def _corrupt(specs: List[Dict[str, Any]], rng: random.Random) -> Any:
+    how = rng.randrange(3)
+    if how == 0:
+        return json.dumps(specs)[:-2]  # truncated JSON
+    if how == 1:
+        return json.dumps({"specs": specs})  # wrong top-level type
+    broken = [dict(s) for s in specs]
+    broken[0].pop("description", None)  # missing required field
+    return json.dumps(broken)
+
+
+def action_specs_responder(k: int = 1, invalid_rate: float = 0.0) -> Responder:
+    """Responder emitting a JSON list of ``k`` action specs (invalid with ``invalid_rate``)."""
+
+    def respond(prompt: str, rng: random.Random) -> str:
+        specs = _spec_list(prompt, rng, k)
+        return _corrupt(specs, rng) if rng.random() < invalid_rate else json.dumps(specs)
+
+    return respond
+
+
+def action_specs_by_goal_responder(k: int = 1, invalid_rate: float = 0.0) -> Responder:
+    """Responder for batched synthesis prompts: goal id -> spec list (bad goals per ``invalid_rate``)."""
+
+    def respond(prompt: str, rng: random.Random) -> str:
+        m = _BY_GOAL_RE.search(prompt)
+        keys = [x.strip() for x in m.group(1).split(",")] if m else []
+        out: Dict[str, Any] = {}
+        for key in keys:
+            specs = _spec_list(f"{key} {prompt[-200:]}", rng, k)
+            out[key] = {"bad": True} if rng.random() < invalid_rate else specs
+        return json.dumps(out)
+
+    return respond
+
+
+def echo_responder(prompt: str, rng: random.Random) -> str:
+    return "mock response: " + prompt.strip().rsplit("\n", 1)[-1][:200]
+
+
+# ----------------------------
+# Client
+# ----------------------------
+class MockLLM:
+    """AsyncLLM-compatible mock; see module docstring."""
+
+    def __init__(
+        self,
+        config: Any = None,
+        system_msg: Optional[str] = None,
+        max_completion_tokens: Optional[int] = None,
+        rules: Optional[List[MockRule]] = None,
+        script: Optional[List[str]] = None,
+        default: Optional[Responder] = None,
+        latency: Union[LatencyModel, Dict[str, Any], float, None] = None,
+        rate_limit_rate: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after_s: Optional[float] = 0.05,
+        invalid_rate: float = 0.0,
+        specs_per_goal: int = 1,
+        stream_chunk_tokens: int = 4,
+        format_retries: int = 2,
+        seed: int = 0,
+    ) -> None:
+        self.config = config if config is not None else {"model": "mock", "temperature": 0}
+        self.system_msg = system_msg
+        self.max_completion_tokens = max_completion_tokens
+        self.rules = list(rules or [])
+        self.script = list(script or [])
+        self.default = default or echo_responder
+        if isinstance(latency, dict):
+            latency = LatencyModel(**latency)
+        elif isinstance(latency, (int, float)):
+            latency = LatencyModel(mean_s=float(latency))
+        self.latency = latency or LatencyModel()
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.retry_after_s = retry_after_s
+        self.stream_chunk_tokens = stream_chunk_tokens
+        self.format_retries = format_retries
+        self.seed = seed
+        self._spec_responder = action_specs_responder(specs_per_goal, invalid_rate)
+        self._by_goal_responder = action_specs_by_goal_responder(specs_per_goal, invalid_rate)
+        self._seen: Dict[str, int] = {}
+        self._usage = {"prompt": 0, "completion": 0, "total": 0, "calls": 0, "rate_limited": 0, "errors": 0}
+
+    def _rng(self, prompt: str) -> random.Random:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        n = self._seen.get(digest, 0)
+        self._seen[digest] = n + 1
+        return random.Random(f"{self.seed}:{digest}:{n}")
+
+    def _respond(self, prompt: str, rng: random.Random) -> str:
+        if self.script:
+            return self.script.pop(0)
+        for rule in self.rules:
+            if rule.matches(prompt):
+                return rule.respond if isinstance(rule.respond, str) else rule.respond(prompt, rng)
+        if _BY_GOAL_RE.search(prompt):
+            return self._by_goal_responder(prompt, rng)
+        if _SPEC_GUIDE in prompt:
+            return self._spec_responder(prompt, rng)
+        return self.default(prompt, rng)
+
+    def _maybe_fail(self, rng: random.Random) -> None:
+        if rng.random() < self.rate_limit_rate:
+            self._usage["rate_limited"] += 1
+            raise HTTPStatusError(429, b'{"error": "mock rate limit"}', self.retry_after_s)
+        if rng.random() < self.error_rate:
+            self._usage["errors"] += 1
+            raise HTTPStatusError(500, b'{"error": "mock server error"}')
+
+    def _prepare(self, prompt: str, max_tokens: Optional[int]) -> Tuple[random.Random, str, int]:
+        full = f"{self.system_msg}\n{prompt}" if self.system_msg else prompt
+        rng = self._rng(full)
+        self._maybe_fail(rng)
+        text = self._respond(prompt, rng)
+        limit = max_tokens or self.max_completion_tokens
+        if limit:
+            text = text[: limit * 4]
+        completion = estimate_tokens(text)
+        self._usage["prompt"] += estimate_tokens(full)
+        self._usage["completion"] += completion
+        self._usage["total"] = self._usage["prompt"] + self._usage["completion"]
+        self._usage["calls"] += 1
+        return rng, text, completion
+
+    async def __call__(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        rng, text, completion = self._prepare(prompt, max_tokens)
+        delay = self.latency.sample(rng, completion)
+        if delay:
+            await asyncio.sleep(delay)
+        return text
+
+    async def stream(self, prompt: str, max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        """Yield the response in chunks of ``stream_chunk_tokens`` tokens, paced by the latency model."""
+        rng, text, completion = self._prepare(prompt, max_tokens)
+        first = LatencyModel(self.latency.kind, self.latency.mean_s, self.latency.spread).sample(rng, 0)
+        if first:
+            await asyncio.sleep(first)  # time to first token
+        step = max(1, self.stream_chunk_tokens) * 4
+        for i in range(0, len(text), step):
+            if self.latency.per_token_s:
+                await asyncio.sleep(self.latency.per_token_s * self.stream_chunk_tokens)
+            yield text[i : i + step]
+
+    async def call_with_format(self, prompt: str, formatter: Any):
+        return await call_with_format_retries(self, prompt, formatter, self.format_retries)
+
+    def get_usage_summary(self) -> dict:
+        return dict(self._usage)
+
+
+def is_mock_config(llm_config: Any) -> bool:
+    if isinstance(llm_config, str):
+        return llm_config.startswith("mock")
+    if isinstance(llm_config, dict):
+        return "mock" in llm_config or str(llm_config.get("model", "")).startswith("mock")
+    return str(getattr(llm_config, "model", "")).startswith("mock")
+
+
+def create_mock_llm(llm_config: Any) -> MockLLM:
+    opts = dict(llm_config.get("mock") or {}) if isinstance(llm_config, dict) else {}
+    return MockLLM(config=llm_config, **opts)
+
+
+# ----------------------------
+# OpenAI-compatible HTTP server
+# ----------------------------
+class MockLLMServer:
+    """Serves a MockLLM as ``/v1/chat/completions`` (incl. SSE streaming) and ``/v1/models``."""
+
+    def __init__(self, llm: Optional[MockLLM] = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.llm = llm or MockLLM()
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.requests = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.base_url
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "MockLLMServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path = request_line.decode("latin-1").split()[:2]
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = line.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                length = int(headers.get("content-length", "0"))
+                body = await reader.readexactly(length) if length else b""
+                self.requests += 1
+                await self._route(method, path, body, writer)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, status: int, payload: Any, extra: Optional[Dict[str, str]] = None) -> None:
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}
+        data = json.dumps(payload).encode("utf-8")
+        head = {"Content-Type": "application/json", "Content-Length": str(len(data)), **(extra or {})}
+        writer.write(
+            f"HTTP/1.1 {status} {reason.get(status, 'Error')}\r\n".encode("latin-1")
+            + "".join(f"{k}: {v}\r\n" for k, v in head.items()).encode("latin-1")
+            + b"\r\n"
+            + data
+        )
+        await writer.drain()
+
+    async def _route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        path = path.split("?", 1)[0].rstrip("/")
+        if method == "GET" and path.endswith("/models"):
+            model = str((self.llm.config or {}).get("model", "mock")) if isinstance(self.llm.config, dict) else "mock"
+            await self._send(writer, 200, {"object": "list", "data": [{"id": model, "object": "model", "owned_by": "mock"}]})
+            return
+        if method != "POST" or not path.endswith("/chat/completions"):
+            await self._send(writer, 404, {"error": {"message": f"no route {method} {path}"}})
+            return
+        try:
+            req = json.loads(body)
+            messages = req["messages"]
+        except (ValueError, KeyError, TypeError):
+            await self._send(writer, 400, {"error": {"message": "invalid request body"}})
+            return
+        prompt = "\n".join(str(m.get("content", "")) for m in messages if m.get("role") != "system")
+        model = req.get("model", "mock")
+        max_tokens = req.get("max_tokens")
+        cid = f"chatcmpl-mock-{self.requests}"
+        try:
+            if req.get("stream"):
+                await self._stream(writer, cid, model, prompt, max_tokens)
+                return
+            text = await self.llm(prompt, max_tokens=max_tokens)
+        except HTTPStatusError as e:
+            extra = {"Retry-After": str(e.retry_after)} if e.retry_after is not None else None
+            await self._send(writer, e.status_code, {"error": {"message": e.body.decode("utf-8", "replace")}}, extra)
+            return
+        usage = {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(text)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        await self._send(writer, 200, {
+            "id": cid,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    async def _stream(self, writer: asyncio.StreamWriter, cid: str, model: str, prompt: str, max_tokens: Optional[int]) -> None:
+        chunks = self.llm.stream(prompt, max_tokens=max_tokens)
+        try:
+            first: Optional[str] = await chunks.__anext__()  # failures surface before the 200 is sent
+        except StopAsyncIteration:
+            first = None
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\nTransfer-Encoding: chunked\r\n\r\n"
+        )
+
+        async def event(data: str) -> None:
+            payload = f"data: {data}\n\n".encode("utf-8")
+            writer.write(f"{len(payload):x}\r\n".encode("latin-1") + payload + b"\r\n")
+            await writer.drain()
+
+        async def delta(content: Optional[str], finish: Optional[str] = None) -> None:
+            choice = {"index": 0, "delta": {"content": content} if content is not None else {}, "finish_reason": finish}
+            await event(json.dumps({"id": cid, "object": "chat.completion.chunk", "model": model, "choices": [choice]}))
+
+        if first is not None:
+            await delta(first)
+        async for piece in chunks:
+            await delta(piece)
+        await delta(None, "stop")
+        await event("[DONE]")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Serve an offline OpenAI-compatible mock LLM.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="mean latency in seconds")
+    ap.add_argument("--latency-kind", default="fixed", choices=["fixed", "uniform", "lognormal"])
+    ap.add_argument("--latency-spread", type=float, default=0.0)
+    ap.add_argument("--per-token", type=float, default=0.0, help="seconds per completion token")
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--invalid-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    llm = MockLLM(
+        latency=LatencyModel(args.latency_kind, args.latency, args.latency_spread, args.per_token),
+        rate_limit_rate=args.rate_limit_rate,
+        error_rate=args.error_rate,
+        invalid_rate=args.invalid_rate,
+        seed=args.seed,
+    )
+    server = MockLLMServer(llm, args.host, args.port)
+    print(f"[INFO] mock LLM serving on http://{args.host}:{args.port}/v1")
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Cost-aware cascade routing over several models.
+
+A CascadeRouter holds model tiers ordered cheap -> strong and one
+RoutePolicy per call site (creator synthesis, agent step, judge, ...).
+A call tries the policy's first tier and escalates to the next when
+
+- formatter validation fails (FormatError from ``call_with_format``) or the
+  call errors (a replay-mode CacheMiss also moves on, without counting
+  against the tier; DeadlineExceeded and BudgetExceeded end the cascade,
+  since a stronger tier cannot run without time or budget), or
+- the policy's ``confidence`` scorer rates the output below ``min_confidence``.
+
+Per (site, tier) stats record attempts, acceptances, tokens, USD (through
+``merge_usage_into_cost`` with the tier's ``usd_rate``) and latency. They
+feed back into routing: a tier whose acceptance rate at a site stays below
+``skip_below`` after ``min_samples`` attempts is skipped there, except for
+one probe every ``probe_every`` calls so it can recover. ``stats()``
+compares the actual spend (failed attempts included) with what the
+strongest tier alone would have cost for the accepted outputs.
+
+    router = CascadeRouter(
+        [ModelTier("small", {"model": "gpt-4o-mini"}, {"prompt_per_1k": 0.15, "completion_per_1k": 0.6}),
+         ModelTier("large", {"model": "gpt-4o"}, {"prompt_per_1k": 2.5, "completion_per_1k": 10.0})],
+        policies={SITE_JUDGE: RoutePolicy(tiers=["large"])},
+    )
+    llm = router.client(SITE_SYNTHESIS)  # AsyncLLM-like
+"""
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from runtime.deadline import BudgetExceeded, DeadlineExceeded
+from .async_llm import create_llm_instance
+from .costs import estimate_tokens, merge_usage_into_cost
+from .formatter import FormatError
+from .llm_cache import CacheMiss
+
+SITE_SYNTHESIS = "creator.synthesis"
+SITE_AGENT_STEP = "agent.step"
+SITE_JUDGE = "judge"
+
+
+@dataclass
+class ModelTier:
+    name: str
+    llm_config: Any
+    usd_rate: Optional[Dict[str, float]] = None  # prompt_per_1k / completion_per_1k
+
+
+@dataclass
+class RoutePolicy:
+    tiers: Optional[List[str]] = None  # tier names to try in order (None: all, cheap -> strong)
+    min_confidence: float = 0.0
+    confidence: Optional[Callable[[Any], float]] = None  # output -> [0, 1]
+    skip_below: float = 0.2  # acceptance rate under which a tier is skipped at this site
+    min_samples: int = 20
+    probe_every: int = 10
+
+
+@dataclass
+class _RouteStats:
+    attempts: int = 0
+    accepted: int = 0
+    escalated: int = 0
+    errors: int = 0
+    skipped: int = 0
+    cache_misses: int = 0  # replay-mode misses (not attempts)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    usd: float = 0.0
+    latency_s: float = 0.0
+
+    def acceptance(self) -> float:
+        return self.accepted / self.attempts if self.attempts else 1.0
+
+
+class RoutedLLM:
+    """AsyncLLM-like client bound to one call site of a CascadeRouter."""
+
+    def __init__(self, router: "CascadeRouter", site: str) -> None:
+        self.router = router
+        self.site = site
+
+    async def __call__(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        return await self.router.call(self.site, prompt, max_tokens=max_tokens)
+
+    async def call_with_format(self, prompt: str, formatter: Any):
+        return await self.router.call_with_format(self.site, prompt, formatter)
+
+    def get_usage_summary(self) -> dict:
+        return self.router.usage(self.site)
+
+
+class CascadeRouter:
+    def __init__(
+        self,
+        tiers: Sequence[ModelTier],
+        policies: Optional[Dict[str, RoutePolicy]] = None,
+        default_policy: Optional[RoutePolicy] = None,
+        llm_factory: Callable[[Any], Any] = create_llm_instance,
+    ) -> None:
+        if not tiers:
+            raise ValueError("CascadeRouter needs at least one model tier")
+        self.tiers = {t.name: t for t in tiers}
+        self.order = [t.name for t in tiers]
+        self.policies = dict(policies or {})
+        self.default_policy = default_policy or RoutePolicy()
+        self._factory = llm_factory
+        self._clients: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict[str, _RouteStats]] = {}
+        self._calls: Dict[str, int] = {}
+        self._baseline: Dict[str, float] = {}  # site -> USD had the strongest tier answered alone
+
+    @classmethod
+    def from_llms_config(
+        cls,
+        llms_config: Any,
+        names: Sequence[str],
+        usd_rates: Optional[Dict[str, Dict[str, float]]] = None,
+        **kwargs: Any,
+    ) -> "CascadeRouter":
+        """Tiers from an LLMsConfig (``llms_config.get(name)``), cheap -> strong."""
+        usd_rates = usd_rates or {}
+        return cls([ModelTier(n, llms_config.get(n), usd_rates.get(n)) for n in names], **kwargs)
+
+    def client(self, site: str) -> RoutedLLM:
+        return RoutedLLM(self, site)
+
+    def _llm(self, tier: str) -> Any:
+        llm = self._clients.get(tier)
+        if llm is None:
+            llm = self._clients[tier] = self._factory(self.tiers[tier].llm_config)
+        return llm
+
+    def _policy(self, site: str) -> RoutePolicy:
+        return self.policies.get(site, self.default_policy)
+
+    def _stat(self, site: str, tier: str) -> _RouteStats:
+        return self._stats.setdefault(site, {}).setdefault(tier, _RouteStats())
+
+    def route(self, site: str) -> List[str]:
+        """Tiers to try for the next call at ``site``, after skipping poor performers."""
+        policy = self._policy(site)
+        tiers = [t for t in (policy.tiers or self.order) if t in self.tiers]
+        n = self._calls.get(site, 0)
+        probe = policy.probe_every > 0 and n % policy.probe_every == 0
+        out = []
+        for i, tier in enumerate(tiers):
+            st = self._stat(site, tier)
+            last = i == len(tiers) - 1
+            if not last and not probe and st.attempts >= policy.min_samples and st.acceptance() < policy.skip_below:
+                st.skipped += 1
+                continue
+            out.append(tier)
+        return out
+
+    # ----------------------------
+    # Calls
+    # ----------------------------
+    async def call(self, site: str, prompt: str, max_tokens: Optional[int] = None) -> str:
+        return await self._cascade(
+            site,
+            prompt,
+            lambda llm: llm(prompt, max_tokens=max_tokens),
+        )
+
+    async def call_with_format(self, site: str, prompt: str, formatter: Any) -> Any:
+        full_prompt = formatter.prepare_prompt(prompt) if hasattr(formatter, "prepare_prompt") else prompt
+        return await self._cascade(site, full_prompt, lambda llm: llm.call_with_format(prompt, formatter))
+
+    async def _cascade(self, site: str, prompt_text: str, call: Callable[[Any], Awaitable[Any]]) -> Any:
+        policy = self._policy(site)
+        tiers = self.route(site)
+        self._calls[site] = self._calls.get(site, 0) + 1
+        last_error: Optional[BaseException] = None
+        for i, tier in enumerate(tiers):
+            st = self._stat(site, tier)
+            t0 = time.perf_counter()
+            try:
+                out = await call(self._llm(tier))
+            except (DeadlineExceeded, BudgetExceeded):
+                raise
+            except CacheMiss as e:
+                st.cache_misses += 1
+                last_error = e
+                continue
+            except Exception as e:
+                st.attempts += 1
+                st.errors += 1
+                self._charge(st, tier, prompt_text, None, time.perf_counter() - t0)
+                last_error = e
+                if i < len(tiers) - 1:
+                    st.escalated += 1
+                continue
+            st.attempts += 1
+            usage = self._charge(st, tier, prompt_text, out, time.perf_counter() - t0)
+            last = i == len(tiers) - 1
+            if not last and policy.confidence is not None and policy.confidence(out) < policy.min_confidence:
+                st.escalated += 1
+                continue
+            st.accepted += 1
+            strongest = self.tiers[self.order[-1]].usd_rate
+            self._baseline[site] = self._baseline.get(site, 0.0) + merge_usage_into_cost(usage, usd_rate=strongest)["usd"]
+            return out
+        if last_error is not None:
+            raise last_error
+        raise FormatError(f"No model accepted the request at {site}")
+
+    def _charge(self, st: _RouteStats, tier: str, prompt_text: str, out: Any, latency_s: float) -> Dict[str, int]:
+        completion = "" if out is None else out if isinstance(out, str) else json.dumps(out, ensure_ascii=False, default=str)
+        usage = {"prompt": estimate_tokens(prompt_text), "completion": estimate_tokens(completion)}
+        cost = merge_usage_into_cost(usage, latency_s=latency_s, usd_rate=self.tiers[tier].usd_rate)
+        st.prompt_tokens += usage["prompt"]
+        st.completion_tokens += usage["completion"]
+        st.usd += cost["usd"]
+        st.latency_s += cost["latency_s"]
+        return usage
+
+    # ----------------------------
+    # Reporting
+    # ----------------------------
+    def usage(self, site: Optional[str] = None) -> Dict[str, Any]:
+        sites = [site] if site is not None else list(self._stats)
+        prompt = sum(st.prompt_tokens for s in sites for st in self._stats.get(s, {}).values())
+        completion = sum(st.completion_tokens for s in sites for st in self._stats.get(s, {}).values())
+        return {"prompt": prompt, "completion": completion, "total": prompt + completion}
+
+    def stats(self) -> Dict[str, Any]:
+        """Per site and tier: attempts, acceptance, escalations, tokens, cost; plus savings."""
+        out: Dict[str, Any] = {}
+        usd = 0.0
+        for site, tiers in self._stats.items():
+            rows = {}
+            for tier, st in tiers.items():
+                rows[tier] = {
+                    "attempts": st.attempts,
+                    "accepted": st.accepted,
+                    "acceptance": st.acceptance(),
+                    "escalated": st.escalated,
+                    "errors": st.errors,
+                    "skipped": st.skipped,
+                    "cache_misses": st.cache_misses,
+                    "cost": merge_usage_into_cost(
+                        {"prompt": st.prompt_tokens, "completion": st.completion_tokens},
+                        latency_s=st.latency_s,
+                        usd_rate=self.tiers[tier].usd_rate,
+                    ),
+                }
+                usd += st.usd
+            out[site] = {"calls": self._calls.get(site, 0), "tiers": rows}
+        baseline = sum(self._baseline.values())
+        out["_total"] = {
+            "usd": usd,
+            "usd_if_strongest": baseline,
+            "usd_saved": baseline - usd,
+        }
+        return out
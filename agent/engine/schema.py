@@ -0,0 +1,257 @@
+"""Compiled JSON-Schema validators for action parameters.
+
+A schema is compiled once into nested closures (no per-call keyword
+dispatch) and cached per ``(action id, version)``. Supported keywords:
+type, enum, const, properties, required, additionalProperties, items,
+min/maxItems, min/maxLength, pattern, minimum/maximum,
+exclusiveMinimum/exclusiveMaximum, allOf/anyOf/oneOf. Other keywords
+are ignored.
+"""
+from __future__ import annotations
+
+import operator
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ParamError = Dict[str, str]  # {"path": "$.x", "keyword": "type", "message": "..."}
+_Check = Callable[[Any, str, List[ParamError]], None]
+
+_PY_TYPES: Dict[str, Tuple[type, ...]] = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "object": (dict,),
+    "array": (list, tuple),
+    "null": (type(None),),
+}
+
+
+class ParamValidationError(ValueError):
+    """Params do not match the action's inputs schema.
+
+    ``errors`` is a list of ``{"path", "keyword", "message"}`` dicts meant to
+    be fed straight back to the agent/LLM.
+    """
+
+    def __init__(self, action_id: str, errors: List[ParamError]) -> None:
+        self.action_id = action_id
+        self.errors = errors
+        super().__init__(self.feedback())
+
+    def feedback(self) -> str:
+        lines = [f"Invalid parameters for action {self.action_id!r}:"]
+        lines.extend(f"- {e['path']}: {e['message']}" for e in self.errors)
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"error": "invalid_params", "action_id": self.action_id, "errors": self.errors}
+
+
+def _err(errors: List[ParamError], path: str, keyword: str, message: str) -> None:
+    errors.append({"path": path, "keyword": keyword, "message": message})
+
+
+def _compile(schema: Any) -> Optional[_Check]:
+    """Compile one schema node; None means "accepts anything"."""
+    if not isinstance(schema, dict) or not schema:
+        return None
+    checks: List[_Check] = []
+
+    types = schema.get("type")
+    if types is not None:
+        names = [types] if isinstance(types, str) else list(types)
+        py_types = tuple(t for n in names for t in _PY_TYPES.get(n, ()))
+        if py_types:
+            expected = " or ".join(names)
+            # bool is an int subclass but not a JSON integer/number
+            reject_bool = "boolean" not in names
+
+            def check_type(v: Any, path: str, errors: List[ParamError]) -> None:
+                if not isinstance(v, py_types) or (reject_bool and v.__class__ is bool):
+                    _err(errors, path, "type", f"expected {expected}, got {type(v).__name__}")
+
+            checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+
+        def check_enum(v: Any, path: str, errors: List[ParamError]) -> None:
+            if v not in allowed:
+                _err(errors, path, "enum", f"must be one of {allowed!r}")
+
+        checks.append(check_enum)
+
+    if "const" in schema:
+        const = schema["const"]
+
+        def check_const(v: Any, path: str, errors: List[ParamError]) -> None:
+            if v != const:
+                _err(errors, path, "const", f"must equal {const!r}")
+
+        checks.append(check_const)
+
+    props = {k: _compile(s) for k, s in (schema.get("properties") or {}).items()}
+    required = list(schema.get("required") or [])
+    additional = schema.get("additionalProperties", True)
+    extra_check = _compile(additional) if isinstance(additional, dict) else None
+    if props or required or additional is not True:
+        prop_checks = [(k, "." + k, c) for k, c in props.items() if c is not None]
+
+        def check_object(v: Any, path: str, errors: List[ParamError]) -> None:
+            if not isinstance(v, dict):
+                return
+            for k in required:
+                if k not in v:
+                    _err(errors, f"{path}.{k}", "required", "missing required parameter")
+            for k, suffix, c in prop_checks:
+                if k in v:
+                    c(v[k], path + suffix, errors)
+            if additional is True:
+                return
+            for k in v:
+                if k in props:
+                    continue
+                if additional is False:
+                    _err(errors, f"{path}.{k}", "additionalProperties", "unexpected parameter")
+                elif extra_check is not None:
+                    extra_check(v[k], f"{path}.{k}", errors)
+
+        checks.append(check_object)
+
+    item_check = _compile(schema.get("items"))
+    min_items, max_items = schema.get("minItems"), schema.get("maxItems")
+    if item_check is not None or min_items is not None or max_items is not None:
+
+        def check_array(v: Any, path: str, errors: List[ParamError]) -> None:
+            if not isinstance(v, (list, tuple)):
+                return
+            if min_items is not None and len(v) < min_items:
+                _err(errors, path, "minItems", f"expected at least {min_items} items")
+            if max_items is not None and len(v) > max_items:
+                _err(errors, path, "maxItems", f"expected at most {max_items} items")
+            if item_check is not None:
+                for i, item in enumerate(v):
+                    item_check(item, f"{path}[{i}]", errors)
+
+        checks.append(check_array)
+
+    min_len, max_len = schema.get("minLength"), schema.get("maxLength")
+    pattern = re.compile(schema["pattern"]) if isinstance(schema.get("pattern"), str) else None
+    if min_len is not None or max_len is not None or pattern is not None:
+
+        def check_string(v: Any, path: str, errors: List[ParamError]) -> None:
+            if not isinstance(v, str):
+                return
+            if min_len is not None and len(v) < min_len:
+                _err(errors, path, "minLength", f"shorter than {min_len} characters")
+            if max_len is not None and len(v) > max_len:
+                _err(errors, path, "maxLength", f"longer than {max_len} characters")
+            if pattern is not None and not pattern.search(v):
+                _err(errors, path, "pattern", f"does not match {pattern.pattern!r}")
+
+        checks.append(check_string)
+
+    bounds: List[Tuple[str, Any, Callable[[Any, Any], bool], str]] = [
+        (kw, schema[kw], op, msg)
+        for kw, op, msg in (
+            ("minimum", operator.ge, "must be >="),
+            ("maximum", operator.le, "must be <="),
+            ("exclusiveMinimum", operator.gt, "must be >"),
+            ("exclusiveMaximum", operator.lt, "must be <"),
+        )
+        if isinstance(schema.get(kw), (int, float))
+    ]
+    if bounds:
+
+        def check_number(v: Any, path: str, errors: List[ParamError]) -> None:
+            if isinstance(v, bool) or not isinstance(v, (int, float)):
+                return
+            for kw, bound, op, msg in bounds:
+                if not op(v, bound):
+                    _err(errors, path, kw, f"{msg} {bound}")
+
+        checks.append(check_number)
+
+    for kw in ("allOf", "anyOf", "oneOf"):
+        subs = [c for c in (_compile(s) for s in schema.get(kw) or []) if c is not None]
+        if not subs:
+            continue
+
+        def check_combinator(v: Any, path: str, errors: List[ParamError], kw=kw, subs=subs) -> None:
+            results = []
+            for c in subs:
+                sub_errors: List[ParamError] = []
+                c(v, path, sub_errors)
+                results.append(sub_errors)
+            passed = sum(1 for r in results if not r)
+            if kw == "allOf":
+                for r in results:
+                    errors.extend(r)
+            elif kw == "anyOf" and passed == 0:
+                _err(errors, path, kw, "does not match any allowed schema")
+            elif kw == "oneOf" and passed != 1:
+                _err(errors, path, kw, f"must match exactly one schema (matched {passed})")
+
+        checks.append(check_combinator)
+
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(v: Any, path: str, errors: List[ParamError]) -> None:
+        for c in checks:
+            c(v, path, errors)
+
+    return check_all
+
+
+def compile_schema(schema: Any) -> Callable[[Dict[str, Any]], List[ParamError]]:
+    """Compile an inputs schema into ``validate(params) -> errors``.
+
+    Params are always a kwargs dict, so a top-level schema that does not
+    describe an object (e.g. a synthesized ``{"type": "array"}``) is not
+    enforced.
+    """
+    top_type = schema.get("type") if isinstance(schema, dict) else None
+    if top_type not in (None, "object"):
+        check = None
+    else:
+        check = _compile(schema)
+    if check is None:
+        return lambda params: []
+
+    def validate(params: Dict[str, Any]) -> List[ParamError]:
+        errors: List[ParamError] = []
+        check(params, "$", errors)
+        return errors
+
+    return validate
+
+
+class ValidatorCache:
+    """Compiled validators keyed by ``(action id, version)``.
+
+    An entry is recompiled if the schema changed (checked by identity, then
+    by equality), so a key reused for a different schema is never served a
+    stale validator.
+    """
+
+    def __init__(self) -> None:
+        self._cache: Dict[Tuple[str, Optional[str]], Tuple[Any, Callable[[Dict[str, Any]], List[ParamError]]]] = {}
+
+    def validator(self, action_id: str, version: Optional[str], schema: Any) -> Callable[[Dict[str, Any]], List[ParamError]]:
+        key = (action_id, version)
+        hit = self._cache.get(key)
+        if hit is not None and (hit[0] is schema or hit[0] == schema):
+            return hit[1]
+        fn = compile_schema(schema)
+        self._cache[key] = (schema, fn)
+        return fn
+
+    def check(self, action_id: str, version: Optional[str], schema: Any, params: Dict[str, Any]) -> None:
+        """Raise ParamValidationError if ``params`` do not match ``schema``."""
+        errors = self.validator(action_id, version, schema)(params)
+        if errors:
+            raise ParamValidationError(action_id, errors)
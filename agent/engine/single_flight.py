@@ -0,0 +1,162 @@
+"""Single-flight coalescing of identical in-flight LLM requests.
+
+Concurrent callers issuing the same request (same llm_cache.request_key
+and endpoint) share one upstream call, wherever they come from: the
+flight map is process-wide (per event loop), so separate clients, e.g.
+one per AgentCreator, coalesce too. Each caller gets its own deep copy of
+the result, or the same exception. For ``call_with_format`` every
+follower's own formatter validates the response text the leader's
+formatter accepted, so formatter state (e.g. ``errors``) is set on each.
+Only deterministic requests (temperature 0) are coalesced unless
+``coalesce_sampling`` is set, since identical sampled requests are meant
+to produce independent answers (e.g. pass@k at temperature > 0).
+
+The upstream call runs in its own task: a caller that is cancelled (e.g.
+by its deadline) leaves the call running for the others, and it is only
+cancelled once every waiter has gone.
+"""
+from __future__ import annotations
+
+import asyncio
+import copy
+import json
+import weakref
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .llm_cache import is_deterministic, request_key
+
+
+class _RecordingFormatter:
+    """Per-call stand-in for the leader's formatter that records validated texts.
+
+    Everything else (attribute reads and writes, ``isinstance``, the cache
+    fingerprint) goes to the wrapped formatter, which is never modified, so
+    concurrent flights can share one formatter instance.
+    """
+
+    __slots__ = ("_formatter", "_texts")
+
+    def __init__(self, formatter: Any, texts: List[str]) -> None:
+        object.__setattr__(self, "_formatter", formatter)
+        object.__setattr__(self, "_texts", texts)
+
+    @property  # type: ignore[misc]
+    def __class__(self) -> type:
+        return self._formatter.__class__
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._formatter, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._formatter, name, value)
+
+    def validate_response(self, text: str) -> Any:
+        self._texts.append(text)
+        return self._formatter.validate_response(text)
+
+
+class _Flight:
+    __slots__ = ("task", "waiters", "texts")
+
+    def __init__(self) -> None:
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        self.texts: List[str] = []  # response texts the leader's formatter validated
+
+
+# event loop -> flight key -> in-flight request, shared by every SingleFlightLLM
+_flights: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, _Flight]]" = weakref.WeakKeyDictionary()
+
+
+def _loop_flights() -> Dict[str, _Flight]:
+    loop = asyncio.get_running_loop()
+    flights = _flights.get(loop)
+    if flights is None:
+        flights = _flights[loop] = {}
+    return flights
+
+
+def _endpoint(llm: Any) -> str:
+    cfg = getattr(llm, "config", None)
+    base_url = cfg.get("base_url") if isinstance(cfg, dict) else getattr(cfg, "base_url", None)
+    return str(base_url or "")
+
+
+class SingleFlightLLM:
+    """Wraps an AsyncLLM instance; other attributes pass through."""
+
+    def __init__(self, llm: Any, coalesce_sampling: bool = False) -> None:
+        self._llm = llm
+        self.coalesce_sampling = coalesce_sampling
+        self._stats = {"calls": 0, "upstream": 0, "collapsed": 0, "bypassed": 0}
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._llm, name)
+
+    def _deterministic(self) -> bool:
+        return is_deterministic(self._llm)
+
+    async def _flight(self, key: str, call: Callable[[_Flight], Awaitable[Any]]) -> tuple[Any, Optional[_Flight]]:
+        """(result, flight) where flight is None for the caller whose call ran upstream."""
+        self._stats["calls"] += 1
+        if not (self.coalesce_sampling or self._deterministic()):
+            self._stats["bypassed"] += 1
+            return await call(_Flight()), None
+        flights = _loop_flights()
+        key = f"{_endpoint(self._llm)}|{key}"
+        flight = flights.get(key)
+        leader = flight is None
+        if leader:
+            self._stats["upstream"] += 1
+            flight = flights[key] = _Flight()
+            flight.task = asyncio.ensure_future(call(flight))
+            flight.task.add_done_callback(lambda _t, k=key, f=flight, m=flights: self._finish(m, k, f))
+        else:
+            self._stats["collapsed"] += 1
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if not flight.task.done():
+                flight.waiters -= 1
+                if flight.waiters == 0:
+                    flight.task.cancel()
+            raise
+        return copy.deepcopy(result), None if leader else flight
+
+    @staticmethod
+    def _finish(flights: Dict[str, _Flight], key: str, flight: _Flight) -> None:
+        if flights.get(key) is flight:
+            del flights[key]
+        if not flight.task.cancelled():
+            flight.task.exception()  # mark retrieved when every waiter left early
+
+    async def __call__(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        key = request_key(self._llm, prompt, None, max_tokens)
+        result, _ = await self._flight(key, lambda _f: self._llm(prompt, max_tokens=max_tokens))
+        return result
+
+    async def call_with_format(self, prompt: str, formatter: Any):
+        key = request_key(self._llm, prompt, formatter)
+
+        async def call(flight: _Flight) -> Any:
+            # note what the leader's formatter accepts so followers can re-validate it
+            if not hasattr(formatter, "validate_response"):
+                return await self._llm.call_with_format(prompt, formatter)
+            return await self._llm.call_with_format(prompt, _RecordingFormatter(formatter, flight.texts))
+
+        result, flight = await self._flight(key, call)
+        if flight is None or not hasattr(formatter, "validate_response"):
+            return result
+        # follower: run the shared response through this caller's formatter (a cache
+        # hit upstream has no response text; its parsed result stands in)
+        text = flight.texts[-1] if flight.texts else json.dumps(result, ensure_ascii=False, default=str)
+        ok, data = formatter.validate_response(text)
+        return data if ok else result
+
+    def single_flight_stats(self) -> Dict[str, Any]:
+        try:
+            in_flight = len(_loop_flights())
+        except RuntimeError:
+            in_flight = 0
+        return {**self._stats, "in_flight": in_flight}
@@ -1,15 +1,607 @@
+"""Bounded, tiered cache keyed by ``(namespace, key)``.
+
+Each namespace has its own byte budget (``limits[ns]`` or ``max_bytes``;
+entry sizes are estimated with ``approx_size``) and evicts with LRU or
+W-TinyLFU (a small LRU admission window in front of a segmented LRU main
+area, where a count-min frequency sketch decides whether a newcomer may
+displace the main area's victims; this keeps one-off keys from flushing
+hot ones). Entries can carry a TTL. ``get_or_compute`` coalesces
+concurrent misses for the same key into one computation.
+
+With ``disk_dir`` every put is also written to a pickle file per entry
+(bounded by ``disk_max_bytes`` per namespace, oldest files removed first),
+and memory misses fall back to disk, so cached values survive restarts.
+Writes, deletes and trimming run on a background writer thread (``flush()``
+waits for them); ``aget``/``get_or_compute`` read disk from a worker
+thread. Unpicklable values stay memory-only.
+
+``stats()`` reports hits/misses/evictions/expirations/bytes per namespace;
+they are exported as gauges into telemetry (``metrics``, default the
+process-wide ``get_metrics()``) on every ``Metrics.flush()``.
+
+SimpleCache keeps the original ``get``/``put`` interface (and its
+put-then-get guarantee) on top of it; core.memo.ResultMemo stores action
+results in it.
+"""
 from __future__ import annotations
 
-from typing import Any, Dict, Tuple
+import asyncio
+import hashlib
+import os
+import pickle
+import queue
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from .telemetry import Metrics, get_metrics
+
+POLICIES = ("lru", "tinylfu")
+_MISSING = object()
+
+
+def approx_size(obj: Any, _depth: int = 0) -> int:
+    """Rough deep size in bytes (containers followed a few levels down)."""
+    size = sys.getsizeof(obj, 64)
+    if _depth >= 4 or isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))):
+        return size
+    if isinstance(obj, dict):
+        return size + sum(approx_size(k, _depth + 1) + approx_size(v, _depth + 1) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(approx_size(v, _depth + 1) for v in obj)
+    attrs = getattr(obj, "__dict__", None)
+    if isinstance(attrs, dict):
+        return size + approx_size(attrs, _depth + 1)
+    return size
+
+
+class _Entry:
+    __slots__ = ("key", "value", "size", "expires_at")
+
+    def __init__(self, key: str, value: Any, size: int, expires_at: Optional[float]) -> None:
+        self.key = key
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+
+    def expired(self, now: float) -> bool:
+        return self.expires_at is not None and now >= self.expires_at
+
+
+# ----------------------------
+# Eviction policies
+# ----------------------------
+class _LRU:
+    def __init__(self, max_bytes: int, admit_all: bool = False) -> None:
+        self.max_bytes = max_bytes
+        # admit_all: an entry larger than max_bytes is kept (alone) instead of rejected
+        self.admit_all = admit_all
+        self.bytes = 0
+        self._d: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._d)
+
+    def lookup(self, key: str) -> Optional[_Entry]:
+        e = self._d.get(key)
+        if e is not None:
+            self._d.move_to_end(key)
+        return e
+
+    def discard(self, key: str) -> Optional[_Entry]:
+        e = self._d.pop(key, None)
+        if e is not None:
+            self.bytes -= e.size
+        return e
+
+    def insert(self, e: _Entry) -> List[_Entry]:
+        self.discard(e.key)
+        if e.size > self.max_bytes and not self.admit_all:
+            return [e]
+        self._d[e.key] = e
+        self.bytes += e.size
+        evicted = []
+        while self.bytes > self.max_bytes and len(self._d) > 1:
+            _, old = self._d.popitem(last=False)
+            self.bytes -= old.size
+            evicted.append(old)
+        return evicted
+
+
+_SKETCH_SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+_M64 = (1 << 64) - 1
+
+
+class _Sketch:
+    """Count-min sketch with 4-bit-style saturating counters and periodic halving."""
+
+    def __init__(self, width: int = 1024) -> None:
+        self.width = width
+        self._rows = [bytearray(width) for _ in range(4)]
+        self._additions = 0
+
+    def _slots(self, key: str) -> List[int]:
+        # one independently mixed hash per row (multiply by an odd seed, fold high bits down)
+        h = hash(key) & _M64
+        mask = self.width - 1
+        out = []
+        for seed in _SKETCH_SEEDS:
+            x = ((h ^ (h >> 31)) * seed) & _M64
+            out.append((x ^ (x >> 29) ^ (x >> 47)) & mask)
+        return out
+
+    def grown(self, factor: int = 4) -> "_Sketch":
+        """Wider sketch with the same estimates (a slot's counts move to every slot it splits into)."""
+        wide = _Sketch(self.width * factor)
+        mask = self.width - 1
+        for old, new in zip(self._rows, wide._rows):
+            for j in range(wide.width):
+                new[j] = old[j & mask]
+        wide._additions = self._additions
+        return wide
+
+    def add(self, key: str) -> None:
+        for row, i in zip(self._rows, self._slots(key)):
+            if row[i] < 15:
+                row[i] += 1
+        self._additions += 1
+        if self._additions >= 10 * self.width:  # aging keeps the sketch recent
+            for row in self._rows:
+                for i in range(self.width):
+                    row[i] >>= 1
+            self._additions //= 2
+
+    def estimate(self, key: str) -> int:
+        return min(row[i] for row, i in zip(self._rows, self._slots(key)))
+
+
+class _TinyLFU:
+    """W-TinyLFU: 1% LRU window, then admission by frequency into a segmented LRU."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.window_cap = max(1, max_bytes // 100)
+        self.main_cap = max_bytes - self.window_cap
+        self.protected_cap = int(self.main_cap * 0.8)
+        self._window: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._probation: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._protected: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = {"window": 0, "probation": 0, "protected": 0}
+        self._sketch = _Sketch()
+
+    @property
+    def bytes(self) -> int:
+        return sum(self._bytes.values())
+
+    def __len__(self) -> int:
+        return len(self._window) + len(self._probation) + len(self._protected)
+
+    def _segments(self) -> Tuple[Tuple[str, "OrderedDict[str, _Entry]"], ...]:
+        return (("window", self._window), ("probation", self._probation), ("protected", self._protected))
+
+    def _grow_sketch(self) -> None:
+        if len(self) > self._sketch.width:
+            self._sketch = self._sketch.grown()
+
+    def lookup(self, key: str) -> Optional[_Entry]:
+        self._sketch.add(key)
+        if key in self._window:
+            self._window.move_to_end(key)
+            return self._window[key]
+        if key in self._protected:
+            self._protected.move_to_end(key)
+            return self._protected[key]
+        e = self._probation.pop(key, None)
+        if e is None:
+            return None
+        # second hit: promote to protected, demoting its LRU entries when full
+        self._bytes["probation"] -= e.size
+        self._protected[key] = e
+        self._bytes["protected"] += e.size
+        while self._bytes["protected"] > self.protected_cap and len(self._protected) > 1:
+            _, old = self._protected.popitem(last=False)
+            self._bytes["protected"] -= old.size
+            self._probation[old.key] = old
+            self._bytes["probation"] += old.size
+        return e
+
+    def discard(self, key: str) -> Optional[_Entry]:
+        for name, seg in self._segments():
+            e = seg.pop(key, None)
+            if e is not None:
+                self._bytes[name] -= e.size
+                return e
+        return None
+
+    def insert(self, e: _Entry) -> List[_Entry]:
+        self.discard(e.key)
+        self._sketch.add(e.key)
+        if e.size > self.main_cap:
+            return [e]
+        self._window[e.key] = e
+        self._bytes["window"] += e.size
+        evicted: List[_Entry] = []
+        while self._bytes["window"] > self.window_cap and self._window:
+            _, cand = self._window.popitem(last=False)
+            self._bytes["window"] -= cand.size
+            evicted.extend(self._admit(cand))
+        self._grow_sketch()
+        return evicted
+
+    def _admit(self, cand: _Entry) -> List[_Entry]:
+        main = self._bytes["probation"] + self._bytes["protected"]
+        if main + cand.size <= self.main_cap:
+            self._probation[cand.key] = cand
+            self._bytes["probation"] += cand.size
+            return []
+        # victims in eviction order until the candidate fits
+        victims: List[_Entry] = []
+        freed = 0
+        for seg in (self._probation, self._protected):
+            for e in seg.values():
+                if main - freed + cand.size <= self.main_cap:
+                    break
+                victims.append(e)
+                freed += e.size
+        if self._sketch.estimate(cand.key) <= max(self._sketch.estimate(v.key) for v in victims):
+            return [cand]  # not popular enough to displace the main area
+        for v in victims:
+            self.discard(v.key)
+        self._probation[cand.key] = cand
+        self._bytes["probation"] += cand.size
+        return victims
+
+
+# ----------------------------
+# Cache
+# ----------------------------
+def _digest(s: str) -> str:
+    return hashlib.sha1(s.encode("utf-8")).hexdigest()
+
+
+class TieredCache:
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        limits: Optional[Dict[str, int]] = None,
+        policy: str = "tinylfu",
+        default_ttl_s: Optional[float] = None,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 512 * 1024 * 1024,
+        sizeof: Callable[[Any], int] = approx_size,
+        name: str = "cache",
+        metrics: Optional[Metrics] = None,
+        admit_all: bool = False,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown cache policy: {policy!r}")
+        if admit_all and policy != "lru":
+            raise ValueError("admit_all requires the 'lru' policy")
+        self.admit_all = admit_all
+        self.max_bytes = max_bytes
+        self.limits = dict(limits or {})
+        self.policy = policy
+        self.default_ttl_s = default_ttl_s
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self.sizeof = sizeof
+        self.name = name
+        self._ns: Dict[str, Union[_LRU, _TinyLFU]] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._disk_bytes: Dict[str, int] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._lock = threading.RLock()
+        # disk writes/deletes run on one writer thread; queued entries are still readable
+        self._disk_queue: "queue.Queue[Optional[Tuple[str, str, Optional[_Entry]]]]" = queue.Queue()
+        self._disk_pending: Dict[Tuple[str, str], Optional[_Entry]] = {}
+        self._writer: Optional[threading.Thread] = None
+        # stats are pulled into telemetry on every Metrics.flush()
+        (metrics or get_metrics()).add_collector(self.export_stats)
+
+    def _space(self, ns: str) -> Union[_LRU, _TinyLFU]:
+        space = self._ns.get(ns)
+        if space is None:
+            limit = self.limits.get(ns, self.max_bytes)
+            space = self._ns[ns] = _TinyLFU(limit) if self.policy == "tinylfu" else _LRU(limit, self.admit_all)
+        return space
+
+    def _stat(self, ns: str) -> Dict[str, int]:
+        st = self._stats.get(ns)
+        if st is None:
+            st = self._stats[ns] = {k: 0 for k in ("hits", "misses", "evictions", "expired", "disk_hits", "disk_writes")}
+        return st
+
+    # ----------------------------
+    # get / put
+    # ----------------------------
+    def _memory_get(self, ns: str, key: str) -> Any:
+        with self._lock:
+            st = self._stat(ns)
+            space = self._space(ns)
+            e = space.lookup(key)
+            if e is not None and e.expired(time.time()):
+                space.discard(key)
+                st["expired"] += 1
+                e = None
+            if e is not None:
+                st["hits"] += 1
+                return e.value
+            if self.disk_dir is None:
+                st["misses"] += 1
+            return _MISSING
+
+    def _promote(self, ns: str, e: Optional[_Entry], default: Any) -> Any:
+        with self._lock:
+            st = self._stat(ns)
+            if e is None:
+                st["misses"] += 1
+                return default
+            st["hits"] += 1
+            st["disk_hits"] += 1
+            st["evictions"] += len(self._space(ns).insert(e))
+            return e.value
+
+    def get(self, ns: str, key: str, default: Any = None) -> Any:
+        val = self._memory_get(ns, key)
+        if val is not _MISSING:
+            return val
+        if self.disk_dir is None:
+            return default
+        return self._promote(ns, self._disk_get(ns, key), default)
+
+    async def aget(self, ns: str, key: str, default: Any = None) -> Any:
+        """``get`` whose disk lookup runs in a worker thread instead of on the loop."""
+        val = self._memory_get(ns, key)
+        if val is not _MISSING:
+            return val
+        if self.disk_dir is None:
+            return default
+        e = await asyncio.get_running_loop().run_in_executor(None, self._disk_get, ns, key)
+        return self._promote(ns, e, default)
+
+    def put(self, ns: str, key: str, val: Any, ttl_s: Optional[float] = None) -> None:
+        ttl_s = self.default_ttl_s if ttl_s is None else ttl_s
+        e = _Entry(key, val, self.sizeof(val) + sys.getsizeof(key), time.time() + ttl_s if ttl_s else None)
+        with self._lock:
+            self._stat(ns)["evictions"] += len(self._space(ns).insert(e))
+        self._disk_enqueue(ns, key, e)
+
+    def delete(self, ns: str, key: str) -> None:
+        with self._lock:
+            self._space(ns).discard(key)
+        self._disk_enqueue(ns, key, None)
+
+    def clear(self, ns: Optional[str] = None) -> None:
+        """Drop every entry of ``ns`` (all namespaces if None) from memory and disk."""
+        self.flush()
+        with self._lock:
+            names = list(self._ns) if ns is None else [ns]
+            for name in names:
+                self._ns.pop(name, None)
+        if self.disk_dir is None:
+            return
+        folders = [self._disk_ns(n) for n in names] if ns is not None else [p for p in self.disk_dir.glob("*") if p.is_dir()]
+        for folder in folders:
+            for p in folder.glob("*.pkl"):
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+        with self._lock:
+            if ns is None:
+                self._disk_bytes.clear()
+            else:
+                self._disk_bytes.pop(ns, None)
+
+    async def get_or_compute(
+        self,
+        ns: str,
+        key: str,
+        compute: Callable[[], Union[Awaitable[Any], Any]],
+        ttl_s: Optional[float] = None,
+    ) -> Any:
+        """Cached value, else ``compute()`` (sync or async) stored under ``key``.
+
+        Concurrent misses for the same key share one computation, which
+        runs as its own task: a caller that is cancelled leaves it running
+        for the others. A failed computation is not cached and its error
+        reaches every waiter.
+        """
+        val = await self.aget(ns, key, _MISSING)
+        if val is not _MISSING:
+            return val
+        slot = (ns, key)
+        task = self._inflight.get(slot)
+        if task is None:
+            task = self._inflight[slot] = asyncio.ensure_future(self._compute(ns, key, compute, ttl_s))
+            task.add_done_callback(lambda t, s=slot: self._computed(s, t))
+        return await asyncio.shield(task)
+
+    async def _compute(self, ns: str, key: str, compute: Callable[[], Any], ttl_s: Optional[float]) -> Any:
+        val = compute()
+        if asyncio.iscoroutine(val) or isinstance(val, asyncio.Future):
+            val = await val
+        self.put(ns, key, val, ttl_s)
+        return val
+
+    def _computed(self, slot: Tuple[str, str], task: asyncio.Task) -> None:
+        if self._inflight.get(slot) is task:
+            del self._inflight[slot]
+        if not task.cancelled():
+            task.exception()  # retrieved even when every waiter was cancelled
+
+    # ----------------------------
+    # Disk tier
+    # ----------------------------
+    def _disk_ns(self, ns: str) -> Path:
+        return self.disk_dir / _digest(ns)  # type: ignore[operator]
+
+    def _disk_path(self, ns: str, key: str) -> Path:
+        return self._disk_ns(ns) / f"{_digest(key)}.pkl"
+
+    def _disk_enqueue(self, ns: str, key: str, e: Optional[_Entry]) -> None:
+        if self.disk_dir is None:
+            return
+        with self._lock:
+            self._disk_pending[(ns, key)] = e
+            if self._writer is None:
+                # the thread holds the cache weakly; collecting the cache stops it
+                self._writer = threading.Thread(
+                    target=_disk_writer, args=(weakref.ref(self), self._disk_queue), name="cache-disk", daemon=True
+                )
+                self._writer.start()
+                weakref.finalize(self, self._disk_queue.put, None)
+        self._disk_queue.put((ns, key, e))
+
+    def _disk_apply(self, ns: str, key: str, e: Optional[_Entry]) -> None:
+        try:
+            if e is None:
+                self._disk_delete(ns, key)
+            else:
+                self._disk_put(ns, e)
+        except OSError:
+            pass  # disk tier is best effort
+        finally:
+            with self._lock:
+                if self._disk_pending.get((ns, key), _MISSING) is e:
+                    del self._disk_pending[(ns, key)]
+
+    def flush(self) -> None:
+        """Block until queued disk writes are done (e.g. before exit)."""
+        if self._writer is not None:
+            self._disk_queue.join()
+
+    def close(self) -> None:
+        """Flush and stop the disk writer; a later put starts a new one.
+
+        Writes still queued when an unclosed cache is garbage-collected are dropped.
+        """
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._disk_queue.put(None)  # type: ignore[arg-type]
+            writer.join()
+
+    def _disk_get(self, ns: str, key: str) -> Optional[_Entry]:
+        now = time.time()
+        with self._lock:
+            pending = self._disk_pending.get((ns, key), _MISSING)
+        if pending is not _MISSING:
+            e = pending  # not written yet (None: delete queued)
+        else:
+            try:
+                stored_key, val, expires_at = pickle.loads(self._disk_path(ns, key).read_bytes())
+            except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+                return None
+            if stored_key != key:
+                return None
+            e = _Entry(key, val, self.sizeof(val) + sys.getsizeof(key), expires_at)
+        if e is not None and e.expired(now):
+            with self._lock:
+                self._stat(ns)["expired"] += 1
+            return None
+        return e
+
+    def _disk_put(self, ns: str, e: _Entry) -> None:
+        try:
+            data = pickle.dumps((e.key, e.value, e.expires_at), pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return  # memory-only
+        folder = self._disk_ns(ns)
+        if ns not in self._disk_bytes:
+            folder.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes[ns] = sum(p.stat().st_size for p in folder.glob("*.pkl"))
+        path = self._disk_path(ns, e.key)
+        try:
+            old = path.stat().st_size
+        except OSError:
+            old = 0
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self._disk_bytes[ns] += len(data) - old
+        with self._lock:
+            self._stat(ns)["disk_writes"] += 1
+        if self._disk_bytes[ns] > self.disk_max_bytes:
+            self._disk_trim(ns)
+
+    def _disk_delete(self, ns: str, key: str) -> None:
+        path = self._disk_path(ns, key)
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        if ns in self._disk_bytes:
+            self._disk_bytes[ns] -= size
+
+    def _disk_trim(self, ns: str) -> None:
+        """Remove the oldest files until the namespace is under 80% of disk_max_bytes."""
+        files = sorted(self._disk_ns(ns).glob("*.pkl"), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in files)
+        for p in files:
+            if total <= self.disk_max_bytes * 0.8:
+                break
+            total -= p.stat().st_size
+            p.unlink()
+        self._disk_bytes[ns] = total
+
+    # ----------------------------
+    # Stats
+    # ----------------------------
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        out: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for ns, st in self._stats.items():
+                space = self._space(ns)
+                lookups = st["hits"] + st["misses"]
+                out[ns] = {
+                    **st,
+                    "hit_rate": (st["hits"] / lookups) if lookups else 0.0,
+                    "entries": len(space),
+                    "bytes": space.bytes,
+                    "max_bytes": space.max_bytes,
+                    "disk_bytes": self._disk_bytes.get(ns, 0),
+                }
+        return out
+
+    def export_stats(self, metrics: Metrics, prefix: Optional[str] = None) -> None:
+        """Write current per-namespace stats into ``metrics`` as ``{prefix}.{ns}.{stat}`` gauges.
+
+        ``prefix`` defaults to the cache name; runs on every ``metrics.flush()``.
+        """
+        prefix = prefix or self.name
+        for ns, st in self.stats().items():
+            for k, v in st.items():
+                metrics.set(f"{prefix}.{ns}.{k}", float(v))
+
 
+def _disk_writer(ref: "weakref.ref[TieredCache]", q: "queue.Queue[Any]") -> None:
+    """Disk writer thread; exits on close() (None item) or once the cache is collected."""
+    while True:
+        item = q.get()
+        try:
+            cache = ref() if item is not None else None
+            if cache is None:
+                return
+            cache._disk_apply(*item)
+            del cache  # no strong reference while waiting
+        finally:
+            q.task_done()
 
-class SimpleCache:
-    def __init__(self) -> None:
-        self._m: Dict[Tuple[str, str], Any] = {}
 
-    def get(self, ns: str, key: str) -> Any:
-        return self._m.get((ns, key))
+class SimpleCache(TieredCache):
+    """``get(ns, key)`` / ``put(ns, key, val)`` cache (now bounded; see TieredCache).
 
-    def put(self, ns: str, key: str, val: Any) -> None:
-        self._m[(ns, key)] = val
+    Keeps the old contract that ``put`` then ``get`` returns the value:
+    plain LRU that admits every put (no TinyLFU admission, no oversize
+    rejection); older entries are evicted once a namespace is over budget.
+    """
 
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, **kwargs: Any) -> None:
+        kwargs.setdefault("name", "simple_cache")
+        super().__init__(max_bytes=max_bytes, policy="lru", admit_all=True, **kwargs)
@@ -0,0 +1,153 @@
+"""Deadline and token-budget context for nested agent/action calls.
+
+A Deadline lives in a contextvar and is inherited by every call (and task)
+started under it. Nested scopes can only shrink it: a child's expiry is
+the earliest of its own timeout, the parent's expiry and ``share`` of the
+parent's remaining time, and its token budget is charged to all ancestors.
+
+    with deadline_scope(timeout_s=120, tokens=50_000):
+        await with_deadline(agent(problem))  # cancelled as a whole at expiry
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The enclosing deadline expired (or had already expired at call time)."""
+
+
+class BudgetExceeded(RuntimeError):
+    """The enclosing token budget is exhausted."""
+
+
+class TokenBudget:
+    """Token allowance; charges propagate to the parent budget."""
+
+    def __init__(self, limit: Optional[int], parent: Optional["TokenBudget"] = None) -> None:
+        self.limit = limit
+        self.used = 0
+        self.parent = parent
+
+    @property
+    def remaining(self) -> Optional[int]:
+        own = None if self.limit is None else self.limit - self.used
+        up = self.parent.remaining if self.parent is not None else None
+        if own is None:
+            return up
+        return own if up is None else min(own, up)
+
+    def charge(self, tokens: int) -> None:
+        b: Optional[TokenBudget] = self
+        while b is not None:
+            b.used += tokens
+            b = b.parent
+
+
+class Deadline:
+    """Absolute expiry (monotonic clock) plus an optional token budget."""
+
+    def __init__(self, expires_at: Optional[float], budget: Optional[TokenBudget] = None) -> None:
+        self.expires_at = expires_at  # None = unbounded
+        self.budget = budget
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        left = self.remaining()
+        return left is not None and left <= 0
+
+    def child(self, timeout_s: Optional[float] = None, tokens: Optional[int] = None, share: float = 1.0) -> "Deadline":
+        now = time.monotonic()
+        candidates = [t for t in (self.expires_at,) if t is not None]
+        if self.expires_at is not None and share < 1.0:
+            candidates.append(now + max(0.0, self.expires_at - now) * share)
+        if timeout_s is not None:
+            candidates.append(now + timeout_s)
+        budget = self.budget if tokens is None else TokenBudget(tokens, self.budget)
+        return Deadline(min(candidates) if candidates else None, budget)
+
+
+_UNBOUNDED = Deadline(None)
+_current: ContextVar[Deadline] = ContextVar("deadline", default=_UNBOUNDED)
+
+
+def current_deadline() -> Deadline:
+    return _current.get()
+
+
+def remaining_time() -> Optional[float]:
+    return _current.get().remaining()
+
+
+def remaining_tokens() -> Optional[int]:
+    budget = _current.get().budget
+    return budget.remaining if budget is not None else None
+
+
+def check_deadline() -> None:
+    """Raise if the current deadline expired or the token budget is spent."""
+    dl = _current.get()
+    if dl.expired:
+        raise DeadlineExceeded("deadline exceeded")
+    tokens_left = dl.budget.remaining if dl.budget is not None else None
+    if tokens_left is not None and tokens_left <= 0:
+        raise BudgetExceeded("token budget exhausted")
+
+
+def charge_tokens(tokens: int) -> None:
+    budget = _current.get().budget
+    if budget is not None and tokens > 0:
+        budget.charge(tokens)
+
+
+@contextmanager
+def deadline_scope(timeout_s: Optional[float] = None, tokens: Optional[int] = None, share: float = 1.0) -> Iterator[Deadline]:
+    """Enter a child deadline of the current one (see Deadline.child)."""
+    dl = _current.get().child(timeout_s, tokens, share)
+    token = _current.set(dl)
+    try:
+        yield dl
+    finally:
+        _current.reset(token)
+
+
+def effective_timeout(timeout_s: Optional[float] = None) -> Optional[float]:
+    """``timeout_s`` capped by the remaining time of the current deadline."""
+    left = remaining_time()
+    if left is None:
+        return timeout_s
+    return left if timeout_s is None else min(timeout_s, left)
+
+
+async def with_deadline(aw: Awaitable[T], timeout_s: Optional[float] = None) -> T:
+    """Await ``aw`` bounded by ``timeout_s`` and the current deadline.
+
+    Raises DeadlineExceeded when the enclosing deadline is what ran out
+    (plain asyncio.TimeoutError for the local ``timeout_s``). Work is never
+    started once the deadline has passed.
+    """
+    left = remaining_time()
+    if left is not None and left <= 0:
+        if asyncio.iscoroutine(aw):
+            aw.close()
+        raise DeadlineExceeded("deadline exceeded")
+    timeout = effective_timeout(timeout_s)
+    if timeout is None:
+        return await aw
+    try:
+        return await asyncio.wait_for(aw, timeout)
+    except asyncio.TimeoutError as e:
+        if isinstance(e, DeadlineExceeded) or timeout_s is None or (left is not None and left <= timeout_s):
+            raise DeadlineExceeded("deadline exceeded") from None
+        raise
@@ -1,16 +1,136 @@
 from __future__ import annotations
 
+import ctypes
+import math
+import os
+import tempfile
 from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence
+
+try:  # POSIX only
+    import resource  # type: ignore
+except Exception:  # pragma: no cover - platform dependent
+    resource = None  # type: ignore
+
+from .workers import ProcessWorkerPool
+
+_CLONE_NEWUSER = 0x10000000
+_CLONE_NEWNET = 0x40000000
+
+# set inside sandbox workers by _setup_worker
+_network_isolated = False
 
 
 @contextmanager
 def sandbox(enabled: bool = True):
-    """Placeholder for sandbox: isolates tool execution when enabled.
+    """In-process scope for tool execution (no isolation).
 
-    Currently a no-op context manager; replace with real sandboxing as needed.
+    Real isolation runs the call in a SandboxPool worker; see ToolExecutor's
+    ``process`` mode.
     """
     try:
         yield
     finally:
         pass
 
+
+@dataclass
+class SandboxLimits:
+    cpu_s: Optional[float] = 10.0  # CPU seconds per call (RLIMIT_CPU, re-armed before each call)
+    memory_mb: Optional[int] = 1024  # address space (RLIMIT_AS)
+    open_files: Optional[int] = 256  # RLIMIT_NOFILE
+    deny_network: bool = True  # private network namespace, where unprivileged user namespaces are allowed
+    scratch_root: Optional[str] = None  # per-worker scratch dirs go here (default: system temp dir)
+    max_calls: Optional[int] = 200  # recycle a worker after this many calls
+
+
+def _set_limit(which: int, soft: int) -> None:
+    _, hard = resource.getrlimit(which)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(which, (soft, hard))
+
+
+def _deny_network() -> bool:
+    """Move this process into fresh user + network namespaces (loopback only, down)."""
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.unshare(_CLONE_NEWUSER | _CLONE_NEWNET) == 0
+    except Exception:
+        return False
+
+
+def _setup_worker(limits: SandboxLimits) -> None:
+    global _network_isolated
+    if limits.deny_network:
+        _network_isolated = _deny_network()
+    if resource is None:
+        return
+    if limits.memory_mb:
+        _set_limit(resource.RLIMIT_AS, limits.memory_mb * 1024 * 1024)
+    if limits.open_files:
+        _set_limit(resource.RLIMIT_NOFILE, limits.open_files)
+
+
+class _WorkerSetup:
+    """Picklable setup hook carrying the limits into the worker."""
+
+    def __init__(self, limits: SandboxLimits) -> None:
+        self.limits = limits
+
+    def __call__(self) -> None:
+        _setup_worker(self.limits)
+
+
+class _ArmCPULimit:
+    """Before each call: allow ``cpu_s`` more CPU seconds (SIGXCPU ends the worker past that)."""
+
+    def __init__(self, cpu_s: float) -> None:
+        self.cpu_s = cpu_s
+
+    def __call__(self) -> None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = usage.ru_utime + usage.ru_stime
+        _set_limit(resource.RLIMIT_CPU, int(math.ceil(used + self.cpu_s)))
+
+
+def sandbox_info() -> Dict[str, Any]:
+    """Run inside a worker: working directory, limits and network isolation."""
+    info: Dict[str, Any] = {"pid": os.getpid(), "cwd": os.getcwd(), "network_isolated": _network_isolated}
+    if resource is not None:
+        for name in ("RLIMIT_CPU", "RLIMIT_AS", "RLIMIT_NOFILE"):
+            info[name] = resource.getrlimit(getattr(resource, name))
+    return info
+
+
+class SandboxPool(ProcessWorkerPool):
+    """Warm, pre-forked worker processes with resource limits.
+
+    Workers fork from the forkserver with ``preload`` modules already
+    imported, so a call costs a pipe round trip instead of an interpreter
+    start. Each worker runs in its own scratch directory under rlimits
+    (CPU per call, address space, open files), optionally without network
+    access, and is replaced after ``limits.max_calls`` calls, on crash or
+    when killed for a timeout.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[SandboxLimits] = None,
+        max_workers: int = max(1, (os.cpu_count() or 2) - 1),
+        preload: Sequence[str] = ("runtime.sandbox",),
+    ) -> None:
+        self.limits = limits or SandboxLimits()
+        super().__init__(
+            max_workers=max_workers,
+            preload=preload,
+            setup=_WorkerSetup(self.limits),
+            before_call=_ArmCPULimit(self.limits.cpu_s) if self.limits.cpu_s and resource is not None else None,
+            max_calls=self.limits.max_calls,
+            scratch_root=self.limits.scratch_root or os.path.join(tempfile.gettempdir(), "agent-sandbox"),
+        )
+
+    async def probe(self) -> Dict[str, Any]:
+        """``sandbox_info()`` from one worker (to verify limits took effect)."""
+        return await self.run(sandbox_info)
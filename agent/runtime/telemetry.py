@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import os
+import weakref
 from dataclasses import dataclass, field
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 
 
 def log_info(msg: str) -> None:
@@ -19,7 +23,94 @@ def log_error(msg: str) -> None:
 @dataclass
 class Metrics:
     counters: Dict[str, float] = field(default_factory=dict)
+    _collectors: List[Callable[[], Any]] = field(default_factory=list, repr=False)
 
     def incr(self, key: str, val: float = 1.0) -> None:
         self.counters[key] = self.counters.get(key, 0.0) + val
 
+    def set(self, key: str, val: float) -> None:
+        """Gauge-style value (overwrites)."""
+        self.counters[key] = val
+
+    def add_collector(self, fn: Callable[["Metrics"], None]) -> None:
+        """Run ``fn(self)`` on every flush, e.g. to export gauges.
+
+        Bound methods are held weakly so a collector does not keep its owner alive.
+        """
+        self._collectors.append(weakref.WeakMethod(fn) if hasattr(fn, "__self__") else (lambda: fn))
+
+    def flush(self, path: Optional[str] = None) -> Dict[str, float]:
+        """Run collectors and return a copy of the counters; with ``path`` also write them as JSON."""
+        live = []
+        for ref in self._collectors:
+            fn = ref()
+            if fn is not None:
+                fn(self)
+                live.append(ref)
+        self._collectors = live
+        out = dict(self.counters)
+        if path:
+            tmp = f"{path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(out, f, indent=2, sort_keys=True)
+            os.replace(tmp, path)
+        return out
+
+
+_metrics: Optional[Metrics] = None
+
+
+def get_metrics() -> Metrics:
+    """Process-wide Metrics."""
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
+
+
+class LoopLagMonitor:
+    """Samples event-loop lag: how late a ``sleep(interval_s)`` wakes up.
+
+    Blocking work on the loop (sync CPU or I/O inside async code) shows up
+    directly as lag. ``snapshot()`` reports samples, mean, p99 and max in
+    seconds; ``reset()`` starts a new measurement window.
+    """
+
+    def __init__(self, interval_s: float = 0.01, window: int = 10000) -> None:
+        self.interval_s = interval_s
+        self.window = window
+        self._lags: List[float] = []
+        self._task: Any = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval_s)
+            self._lags.append(max(0.0, loop.time() - t0 - self.interval_s))
+            if len(self._lags) > self.window:
+                del self._lags[: len(self._lags) - self.window]
+
+    def reset(self) -> None:
+        self._lags = []
+
+    def snapshot(self) -> Dict[str, float]:
+        lags = sorted(self._lags)
+        if not lags:
+            return {"samples": 0, "mean_s": 0.0, "p99_s": 0.0, "max_s": 0.0}
+        return {
+            "samples": len(lags),
+            "mean_s": sum(lags) / len(lags),
+            "p99_s": lags[min(len(lags) - 1, int(len(lags) * 0.99))],
+            "max_s": lags[-1],
+        }
@@ -0,0 +1,227 @@
+"""Process worker pool with hard-kill timeouts.
+
+Each worker is a long-lived child process (``forkserver`` start method where
+available, so workers fork from a small pre-imported server instead of
+booting a fresh interpreter) that serves calls over a pipe. Calls and
+results are pickled with the highest protocol and sent as single
+messages. The parent waits on the pipe from the event loop; a call that
+is cancelled or times out kills its worker (SIGKILL), which is the only
+way to stop runaway synchronous code, and a replacement is spawned on
+demand. Callables must be picklable (module-level functions, or action
+instances of importable classes).
+
+Workers are recycled after ``max_calls`` calls, and each can get its own
+scratch directory (``scratch_root``) as working directory, removed when
+the worker goes. ``setup`` runs once in each new worker, ``before_call``
+before every call; both must be picklable (see runtime.sandbox).
+"""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing as mp
+import os
+import pickle
+import shutil
+import signal
+import tempfile
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+
+class WorkerError(RuntimeError):
+    """Exception raised inside a worker (original type name and traceback kept)."""
+
+    def __init__(self, type_name: str, message: str, tb: str = "") -> None:
+        super().__init__(f"{type_name}: {message}")
+        self.type_name = type_name
+        self.tb = tb
+
+
+class WorkerCrashed(RuntimeError):
+    """The worker process died while running a call."""
+
+
+def call_sync(fn: Callable[..., Any], kwargs: Dict[str, Any]) -> Any:
+    """Call ``fn(**kwargs)`` to completion, running it on a private event loop if async."""
+    out = fn(**kwargs)
+    if asyncio.iscoroutine(out):
+        out = asyncio.run(out)
+    return out
+
+
+def _worker_main(
+    conn: Any,
+    setup: Optional[Callable[[], None]],
+    before_call: Optional[Callable[[], None]],
+    scratch: Optional[str],
+) -> None:
+    if scratch is not None:
+        os.chdir(scratch)
+    if setup is not None:
+        setup()
+    while True:
+        try:
+            msg = conn.recv_bytes()
+        except EOFError:
+            return
+        try:
+            if before_call is not None:
+                before_call()
+            fn, kwargs = pickle.loads(msg)
+            reply = ("ok", call_sync(fn, kwargs))
+        except BaseException as e:  # report everything, incl. SystemExit from tool code
+            reply = ("err", type(e).__name__, str(e), traceback.format_exc())
+        try:
+            data = pickle.dumps(reply, _PROTOCOL)
+        except Exception as e:
+            data = pickle.dumps(("err", type(e).__name__, f"unpicklable result: {e}", ""), _PROTOCOL)
+        conn.send_bytes(data)
+
+
+class _Worker:
+    __slots__ = ("proc", "conn", "calls", "scratch")
+
+    def __init__(self, proc: Any, conn: Any, scratch: Optional[str]) -> None:
+        self.proc = proc
+        self.conn = conn
+        self.calls = 0
+        self.scratch = scratch
+
+    def kill(self) -> None:
+        try:
+            self.proc.kill()
+            self.proc.join(timeout=1.0)
+        finally:
+            self.conn.close()
+            if self.scratch is not None:
+                shutil.rmtree(self.scratch, ignore_errors=True)
+
+    def exit_reason(self) -> str:
+        self.proc.join(timeout=0.5)
+        code = self.proc.exitcode
+        if code is not None and code < 0:
+            try:
+                return f"killed by {signal.Signals(-code).name}"
+            except ValueError:
+                return f"killed by signal {-code}"
+        return f"exit code {code}"
+
+
+def _context(start_method: Optional[str], preload: Sequence[str]) -> Any:
+    methods = mp.get_all_start_methods()
+    method = start_method or ("forkserver" if "forkserver" in methods else "spawn")
+    ctx = mp.get_context(method)
+    if method == "forkserver" and preload:
+        ctx.set_forkserver_preload(list(preload))
+    return ctx
+
+
+class ProcessWorkerPool:
+    """Up to ``max_workers`` warm worker processes; see module docstring."""
+
+    def __init__(
+        self,
+        max_workers: int = max(1, (os.cpu_count() or 2) - 1),
+        start_method: Optional[str] = None,
+        preload: Sequence[str] = (),
+        setup: Optional[Callable[[], None]] = None,
+        before_call: Optional[Callable[[], None]] = None,
+        max_calls: Optional[int] = None,
+        scratch_root: Optional[str] = None,
+    ) -> None:
+        self.max_workers = max_workers
+        self._ctx = _context(start_method, preload)
+        self._setup = setup
+        self._before_call = before_call
+        self.max_calls = max_calls
+        self.scratch_root = scratch_root
+        self._idle: List[_Worker] = []
+        self._live = 0
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"calls": 0, "spawned": 0, "killed": 0, "crashed": 0, "recycled": 0}
+
+    def _spawn(self) -> _Worker:
+        scratch = None
+        if self.scratch_root is not None:
+            os.makedirs(self.scratch_root, exist_ok=True)
+            scratch = tempfile.mkdtemp(prefix="worker-", dir=self.scratch_root)
+        parent, child = self._ctx.Pipe(duplex=True)
+        proc = self._ctx.Process(target=_worker_main, args=(child, self._setup, self._before_call, scratch), daemon=True)
+        proc.start()
+        child.close()
+        self._live += 1
+        self.stats["spawned"] += 1
+        return _Worker(proc, parent, scratch)
+
+    def _discard(self, worker: _Worker, reason: str) -> None:
+        worker.kill()
+        self._live -= 1
+        self.stats[reason] += 1
+
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._sem = asyncio.Semaphore(self.max_workers)
+        return loop
+
+    async def _recv(self, loop: asyncio.AbstractEventLoop, worker: _Worker) -> bytes:
+        ready = loop.create_future()
+        fd = worker.conn.fileno()
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            loop.remove_reader(fd)
+        return worker.conn.recv_bytes()
+
+    async def run(self, fn: Callable[..., Any], kwargs: Optional[Dict[str, Any]] = None) -> Any:
+        """Run ``fn(**kwargs)`` in a worker; cancelling the await kills the worker.
+
+        Bound it with ``asyncio.wait_for`` / ``with_deadline`` for a hard timeout.
+        """
+        payload = pickle.dumps((fn, kwargs or {}), _PROTOCOL)  # fail fast on unpicklable calls
+        loop = self._bind_loop()
+        async with self._sem:
+            worker = self._idle.pop() if self._idle else None
+            if worker is not None and not worker.proc.is_alive():
+                self._discard(worker, "crashed")
+                worker = None
+            if worker is None:
+                # process start blocks (forkserver handshake); keep it off the loop
+                worker = await loop.run_in_executor(None, self._spawn)
+            self.stats["calls"] += 1
+            try:
+                worker.conn.send_bytes(payload)
+                data = await self._recv(loop, worker)
+            except (EOFError, OSError) as e:
+                reason = worker.exit_reason()
+                self._discard(worker, "crashed")
+                raise WorkerCrashed(f"worker {reason} while running {getattr(fn, '__name__', type(fn).__name__)!r}") from e
+            except BaseException:
+                self._discard(worker, "killed")  # timed out / cancelled: stop the runaway call
+                raise
+            worker.calls += 1
+            if self.max_calls is not None and worker.calls >= self.max_calls:
+                self._discard(worker, "recycled")
+            else:
+                self._idle.append(worker)
+        reply = pickle.loads(data)
+        if reply[0] == "ok":
+            return reply[1]
+        raise WorkerError(*reply[1:])
+
+    async def warm(self, n: Optional[int] = None) -> None:
+        """Start workers ahead of the first calls (up to ``max_workers``)."""
+        loop = self._bind_loop()
+        want = min(self.max_workers, n or self.max_workers) - self._live
+        workers = await asyncio.gather(*(loop.run_in_executor(None, self._spawn) for _ in range(max(0, want))))
+        self._idle.extend(workers)
+
+    def close(self) -> None:
+        while self._idle:
+            self._idle.pop().kill()
+            self._live -= 1